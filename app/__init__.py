@@ -1,9 +1,10 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from app.replica import RoutingSession
 
 # Создаем экземпляры ТОЛЬКО здесь
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
@@ -29,9 +30,28 @@ def create_app():
     app.register_blueprint(web_pages_bp)  # ← Это даст /schedule
     app.register_blueprint(schedule_api_bp, url_prefix='/api/v1')
     
+    from app.assets import init_assets
+    init_assets(app)
+    
+    from app.pubsub import init_pubsub
+    init_pubsub(app)
+    
+    from app.profiling import init_profiling
+    init_profiling(app)
+    
+    from app.commands import register_commands
+    register_commands(app)
+    
     # КОСТЫЛЬ: Патчим модель Category перед её использованием
     with app.app_context():
-        from app.models import Category
+        from app.models import Category, configure_sqlite_transactions
+        configure_sqlite_transactions(db.engine)
+        
+        from app.replica import init_replica
+        init_replica(app)
+        
+        from app.metrics import init_metrics
+        init_metrics(app, db.engine)
         
         # Создаём "фейковое" свойство description, которое не запрашивает БД
         class PatchedCategory(Category):
@@ -51,12 +71,12 @@ def create_app():
         from app import models
         models.Category = PatchedCategory
     
-        # Импортируем модели и настраиваем user_loader
-        from app.models import User
+        # Настраиваем user_loader
+        from app.auth import load_user_cached
         
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            return load_user_cached(int(user_id))
         
         # КОСТЫЛЬ 2: Пытаемся добавить колонку, если её нет
         try:
@@ -79,5 +99,8 @@ def create_app():
             # Игнорируем ошибку - костыль выше всё равно отработает
         
         db.create_all()
+        
+        from app.models import add_missing_columns
+        add_missing_columns()
     
     return app
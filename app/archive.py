@@ -0,0 +1,404 @@
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import func, select, text
+from app import db
+from app.cache import TTLCache
+from app.models import Event, EventArchive, EventArchiveMonth
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLUMNS = ('id', 'user_id', 'category_id', 'start_time', 'end_time', 'type',
+                   'source', 'description', 'created_at', 'version')
+DATETIME_COLUMNS = ('start_time', 'end_time', 'created_at')
+
+# Реестр архивных месяцев (и счётчики файлов) меняется только архивацией -
+# кэшируем на процесс. Пока архива нет, проверка в эндпоинтах - один поиск в кэше
+_months_cache = TTLCache(maxsize=3, ttl=60)
+
+
+class ArchivedEvent:
+    """Событие из архива: те же поля и to_dict, что у Event, только для чтения"""
+    __slots__ = ARCHIVE_COLUMNS + ('deleted_at',)
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    to_dict = Event.to_dict
+
+
+class ArchiveReport:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.started = time.monotonic()
+        self.warmed = {}
+        self.frozen = {}
+
+    def to_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'months_archived': len(self.warmed),
+            'rows_archived': sum(self.warmed.values()),
+            'months_to_files': len(self.frozen),
+            'rows_to_files': sum(self.frozen.values()),
+            'months': sorted(f'{month:%Y-%m}' for month in set(self.warmed) | set(self.frozen)),
+            'elapsed_seconds': round(time.monotonic() - self.started, 3)
+        }
+
+
+# ======== МЕСЯЦЫ ========
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def months_before(now, count):
+    """Первое число месяца, отстоящего от now на count месяцев назад"""
+    index = now.year * 12 + now.month - 1 - count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _as_datetime(month):
+    return datetime(month.year, month.month, 1)
+
+
+def partition_name(month):
+    return f'events_archive_{month:%Y_%m}'
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _ensure_partition(month):
+    if _is_postgres():
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF events_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+        ))
+
+
+def _month_entry(month):
+    entry = db.session.get(EventArchiveMonth, month)
+    if entry is None:
+        entry = EventArchiveMonth(month=month, warm_rows=0, cold_rows=0)
+        db.session.add(entry)
+    return entry
+
+
+def archived_months():
+    """{месяц: (строк в events_archive, строк в файле, путь к файлу)}"""
+    months = _months_cache.get('months')
+    if months is None:
+        months = {row.month: (row.warm_rows, row.cold_rows, row.path)
+                  for row in db.session.query(EventArchiveMonth).all()}
+        _months_cache.set('months', months)
+    return months
+
+
+# ======== АРХИВАЦИЯ ========
+
+def _move_to_archive(month):
+    """events -> events_archive за месяц (живые события; tombstone остаются для синхронизации)"""
+    events = Event.__table__
+    archive = EventArchive.__table__
+    start, end = _as_datetime(month), _as_datetime(next_month(month))
+    month_filter = (events.c.start_time >= start, events.c.start_time < end, events.c.deleted_at.is_(None))
+
+    _ensure_partition(month)
+    columns = [events.c[name] for name in ARCHIVE_COLUMNS]
+    moved = db.session.execute(
+        archive.insert().from_select(list(ARCHIVE_COLUMNS), select(*columns).where(*month_filter))
+    ).rowcount
+    db.session.execute(events.delete().where(*month_filter))
+    _month_entry(month).warm_rows += moved
+    db.session.commit()
+    return moved
+
+
+def _row_to_json(row):
+    return {name: (value.isoformat() if name in DATETIME_COLUMNS and value else value)
+            for name, value in zip(ARCHIVE_COLUMNS, row)}
+
+
+def _read_file(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _count_record(counts, record):
+    by_type = counts.setdefault(str(record['user_id']), {}).setdefault(str(record['category_id']), {})
+    by_type[record['type']] = by_type.get(record['type'], 0) + 1
+
+
+def _dump_counts(counts):
+    return json.dumps(counts, separators=(',', ':'))
+
+
+def _freeze(month, archive_dir):
+    """
+    events_archive за месяц -> gzip JSONL (строки по user_id, start_time), затем
+    секция удаляется. Если файл месяца уже есть (дозагрузка старой истории) -
+    он перезаписывается вместе с новыми строками.
+    """
+    archive = EventArchive.__table__
+    start, end = _as_datetime(month), _as_datetime(next_month(month))
+    month_filter = (archive.c.start_time >= start, archive.c.start_time < end)
+    entry = _month_entry(month)
+
+    rows = db.session.execute(
+        select(*[archive.c[name] for name in ARCHIVE_COLUMNS]).where(*month_filter)
+        .order_by(archive.c.user_id, archive.c.start_time)
+        .execution_options(stream_results=True)
+    )
+    records = (_row_to_json(row) for row in rows)
+    if entry.path and os.path.exists(entry.path):
+        previous = list(_read_file(entry.path))
+        records = sorted(list(records) + previous, key=lambda r: (r['user_id'], r['start_time']))
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'events-{month:%Y-%m}.jsonl.gz')
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    count = 0
+    counts = {}
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=9) as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+            _count_record(counts, record)
+    os.replace(tmp_path, path)
+
+    if _is_postgres():
+        db.session.execute(text(f'DROP TABLE IF EXISTS {partition_name(month)}'))
+    else:
+        db.session.execute(archive.delete().where(*month_filter))
+    entry.path = path
+    entry.cold_rows = count
+    entry.cold_counts = _dump_counts(counts)
+    entry.warm_rows = 0
+    db.session.commit()
+    return count
+
+
+def archive_events(now=None, dry_run=True):
+    """
+    События старше ARCHIVE_HOT_MONTHS месяцев переносятся помесячно в events_archive,
+    месяцы старше ARCHIVE_COLD_MONTHS - в сжатые файлы ARCHIVE_DIR.
+    Транзакция на месяц; dry_run=True - только отчёт.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    hot_boundary = months_before(now, config['ARCHIVE_HOT_MONTHS'])
+    cold_boundary = months_before(now, config['ARCHIVE_COLD_MONTHS'])
+    report = ArchiveReport(dry_run)
+    events = Event.__table__
+
+    oldest = db.session.query(func.min(events.c.start_time)).filter(
+        events.c.deleted_at.is_(None), events.c.start_time < _as_datetime(hot_boundary)
+    ).scalar()
+    month = month_start(oldest) if oldest else hot_boundary
+    while month < hot_boundary:
+        if dry_run:
+            count = db.session.query(func.count(events.c.id)).filter(
+                events.c.deleted_at.is_(None),
+                events.c.start_time >= _as_datetime(month),
+                events.c.start_time < _as_datetime(next_month(month))
+            ).scalar()
+        else:
+            count = _move_to_archive(month)
+            if count:
+                logger.info(f"Archive {month:%Y-%m}: {count} rows -> events_archive")
+        if count:
+            report.warmed[month] = count
+        month = next_month(month)
+
+    _months_cache.clear()
+    pending = {month: warm_rows for month, (warm_rows, _, _) in archived_months().items() if warm_rows}
+    if dry_run:
+        # В пробном прогоне строки ещё в events
+        for month, count in report.warmed.items():
+            pending[month] = pending.get(month, 0) + count
+    for month, count in sorted(pending.items()):
+        if month >= cold_boundary:
+            continue
+        report.frozen[month] = count if dry_run else _freeze(month, config['ARCHIVE_DIR'])
+        if not dry_run:
+            logger.info(f"Archive {month:%Y-%m}: {report.frozen[month]} rows -> file")
+
+    if not dry_run:
+        _backfill_cold_counts()
+    _months_cache.clear()
+    return report
+
+
+def _backfill_cold_counts():
+    """Счётчики для файлов, замороженных до появления cold_counts"""
+    for entry in db.session.query(EventArchiveMonth).filter(
+        EventArchiveMonth.path.isnot(None), EventArchiveMonth.cold_counts.is_(None)
+    ):
+        if not os.path.exists(entry.path):
+            continue
+        counts = {}
+        for record in _read_file(entry.path):
+            _count_record(counts, record)
+        entry.cold_counts = _dump_counts(counts)
+        db.session.commit()
+
+
+# ======== ЧТЕНИЕ С ПРОВАЛИВАНИЕМ В АРХИВ ========
+
+def _parse_counts(value):
+    return {int(user_id): {int(category_id): types for category_id, types in categories.items()}
+            for user_id, categories in json.loads(value).items()}
+
+
+def _cold_month_counts():
+    """{месяц: {user_id: {category_id: {type: строк}}}} - по файлу каждого месяца"""
+    counts = _months_cache.get('cold_month_counts')
+    if counts is None:
+        counts = {month: _parse_counts(value) for month, value in db.session.query(
+            EventArchiveMonth.month, EventArchiveMonth.cold_counts
+        ).filter(EventArchiveMonth.cold_counts.isnot(None))}
+        _months_cache.set('cold_month_counts', counts)
+    return counts
+
+
+def _cold_counts():
+    """{user_id: {category_id: {type: строк}}} по всем файлам архива"""
+    counts = _months_cache.get('cold_counts')
+    if counts is None:
+        counts = {}
+        for month_counts in _cold_month_counts().values():
+            for user_id, categories in month_counts.items():
+                user_counts = counts.setdefault(user_id, {})
+                for category_id, types in categories.items():
+                    merged = user_counts.setdefault(category_id, {})
+                    for event_type, rows in types.items():
+                        merged[event_type] = merged.get(event_type, 0) + rows
+        _months_cache.set('cold_counts', counts)
+    return counts
+
+
+def archived_counts(user_id, category_id=None):
+    """
+    Архивные события пользователя по типам ({'plan': n, 'fact': m}) - из
+    events_archive и счётчиков файлов; category_id - только по этой категории.
+    """
+    months = archived_months()
+    counts = {}
+    if not months:
+        return counts
+
+    if any(warm_rows for warm_rows, _, _ in months.values()):
+        archive = EventArchive.__table__
+        query = select(archive.c.type, func.count()).where(archive.c.user_id == user_id)
+        if category_id is not None:
+            query = query.where(archive.c.category_id == category_id)
+        for event_type, rows in db.session.execute(query.group_by(archive.c.type)):
+            counts[event_type] = rows
+
+    for archived_category_id, types in _cold_counts().get(user_id, {}).items():
+        if category_id is None or archived_category_id == category_id:
+            for event_type, rows in types.items():
+                counts[event_type] = counts.get(event_type, 0) + rows
+    return counts
+
+
+def archived_events(user_id, start=None, end=None, end_inclusive=False, category_id=None,
+                    event_type=None, limit=None, newest_first=False):
+    """
+    Генератор событий пользователя из events_archive и архивных файлов, у которых
+    start_time в [start, end) (или [start, end] при end_inclusive), по возрастанию
+    start_time (newest_first - по убыванию); не больше limit.
+    Категория и тип фильтруются в SQL и по счётчикам файлов. Источники читаются
+    потоком и сливаются по start_time: файлы - помесячно, только пока нужны строки.
+    Для диапазонов новее архива - ничего, без запросов к БД.
+    """
+    months = archived_months()
+    relevant = sorted(month for month in months
+                      if (start is None or _as_datetime(next_month(month)) > start)
+                      and (end is None or _as_datetime(month) <= end))
+    if not relevant:
+        return
+
+    paths = [months[month][2] for month in relevant]
+    sources = [_cold_events(relevant, paths, user_id, start, end, end_inclusive, category_id, event_type,
+                            newest_first)]
+    if any(months[month][0] for month in relevant):
+        sources.append(_warm_events(user_id, start, end, end_inclusive, category_id, event_type,
+                                    limit, newest_first))
+
+    events = heapq.merge(*sources, key=lambda event: event.start_time, reverse=newest_first)
+    yield from itertools.islice(events, limit)
+
+
+def _warm_events(user_id, start, end, end_inclusive, category_id, event_type, limit, newest_first):
+    archive = EventArchive.__table__
+    query = select(*[archive.c[name] for name in ARCHIVE_COLUMNS]).where(archive.c.user_id == user_id)
+    if start is not None:
+        query = query.where(archive.c.start_time >= start)
+    if end is not None:
+        query = query.where(archive.c.start_time <= end if end_inclusive else archive.c.start_time < end)
+    if category_id is not None:
+        query = query.where(archive.c.category_id == category_id)
+    if event_type is not None:
+        query = query.where(archive.c.type == event_type)
+    # Порядок - только по start_time: его отдаёт индекс (user_id, start_time) без сортировки
+    query = query.order_by(archive.c.start_time.desc() if newest_first else archive.c.start_time).limit(limit)
+    for row in db.session.execute(query.execution_options(stream_results=True)):
+        yield ArchivedEvent(**dict(zip(ARCHIVE_COLUMNS, row)))
+
+
+def _cold_events(months, paths, user_id, start, end, end_inclusive, category_id, event_type, newest_first):
+    month_counts = _cold_month_counts()
+    files = list(zip(months, paths))
+    for month, path in reversed(files) if newest_first else files:
+        if not path or not os.path.exists(path):
+            continue
+        # Счётчики файла (если уже посчитаны) говорят, есть ли в нём нужные строки
+        counts = month_counts.get(month)
+        if counts is not None:
+            categories = counts.get(user_id, {})
+            if category_id is not None:
+                categories = {category_id: categories.get(category_id, {})}
+            if not any(event_type is None or types.get(event_type) for types in categories.values()
+                       if types):
+                continue
+
+        events = _read_user_events(path, user_id, start, end, end_inclusive, category_id, event_type)
+        # Строки одного пользователя за месяц - переворачиваем в памяти
+        yield from reversed(list(events)) if newest_first else events
+
+
+def _read_user_events(path, user_id, start, end, end_inclusive, category_id, event_type):
+    for record in _read_file(path):
+        # Строки файла упорядочены по (user_id, start_time)
+        if record['user_id'] < user_id:
+            continue
+        if record['user_id'] > user_id:
+            break
+        start_time = datetime.fromisoformat(record['start_time'])
+        if end is not None and (start_time > end if end_inclusive else start_time >= end):
+            break
+        if start is not None and start_time < start:
+            continue
+        if category_id is not None and record['category_id'] != category_id:
+            continue
+        if event_type is not None and record['type'] != event_type:
+            continue
+        for name in DATETIME_COLUMNS:
+            if record[name]:
+                record[name] = datetime.fromisoformat(record[name])
+        yield ArchivedEvent(**record)
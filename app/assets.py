@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import Blueprint, current_app, request, send_from_directory, url_for, abort
+from werkzeug.security import safe_join
+from app.compression import brotli
+
+ASSET_DIRS = ('css', 'js')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Имя файла содержит хэш содержимого - его можно кэшировать «навсегда»
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Заранее сжатые варианты по убыванию предпочтения
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+assets_bp = Blueprint('assets', __name__)
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def fingerprint(path, data):
+    """css/schedule.css -> css/schedule.<хэш>.css"""
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    base, ext = os.path.splitext(path)
+    return f'{base}.{digest}{ext}'
+
+
+def build_assets(static_folder=STATIC_FOLDER):
+    """
+    Собирает static/dist: копии css/js с хэшем в имени, рядом .gz и .br
+    (если установлен brotli), и manifest.json {исходный путь: путь в dist}.
+    Файлы предыдущей сборки сохраняются, чтобы закэшированные страницы
+    со старыми ссылками продолжали работать.
+    """
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    previous = load_manifest(static_folder)
+    manifest = {}
+
+    for asset_dir in ASSET_DIRS:
+        source_dir = os.path.join(static_folder, asset_dir)
+        if not os.path.isdir(source_dir):
+            continue
+        for name in sorted(os.listdir(source_dir)):
+            if not name.endswith(f'.{asset_dir}'):
+                continue
+            path = f'{asset_dir}/{name}'
+            with open(os.path.join(source_dir, name), 'rb') as f:
+                data = f.read()
+
+            target = fingerprint(path, data)
+            manifest[path] = target
+            target_path = os.path.join(dist_folder, target)
+            if os.path.exists(target_path):
+                continue
+
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            _write_atomic(target_path, data)
+            _write_atomic(target_path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target_path + '.br', brotli.compress(data, quality=11))
+
+    # Чистим всё, что не относится к текущей и предыдущей сборкам
+    keep = set(manifest.values()) | set(previous.values())
+    for dirpath, _, filenames in os.walk(dist_folder):
+        for filename in filenames:
+            relative = os.path.relpath(os.path.join(dirpath, filename), dist_folder).replace(os.sep, '/')
+            if relative == MANIFEST_NAME:
+                continue
+            if relative.removesuffix('.gz').removesuffix('.br') not in keep:
+                os.remove(os.path.join(dirpath, filename))
+
+    os.makedirs(dist_folder, exist_ok=True)
+    _write_atomic(os.path.join(dist_folder, MANIFEST_NAME),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(static_folder=STATIC_FOLDER):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(path):
+    """
+    Ссылка на css/js для шаблонов. Если сборка есть - версия с хэшем из dist,
+    иначе (и в debug) - исходный файл, чтобы правки видны без пересборки.
+    """
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest is None or current_app.debug:
+        manifest = load_manifest(current_app.static_folder)
+        current_app.extensions['asset_manifest'] = manifest
+
+    if path in manifest and not current_app.debug:
+        return url_for('assets.dist_file', filename=manifest[path])
+    return url_for('static', filename=path)
+
+
+@assets_bp.route('/static/dist/<path:filename>')
+def dist_file(filename):
+    """Собранные ассеты: заранее сжатая версия по Accept-Encoding и долгий Cache-Control"""
+    dist_folder = os.path.join(current_app.static_folder, DIST_DIR)
+    if filename == MANIFEST_NAME or filename.endswith(('.gz', '.br')):
+        abort(404)
+
+    # Лучшая из принятых клиентом кодировок, для которой есть файл: .br, затем .gz
+    response = None
+    for encoding, suffix in PRECOMPRESSED:
+        if not request.accept_encodings[encoding]:
+            continue
+        compressed = safe_join(dist_folder, filename + suffix)
+        if compressed and os.path.isfile(compressed):
+            response = send_from_directory(dist_folder, filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0],
+                                           max_age=ASSET_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(dist_folder, filename, max_age=ASSET_MAX_AGE)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.register_blueprint(assets_bp)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+if __name__ == '__main__':
+    # python -m app.assets - сборка без запуска приложения (например, в Dockerfile)
+    for source, target in build_assets().items():
+        print(f'{source} -> {DIST_DIR}/{target}')
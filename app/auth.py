@@ -2,6 +2,7 @@ from flask_login import LoginManager
 from functools import wraps
 from flask import redirect, url_for, flash, request
 from flask_login import current_user
+from app.cache import user_cache
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -37,3 +38,24 @@ def telegram_auth_required(f):
         request.current_user = user
         return f(*args, **kwargs)
     return decorated_function
+
+
+def load_user_cached(user_id):
+    """
+    Загрузка пользователя для Flask-Login без запроса к БД на каждый запрос.
+    В пределах запроса Flask-Login и так вызывает загрузчик один раз; между запросами
+    отсоединённая копия User живёт в user_cache и подключается к сессии через
+    merge(load=False) - без SELECT. Кэш сбрасывается при изменении пользователя.
+    """
+    from app import db
+    from app.models import User
+    
+    cached = user_cache.get(user_id)
+    if cached is None:
+        cached = db.session.get(User, user_id)
+        if cached is None:
+            return None
+        db.session.expunge(cached)
+        user_cache.set(user_id, cached)
+    
+    return db.session.merge(cached, load=False)
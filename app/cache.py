@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Простой потокобезопасный кэш в памяти процесса: LRU с ограничением размера
+    и необязательным временем жизни записей (ttl в секундах).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Кэш ICS-фидов: user_id -> CalendarFeed
+calendar_cache = TTLCache(maxsize=4096)
+
+# Пользователи для Flask-Login: user_id -> отсоединённый (detached) User.
+# Короткий TTL ограничивает устаревание в других процессах gunicorn
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+# Категории пользователя: user_id -> (список словарей, {id: словарь})
+category_cache = TTLCache(maxsize=10000, ttl=60)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Category, Event
+
+FEED_PAST_DAYS = 90
+FEED_BATCH_SIZE = 500
+
+
+class CalendarFeed:
+    """Готовый ICS пользователя для конкретного data_version + отрендеренные VEVENT"""
+
+    def __init__(self, user_id, version, body, blocks):
+        self.user_id = user_id
+        self.version = version
+        self.body = body
+        self.blocks = blocks
+
+    @property
+    def etag(self):
+        return feed_etag(self.user_id, self.version)
+
+
+def feed_etag(user_id, version):
+    return f'cal-{user_id}-{version}'
+
+
+def ics_escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def render_vevent(event_id, start, end, category, color, description, stamp):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event_id}@time-tracker',
+        f'DTSTAMP:{stamp}',
+        f'DTSTART:{ics_datetime(start)}',
+        f'DTEND:{ics_datetime(end)}',
+        f'SUMMARY:{ics_escape(category)}',
+        f'CATEGORIES:{ics_escape(category)}',
+    ]
+    if color:
+        lines.append(f'COLOR:{color}')
+    if description:
+        lines.append(f'DESCRIPTION:{ics_escape(description)}')
+    lines.append('END:VEVENT')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def build_calendar_feed(user_id, version, previous=None):
+    """
+    Собирает ICS плановых событий пользователя.
+    Строки читаются пачками (yield_per); VEVENT неизменившихся событий
+    берутся из предыдущей сборки, а не рендерятся заново.
+    """
+    previous_blocks = previous.blocks if previous else {}
+    blocks = {}
+    stamp = ics_datetime(datetime.utcnow())
+    since = datetime.utcnow() - timedelta(days=FEED_PAST_DAYS)
+
+    rows = db.session.query(
+        Event.id, Event.start_time, Event.end_time, Category.name, Category.color, Event.description
+    ).outerjoin(Category, Category.id == Event.category_id).filter(
+        Event.user_id == user_id,
+        Event.type == 'plan',
+        Event.deleted_at.is_(None),
+        Event.start_time >= since
+    ).order_by(Event.start_time).yield_per(FEED_BATCH_SIZE)
+
+    chunks = [
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        'PRODID:-//Time Tracker//Plan//RU\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+        'X-WR-CALNAME:Time Tracker - план\r\n'
+    ]
+    for row in rows:
+        event_id, *fields = row
+        key = tuple(fields)
+        cached = previous_blocks.get(event_id)
+        text = cached[1] if cached and cached[0] == key else render_vevent(event_id, *fields, stamp)
+        blocks[event_id] = (key, text)
+        chunks.append(text)
+    chunks.append('END:VCALENDAR\r\n')
+
+    return CalendarFeed(user_id, version, ''.join(chunks).encode('utf-8'), blocks)
@@ -0,0 +1,101 @@
+import click
+from app.models import User
+
+
+def register_commands(app):
+    """CLI-команды: flask <команда>"""
+    
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Сборка css/js в static/dist: имена с хэшем + .gz/.br"""
+        from app.assets import build_assets, DIST_DIR
+        
+        for source, target in build_assets(app.static_folder).items():
+            click.echo(f'{source} -> {DIST_DIR}/{target}')
+    
+    @app.cli.command('profile-token')
+    @click.option('--minutes', default=15, show_default=True, help='Срок действия токена')
+    def profile_token_command(minutes):
+        """Токен для заголовка X-Profile: профиль конкретного запроса (нужен PROFILE_SECRET)"""
+        import time
+        from sampling_profiler import sign_token
+        
+        secret = app.config.get('PROFILE_SECRET')
+        if not secret:
+            raise click.ClickException('PROFILE_SECRET is not set')
+        click.echo(sign_token(secret, int(time.time()) + minutes * 60))
+    
+    @app.cli.command('import-events')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'username', required=True, help='Имя пользователя или Telegram ID')
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'ics']), default=None)
+    @click.option('--batch-size', default=5000, show_default=True)
+    @click.option('--no-create-categories', is_flag=True, help='Пропускать строки с неизвестной категорией')
+    def import_events_command(path, username, file_format, batch_size, no_create_categories):
+        """Импорт истории событий из CSV/ICS пачками"""
+        from app.importer import import_events, iter_records, detect_format
+        
+        user = User.query.filter(
+            (User.username == username) | (User.telegram_id == username)
+        ).first()
+        if not user:
+            raise click.ClickException(f'User not found: {username}')
+        
+        def progress(stats):
+            click.echo(f'  {stats.imported} rows, {stats.rows_per_second:.0f} rows/s')
+        
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            stats = import_events(
+                user.id,
+                iter_records(stream, detect_format(path, file_format)),
+                batch_size=batch_size,
+                create_categories=not no_create_categories,
+                progress=progress
+            )
+        
+        click.echo(f'Imported {stats.imported}, skipped {stats.skipped} '
+                   f'in {stats.elapsed:.1f}s ({stats.rows_per_second:.0f} rows/s)')
+        for error in stats.errors[:10]:
+            click.echo(f"  line {error['line']}: {error['error']}")
+        if stats.aborted:
+            raise click.ClickException(f"Import stopped at line {stats.aborted['line']}: "
+                                       f"{stats.aborted['error']} (rows before it are saved)")
+    
+    @app.cli.command('archive-events')
+    @click.option('--apply', 'apply_changes', is_flag=True, help='Выполнить перенос (по умолчанию только отчёт)')
+    def archive_events_command(apply_changes):
+        """Перенос старых событий в events_archive и сжатые файлы по месяцам"""
+        from app.archive import archive_events
+        
+        report = archive_events(dry_run=not apply_changes).to_dict()
+        click.echo(f"{'Archived' if apply_changes else 'Dry run'}: "
+                   f"{report['rows_archived']} rows in {report['months_archived']} months -> events_archive, "
+                   f"{report['rows_to_files']} rows in {report['months_to_files']} months -> files "
+                   f"in {report['elapsed_seconds']}s")
+        for month in report['months']:
+            click.echo(f'  {month}')
+    
+    @app.cli.command('compact-events')
+    @click.option('--user', 'username', default=None, help='Имя пользователя или Telegram ID (по умолчанию все)')
+    @click.option('--apply', 'apply_changes', is_flag=True, help='Выполнить склейку (по умолчанию только отчёт)')
+    def compact_events_command(username, apply_changes):
+        """Склейка подряд идущих событий одной категории и типа в одну строку"""
+        from app.compaction import compact_events
+        
+        user_id = None
+        if username:
+            user = User.query.filter(
+                (User.username == username) | (User.telegram_id == username)
+            ).first()
+            if not user:
+                raise click.ClickException(f'User not found: {username}')
+            user_id = user.id
+        
+        report = compact_events(user_id, dry_run=not apply_changes).to_dict()
+        
+        click.echo(f"{'Compacted' if apply_changes else 'Dry run'}: {report['users']} users, "
+                   f"{report['rows_scanned']} rows -> {report['rows_after']} "
+                   f"({report['rows_removed']} removed, {report['savings_percent']}%) "
+                   f"in {report['elapsed_seconds']}s")
+        for stats in report['top_users']:
+            click.echo(f"  user_id={stats['user_id']}: {stats['rows']} rows, {stats['rows_removed']} removable")
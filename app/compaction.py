@@ -0,0 +1,199 @@
+import logging
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam
+from app import db
+from app.models import Event, User, bump_data_version
+from app.cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = 500
+
+
+class Run:
+    """Подряд идущие события одного ключа (категория, тип, описание) -> одна строка"""
+
+    def __init__(self, key, event_id, start_time, end_time):
+        self.key = key
+        self.event_id = event_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.original_end = end_time
+        self.merged_ids = []
+
+    def absorb(self, event_id, end_time):
+        self.merged_ids.append(event_id)
+        if end_time > self.end_time:
+            self.end_time = end_time
+
+
+class CompactionReport:
+    """Итоги компактизации (или её пробного прогона)"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.started = time.monotonic()
+        self.users = 0
+        self.rows_scanned = 0
+        self.runs = 0
+        self.rows_removed = 0
+        self.per_user = {}
+
+    @property
+    def rows_after(self):
+        return self.rows_scanned - self.rows_removed
+
+    def add_user(self, user_id, rows, runs):
+        removed = sum(len(run.merged_ids) for run in runs)
+        self.users += 1
+        self.rows_scanned += rows
+        self.runs += len(runs)
+        self.rows_removed += removed
+        if removed:
+            self.per_user[user_id] = {'rows': rows, 'rows_removed': removed}
+
+    def to_dict(self):
+        top_users = sorted(self.per_user.items(), key=lambda item: -item[1]['rows_removed'])[:10]
+        return {
+            'dry_run': self.dry_run,
+            'users': self.users,
+            'rows_scanned': self.rows_scanned,
+            'runs_merged': self.runs,
+            'rows_removed': self.rows_removed,
+            'rows_after': self.rows_after,
+            'savings_percent': round(100.0 * self.rows_removed / self.rows_scanned, 1) if self.rows_scanned else 0.0,
+            'elapsed_seconds': round(time.monotonic() - self.started, 3),
+            'top_users': [{'user_id': user_id, **stats} for user_id, stats in top_users]
+        }
+
+
+def merge_key(category_id, event_type, description):
+    # Разные описания не склеиваем - иначе потеряется текст
+    return category_id, event_type, description or ''
+
+
+def find_runs(rows):
+    """
+    rows - (id, category_id, type, description, start_time, end_time), отсортированные
+    по ключу и start_time. Возвращает только серии, где есть что склеить: соседние
+    (конец = начало) и пересекающиеся интервалы одного ключа.
+    """
+    runs = []
+    current = None
+    for event_id, category_id, event_type, description, start_time, end_time in rows:
+        key = merge_key(category_id, event_type, description)
+        if current is not None and current.key == key and start_time <= current.end_time:
+            current.absorb(event_id, end_time)
+            continue
+        if current is not None and current.merged_ids:
+            runs.append(current)
+        current = Run(key, event_id, start_time, end_time)
+    if current is not None and current.merged_ids:
+        runs.append(current)
+    return runs
+
+
+def _user_rows(user_id):
+    return db.session.query(
+        Event.id, Event.category_id, Event.type, Event.description, Event.start_time, Event.end_time
+    ).filter(
+        Event.user_id == user_id,
+        Event.deleted_at.is_(None)
+    ).order_by(
+        Event.category_id, Event.type, db.func.coalesce(Event.description, ''), Event.start_time, Event.id
+    ).all()
+
+
+def _apply_runs(user_id, runs):
+    """
+    Одна транзакция на пользователя: первая строка серии растягивается на всю серию,
+    остальные удаляются физически. events_purged_version заставит клиентов
+    с более старой версией перезагрузить неделю вместо дельты.
+    """
+    events = Event.__table__
+    users = User.__table__
+    version = bump_data_version(user_id)
+
+    # Строку, поглотившую только вложенные в неё события, менять не нужно
+    extended = [{'run_id': run.event_id, 'run_end': run.end_time}
+                for run in runs if run.end_time != run.original_end]
+    if extended:
+        db.session.execute(
+            events.update().where(events.c.id == bindparam('run_id')).values(
+                end_time=bindparam('run_end'), version=version
+            ),
+            extended
+        )
+
+    merged_ids = [event_id for run in runs for event_id in run.merged_ids]
+    for i in range(0, len(merged_ids), DELETE_CHUNK_SIZE):
+        db.session.execute(events.delete().where(events.c.id.in_(merged_ids[i:i + DELETE_CHUNK_SIZE])))
+
+    db.session.execute(
+        users.update().where(users.c.id == user_id).values(events_purged_version=version)
+    )
+    db.session.commit()
+    user_cache.pop(user_id)
+
+
+def compact_events(user_id=None, dry_run=True):
+    """
+    Склеивает подряд идущие события одного пользователя, категории, типа и описания.
+    dry_run=True - только отчёт об экономии строк, без изменений.
+    """
+    report = CompactionReport(dry_run)
+    user_ids = [user_id] if user_id is not None else [
+        row[0] for row in db.session.query(User.id).order_by(User.id)
+    ]
+
+    for uid in user_ids:
+        rows = _user_rows(uid)
+        runs = find_runs(rows)
+        report.add_user(uid, len(rows), runs)
+        if runs and not dry_run:
+            _apply_runs(uid, runs)
+            logger.info(f"Compaction user_id={uid}: {len(rows)} rows, "
+                        f"{sum(len(run.merged_ids) for run in runs)} removed")
+
+    return report
+
+
+def merge_on_write(event):
+    """
+    Режим склейки при записи (EVENT_MERGE_ON_WRITE): новое событие, которое касается
+    или пересекается с существующими того же ключа, не добавляется отдельной строкой -
+    существующее растягивается. Соседи по обе стороны склеиваются в одно событие,
+    лишние получают tombstone (как при удалении). Возвращает событие, в котором
+    оказался интервал; коммит - за вызывающим.
+    """
+    neighbours = Event.query.filter(
+        Event.user_id == event.user_id,
+        Event.category_id == event.category_id,
+        Event.type == event.type,
+        Event.deleted_at.is_(None),
+        Event.start_time <= event.end_time,
+        Event.end_time >= event.start_time,
+        db.func.coalesce(Event.description, '') == (event.description or '')
+    ).order_by(Event.start_time, Event.id).all()
+
+    if not neighbours:
+        db.session.add(event)
+        return event
+
+    target = neighbours[0]
+    target.start_time = min(target.start_time, event.start_time)
+    target.end_time = max([event.end_time] + [neighbour.end_time for neighbour in neighbours])
+    now = datetime.utcnow()
+    for neighbour in neighbours[1:]:
+        neighbour.deleted_at = now
+    return target
+
+
+def add_event(event):
+    """Добавляет новое событие в сессию; при EVENT_MERGE_ON_WRITE - со склейкой"""
+    if current_app.config.get('EVENT_MERGE_ON_WRITE'):
+        return merge_on_write(event)
+    db.session.add(event)
+    return event
@@ -0,0 +1,47 @@
+import gzip
+from functools import wraps
+from flask import request, make_response
+
+try:
+    import brotli  # необязательная зависимость
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+
+
+def choose_encoding(accept_encodings):
+    """Лучшая поддерживаемая кодировка из Accept-Encoding: br > gzip"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_bytes(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def compress_response(f):
+    """Декоратор: сжимает ответ gzip/brotli по Accept-Encoding клиента"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        response.vary.add('Accept-Encoding')
+        
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200 or 'Content-Encoding' in response.headers):
+            return response
+        
+        encoding = choose_encoding(request.accept_encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < MIN_COMPRESS_SIZE:
+            return response
+        
+        response.set_data(compress_bytes(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+    return decorated_function
@@ -0,0 +1,357 @@
+import csv
+import io
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app import db
+from app.models import Category, Event, bump_data_version
+from app.cache import category_cache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_COLUMNS = ['user_id', 'category_id', 'start_time', 'end_time', 'type', 'source', 'description',
+                  'created_at', 'version']
+
+
+class ImportStats:
+    """Счётчики импорта: прогресс и скорость"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.imported = 0
+        self.skipped = 0
+        self.batches = 0
+        self.categories_created = 0
+        self.errors = []
+        # Файл не дочитан (битый CSV, не UTF-8): пачки до ошибки уже закоммичены
+        self.aborted = None
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.elapsed if self.elapsed > 0 else 0.0
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        if len(self.errors) < 100:
+            self.errors.append({'line': line, 'error': reason})
+
+    def abort(self, line, reason):
+        self.aborted = {'line': line, 'error': reason}
+
+    @property
+    def complete(self):
+        return self.aborted is None
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'batches': self.batches,
+            'categories_created': self.categories_created,
+            'complete': self.complete,
+            'aborted': self.aborted,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors
+        }
+
+
+# ======== ПАРСЕРЫ (потоковые, по одной записи) ========
+
+def iter_csv_records(stream):
+    """
+    CSV с заголовком: category, start_time, end_time[, type, description].
+    Совместим с выгрузкой /api/v1/export.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {
+            'category': (row.get('category') or '').strip(),
+            'start_time': row.get('start_time'),
+            'end_time': row.get('end_time'),
+            'type': (row.get('type') or 'fact').strip(),
+            'description': row.get('description') or None
+        }
+
+
+def _unfold_ics_lines(stream):
+    """Склеивает перенесённые строки ICS (RFC 5545: продолжение начинается с пробела)"""
+    buffered = None
+    for line_num, raw in enumerate(stream, 1):
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and buffered is not None:
+            buffered = (buffered[0], buffered[1] + line[1:])
+            continue
+        if buffered is not None:
+            yield buffered
+        buffered = (line_num, line)
+    if buffered is not None:
+        yield buffered
+
+
+def to_naive_utc(value):
+    """Время с часовым поясом -> наивное UTC, как хранятся события (utcnow)"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_ics_datetime(value, tzid=None):
+    """
+    20250301T090000Z / 20250301T090000 / 20250301. Z и TZID переводятся в UTC;
+    время без пояса (floating) остаётся как есть. Неизвестный TZID - ValueError.
+    """
+    utc = value.endswith('Z')
+    value = value.rstrip('Z')
+    if 'T' in value:
+        parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    else:
+        parsed = datetime.strptime(value, '%Y%m%d')
+    if utc:
+        return parsed
+    if tzid:
+        try:
+            zone = ZoneInfo(tzid.strip('"'))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f'unknown TZID: {tzid}')
+        return to_naive_utc(parsed.replace(tzinfo=zone))
+    return parsed
+
+
+def parse_ics_duration(value):
+    """Длительность ICS вида PT1H30M / P1D"""
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-').lstrip('P')
+    days = hours = minutes = seconds = 0
+    number = ''
+    in_time = False
+    for char in value:
+        if char.isdigit():
+            number += char
+        elif char == 'T':
+            in_time = True
+        else:
+            amount = int(number or 0)
+            number = ''
+            if char == 'W':
+                days += amount * 7
+            elif char == 'D':
+                days += amount
+            elif char == 'H' and in_time:
+                hours += amount
+            elif char == 'M' and in_time:
+                minutes += amount
+            elif char == 'S' and in_time:
+                seconds += amount
+    return sign * timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def _unescape_ics(value):
+    return value.replace('\\n', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def iter_ics_records(stream):
+    """VEVENT -> запись; категория берётся из CATEGORIES, иначе из SUMMARY"""
+    current = None
+    for line_num, line in _unfold_ics_lines(stream):
+        if line == 'BEGIN:VEVENT':
+            current = {'line': line_num}
+            continue
+        if current is None:
+            continue
+        if line == 'END:VEVENT':
+            start = end = error = None
+            try:
+                if current.get('DTSTART'):
+                    start = parse_ics_datetime(current['DTSTART'], current.get('DTSTART;TZID'))
+                if current.get('DTEND'):
+                    end = parse_ics_datetime(current['DTEND'], current.get('DTEND;TZID'))
+                elif start and current.get('DURATION'):
+                    end = start + parse_ics_duration(current['DURATION'])
+            except ValueError as e:
+                error = str(e)
+            category = current.get('CATEGORIES', '').split(',')[0] or current.get('SUMMARY', '')
+            yield current['line'], {
+                'category': _unescape_ics(category).strip(),
+                'start_time': start,
+                'end_time': end,
+                'type': 'fact',
+                'description': _unescape_ics(current['DESCRIPTION']) if current.get('DESCRIPTION') else None,
+                'error': error
+            }
+            current = None
+            continue
+
+        name, _, value = line.partition(':')
+        name, *params = name.split(';')
+        name = name.upper()
+        current[name] = value
+        for param in params:
+            key, _, param_value = param.partition('=')
+            if key.upper() == 'TZID':
+                current[f'{name};TZID'] = param_value
+
+
+def _parse_datetime(value):
+    """ISO (со смещением или Z - переводится в UTC) или время ICS; datetime - как есть"""
+    if value is None:
+        raise ValueError('missing time')
+    if isinstance(value, datetime):
+        return value
+    value = value.strip()
+    if value[:8].isdigit():
+        return parse_ics_datetime(value)
+    return to_naive_utc(datetime.fromisoformat(value))
+
+
+# ======== ЗАПИСЬ ПАЧКАМИ ========
+
+def _resolve_categories(user_id, names, cache, create_missing, stats):
+    """Имена категорий -> id: один запрос на пачку, только для ещё не известных имён"""
+    unknown = {name for name in names if name not in cache}
+    if not unknown:
+        return
+
+    for category_id, name in db.session.query(Category.id, Category.name).filter(
+        Category.user_id == user_id,
+        Category.name.in_(unknown)
+    ):
+        cache[name] = category_id
+
+    missing = [name for name in unknown if name not in cache]
+    if missing and create_missing:
+        db.session.execute(Category.__table__.insert(), [
+            {'user_id': user_id, 'name': name, 'color': '#4361ee', 'created_at': datetime.utcnow()}
+            for name in missing
+        ])
+        stats.categories_created += len(missing)
+        category_cache.pop(user_id)
+        for category_id, name in db.session.query(Category.id, Category.name).filter(
+            Category.user_id == user_id,
+            Category.name.in_(missing)
+        ):
+            cache[name] = category_id
+
+
+def _copy_rows(rows):
+    """Postgres: COPY FROM STDIN в транзакции текущей сессии"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] if row[column] is not None else '' for column in IMPORT_COLUMNS])
+    buffer.seek(0)
+
+    raw_connection = db.session.connection().connection
+    with raw_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {Event.__tablename__} ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+
+def _insert_batch(rows):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _copy_rows(rows)
+    else:
+        # executemany одним вызовом
+        db.session.execute(Event.__table__.insert(), rows)
+
+
+def import_events(user_id, records, batch_size=IMPORT_BATCH_SIZE, create_categories=True, progress=None):
+    """
+    Импорт потока записей (line, record) от iter_csv_records / iter_ics_records.
+    Каждая пачка - один запрос категорий и одна вставка; коммит после каждой пачки,
+    чтобы долгий импорт не держал одну огромную транзакцию.
+    Если файл не читается дальше (csv.Error, не UTF-8), уже прочитанное сохраняется,
+    а stats.aborted указывает строку и ошибку - импорт частичный.
+    progress(stats) вызывается после каждой пачки.
+    """
+    stats = ImportStats()
+    category_cache = {}
+    batch = []
+
+    def flush():
+        _resolve_categories(user_id, {record['category'] for _, record in batch},
+                            category_cache, create_categories, stats)
+        rows = []
+        now = datetime.utcnow()
+        for line, record in batch:
+            category_id = category_cache.get(record['category'])
+            if category_id is None:
+                stats.skip(line, f"unknown category: {record['category']}")
+                continue
+            rows.append({
+                'user_id': user_id,
+                'category_id': category_id,
+                'start_time': record['start_time'],
+                'end_time': record['end_time'],
+                'type': record['type'],
+                'source': 'import',
+                'description': record['description'],
+                'created_at': now
+            })
+        if rows:
+            version = bump_data_version(user_id)
+            for row in rows:
+                row['version'] = version
+            _insert_batch(rows)
+        db.session.commit()
+
+        stats.imported += len(rows)
+        stats.batches += 1
+        logger.info(f"Import user_id={user_id}: {stats.imported} rows, "
+                    f"{stats.rows_per_second:.0f} rows/s")
+        if progress:
+            progress(stats)
+        batch.clear()
+
+    line = 0
+    try:
+        for line, record in records:
+            try:
+                if record.get('error'):
+                    raise ValueError(record['error'])
+                if not record['category']:
+                    raise ValueError('missing category')
+                record['start_time'] = _parse_datetime(record['start_time'])
+                record['end_time'] = _parse_datetime(record['end_time'])
+                if record['end_time'] <= record['start_time']:
+                    raise ValueError('end_time must be after start_time')
+                if record['type'] not in ('plan', 'fact'):
+                    raise ValueError(f"invalid type: {record['type']}")
+            except ValueError as e:
+                stats.skip(line, str(e))
+                continue
+
+            batch.append((line, record))
+            if len(batch) >= batch_size:
+                flush()
+    except (csv.Error, UnicodeDecodeError) as e:
+        # Номер строки - последней прочитанной; ошибка где-то после неё
+        stats.abort(line + 1, f'{e.__class__.__name__}: {e}')
+        logger.warning(f"Import user_id={user_id} aborted after line {line}: {e}")
+
+    if batch:
+        flush()
+
+    return stats
+
+
+def detect_format(filename, explicit=None):
+    if explicit:
+        return explicit.lower()
+    return 'ics' if filename and filename.lower().endswith('.ics') else 'csv'
+
+
+def iter_records(stream, file_format):
+    if file_format == 'ics':
+        return iter_ics_records(stream)
+    if file_format == 'csv':
+        return iter_csv_records(stream)
+    raise ValueError(f'Unsupported format: {file_format}')
@@ -0,0 +1,112 @@
+import hmac
+import time
+from flask import Blueprint, Response, current_app, g, has_request_context, request, abort
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+metrics_bp = Blueprint('metrics', __name__)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUESTS = Counter('http_requests_total', 'Запросы по эндпоинту и статусу', ['endpoint', 'method', 'status'])
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL-запросов на один HTTP-запрос',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+DB_QUERIES = Counter('db_queries_total', 'Все SQL-запросы процесса')
+
+
+class PoolCollector:
+    """Состояние пула соединений SQLAlchemy - снимается в момент запроса /metrics"""
+
+    def __init__(self):
+        self.engine = None
+
+    def collect(self):
+        if self.engine is None:
+            return
+        pool = self.engine.pool
+        # У NullPool/SingletonThreadPool (SQLite) части счётчиков нет
+        for name, attr, help_text in (
+            ('db_pool_size', 'size', 'Размер пула соединений'),
+            ('db_pool_checked_out', 'checkedout', 'Соединений выдано'),
+            ('db_pool_checked_in', 'checkedin', 'Свободных соединений в пуле'),
+            ('db_pool_overflow', 'overflow', 'Соединений сверх размера пула'),
+        ):
+            method = getattr(pool, attr, None)
+            if method is None:
+                continue
+            try:
+                value = method()
+            except (AttributeError, NotImplementedError, TypeError):
+                continue
+            yield GaugeMetricFamily(name, help_text, value=value)
+
+
+class SubscribersCollector:
+    def collect(self):
+        from app.pubsub import get_broker
+        yield GaugeMetricFamily('sse_subscribers', 'Открытых SSE-подписок в процессе',
+                                value=get_broker().subscriber_count())
+
+
+# Регистрируются при импорте модуля - один раз на процесс, даже если create_app вызывается снова
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+REGISTRY.register(SubscribersCollector())
+
+
+def _endpoint():
+    # Шаблон маршрута, а не URL - иначе метка на каждый id
+    return request.endpoint or 'unmatched'
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+
+
+def _record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None or request.endpoint == 'metrics.metrics':
+        return response
+    endpoint = _endpoint()
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    REQUEST_QUERIES.labels(endpoint).observe(g.pop('metrics_queries', 0))
+    return response
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """
+    Метрики в текстовом формате Prometheus - только с Bearer-токеном METRICS_TOKEN.
+    Токен не задан - эндпоинта нет (404): метки раскрывают маршруты и нагрузку.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied, token):
+        abort(403)
+    return Response(generate_latest(REGISTRY), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app, engine):
+    app.register_blueprint(metrics_bp)
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    if not event.contains(engine, 'before_cursor_execute', _count_query):
+        event.listen(engine, 'before_cursor_execute', _count_query)
+    pool_collector.engine = engine
@@ -1,7 +1,12 @@
 from datetime import datetime
+import secrets
 from flask_login import UserMixin
+from sqlalchemy import event, exists, inspect, select
+from sqlalchemy.orm import Session, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from app.cache import user_cache, category_cache
+from app.replica import reads_from_replica
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -10,11 +15,24 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), nullable=False)
     telegram_id = db.Column(db.String(64), unique=True, nullable=True)
     password_hash = db.Column(db.String(256))
+    calendar_token = db.Column(db.String(64), unique=True, nullable=True)
+    # Растёт при любом изменении событий/категорий пользователя (ключ кэшей и ETag)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Версия последнего физического удаления событий (компактизация): клиенты
+    # с более старой версией не узнают об удалённых строках и должны перезагрузиться
+    events_purged_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
+    def get_calendar_token(self):
+        """Токен подписки на календарь (создаётся при первом обращении)"""
+        if not self.calendar_token:
+            self.calendar_token = secrets.token_urlsafe(24)
+            db.session.commit()
+        return self.calendar_token
+    
     def check_password(self, password):
         return check_password_hash(self.password_hash, password) if self.password_hash else False
     
@@ -34,6 +52,8 @@ class Category(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'name', name='unique_category_per_user'),
+        # Категории пользователя по порядку id - без сортировки
+        db.Index('idx_category_user', 'user_id', 'id'),
     )
     
     def to_dict(self):
@@ -61,10 +81,19 @@ class Event(db.Model):
     source = db.Column(db.String(10), nullable=False, default='web')
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # data_version пользователя на момент последнего изменения (для /events/changes)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Tombstone: удалённые события остаются, чтобы клиенты узнали об удалении
+    deleted_at = db.Column(db.DateTime, nullable=True)
     
     __table_args__ = (
         db.Index('idx_event_user', 'user_id'),
         db.Index('idx_event_user_time', 'user_id', 'start_time'),
+        db.Index('idx_event_user_version', 'user_id', 'version'),
+        # Фильтры по категории/типу с сортировкой по времени (/api/my/events,
+        # статистика, bootstrap, ICS-фид) - см. test_query_plans.py
+        db.Index('idx_event_user_category_time', 'user_id', 'category_id', 'start_time'),
+        db.Index('idx_event_user_type_time', 'user_id', 'type', 'start_time'),
     )
     
     def to_dict(self):
@@ -76,13 +105,56 @@ class Event(db.Model):
             'type': self.type,
             'source': self.source,
             'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'version': self.version
         }
     
     def __repr__(self):
         return f'<Event {self.type} {self.start_time}>'
 
 
+class EventArchive(db.Model):
+    """
+    Старые события, перенесённые из events (app/archive.py). На Postgres таблица
+    секционирована по месяцам start_time, на SQLite - обычная. Внешних ключей нет:
+    архив - история только для чтения.
+    """
+    __tablename__ = 'events_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    # В ключе - колонка секционирования (требование Postgres)
+    start_time = db.Column(db.DateTime, primary_key=True)
+    end_time = db.Column(db.DateTime, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    source = db.Column(db.String(10), nullable=False)
+    description = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('idx_event_archive_user_time', 'user_id', 'start_time'),
+        # Итоги по типам в /api/my/stats (archived_counts)
+        db.Index('idx_event_archive_user_type_time', 'user_id', 'type', 'start_time'),
+        {'postgresql_partition_by': 'RANGE (start_time)'}
+    )
+
+
+class EventArchiveMonth(db.Model):
+    """Реестр архивных месяцев: сколько строк в events_archive и в сжатом файле"""
+    __tablename__ = 'event_archive_months'
+    
+    month = db.Column(db.Date, primary_key=True)
+    warm_rows = db.Column(db.Integer, nullable=False, default=0)
+    cold_rows = db.Column(db.Integer, nullable=False, default=0)
+    path = db.Column(db.String(255))
+    # Строки файла по пользователям: JSON {user_id: {category_id: {type: строк}}} -
+    # для статистики и проверок без чтения файла
+    cold_counts = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Template(db.Model):
     __tablename__ = 'templates'
     
@@ -92,5 +164,240 @@ class Template(db.Model):
     data = db.Column(db.JSON, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'data': self.data,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
     def __repr__(self):
         return f'<Template {self.name}>'
+
+
+
+# Фиксируем классы при импорте: create_app подменяет models.Category на PatchedCategory
+_VERSIONED_MODELS = (Event, Category)
+
+
+def _load_user_categories(user_id):
+    categories = Category.__table__
+    rows = db.session.execute(
+        select(categories.c.id, categories.c.name, categories.c.color,
+               categories.c.description, categories.c.created_at)
+        .where(categories.c.user_id == user_id)
+        .order_by(categories.c.id)
+    ).mappings()
+    return _index_categories([category_row_to_dict(row) for row in rows])
+
+
+def category_row_to_dict(row, prefix=''):
+    """Строка с колонками категории (id, name, color, description, created_at) -> словарь как Category.to_dict"""
+    created_at = row[f'{prefix}created_at']
+    return {
+        'id': row[f'{prefix}id'],
+        'name': row[f'{prefix}name'],
+        'color': row[f'{prefix}color'],
+        'description': row[f'{prefix}description'],
+        'created_at': created_at.isoformat() if created_at else None
+    }
+
+
+def _index_categories(category_list):
+    return category_list, {category['id']: category for category in category_list}
+
+
+def prime_user_categories(user_id, category_list):
+    """Кладёт в кэш категории, уже прочитанные другим запросом (например, вместе с пользователем)"""
+    if category_cache.get(user_id) is None:
+        category_cache.set(user_id, _index_categories(category_list))
+
+
+def _cached_user_categories(user_id):
+    cached = category_cache.get(user_id)
+    if cached is None:
+        cached = _load_user_categories(user_id)
+        # Прочитанное с реплики может отставать - в общий кэш (и ETag бота) не кладём
+        if not reads_from_replica():
+            category_cache.set(user_id, cached)
+    return cached
+
+
+def get_user_categories(user_id):
+    """Категории пользователя (словари как Category.to_dict) из кэша; не изменять"""
+    return _cached_user_categories(user_id)[0]
+
+
+def user_has_categories(user_id):
+    """Есть ли у пользователя категории: из кэша, иначе EXISTS без загрузки списка"""
+    cached = category_cache.get(user_id)
+    if cached is not None:
+        return bool(cached[0])
+    categories = Category.__table__
+    return db.session.execute(
+        select(exists().where(categories.c.user_id == user_id))
+    ).scalar()
+
+
+def get_user_category(user_id, category_id):
+    """Категория пользователя по id или None - заменяет запрос для проверки владельца"""
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    return _cached_user_categories(user_id)[1].get(category_id)
+
+
+def _next_data_version(session, user_id, bulk=False):
+    """
+    Увеличивает data_version и возвращает новое значение. UPDATE блокирует строку
+    пользователя до конца транзакции, поэтому версии коммитятся по порядку.
+    Диапазон версий транзакции копится в session.info для публикации после коммита.
+    """
+    users = User.__table__
+    connection = session.connection()
+    connection.execute(
+        users.update().where(users.c.id == user_id).values(data_version=users.c.data_version + 1)
+    )
+    version = connection.execute(select(users.c.data_version).where(users.c.id == user_id)).scalar()
+    
+    versions = session.info.setdefault('data_versions', {})
+    first_version = versions.get(user_id, (version, version))[0]
+    versions[user_id] = (first_version, version)
+    if bulk:
+        session.info.setdefault('bulk_changed_users', set()).add(user_id)
+    return version
+
+
+def get_data_version(user_id):
+    """Текущая data_version пользователя (из БД, а не из закэшированного current_user)"""
+    return db.session.query(User.data_version).filter_by(id=user_id).scalar() or 0
+
+
+def get_sync_versions(user_id):
+    """(data_version, events_purged_version) пользователя одним запросом"""
+    row = db.session.query(User.data_version, User.events_purged_version).filter_by(id=user_id).first()
+    return (row[0] or 0, row[1] or 0) if row else (0, 0)
+
+
+def bump_data_version(user_id):
+    """
+    Новая data_version для массовых операций в обход ORM (bulk insert, query.update):
+    её нужно записать в Event.version затронутых строк.
+    """
+    return _next_data_version(db.session(), user_id, bulk=True)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user_cache(mapper, connection, target):
+    """Смена профиля/пароля сбрасывает кэш загрузчика Flask-Login"""
+    user_cache.pop(target.id)
+
+
+@event.listens_for(Category, 'after_insert', propagate=True)
+@event.listens_for(Category, 'after_update', propagate=True)
+@event.listens_for(Category, 'after_delete', propagate=True)
+def _invalidate_category_cache(mapper, connection, target):
+    """Сброс при изменении и повторно после коммита - чтобы параллельный запрос
+    не закэшировал данные из ещё не закоммиченной транзакции"""
+    category_cache.pop(target.user_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('category_cache_users', set()).add(target.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_category_cache_on_commit(session):
+    # after_commit/after_rollback срабатывают и для точек сохранения - их пропускаем
+    if session.in_nested_transaction():
+        return
+    for user_id in session.info.pop('category_cache_users', ()):
+        category_cache.pop(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_category_cache_users(session):
+    if session.in_nested_transaction():
+        return
+    # Внутри транзакции кэш мог заполниться незакоммиченными категориями
+    for user_id in session.info.pop('category_cache_users', ()):
+        category_cache.pop(user_id)
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_versions_on_flush(session, flush_context, instances):
+    """
+    Изменения событий и категорий через ORM автоматически увеличивают data_version,
+    а изменённые события получают эту версию в Event.version.
+    """
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, _VERSIONED_MODELS) and obj.user_id
+        and (obj not in session.dirty or session.is_modified(obj))
+    ]
+    if not changed:
+        return
+    
+    versions = {}
+    for user_id in sorted({obj.user_id for obj in changed}):
+        versions[user_id] = _next_data_version(session, user_id)
+    
+    for obj in changed:
+        if isinstance(obj, Event) and obj not in session.deleted:
+            obj.version = versions[obj.user_id]
+
+
+def configure_sqlite_transactions(engine):
+    """
+    pysqlite сам решает, когда открыть транзакцию, и SAVEPOINT без BEGIN
+    коммитится сразу. Для SQLite транзакции открываются явно - тогда точки
+    сохранения (begin_nested, /api/v1/batch) работают как в PostgreSQL.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def _emit_begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+def add_missing_columns():
+    """
+    db.create_all() не добавляет новые колонки и индексы в существующие таблицы -
+    добавляем недостающие колонки (nullable или с server_default) через ALTER TABLE
+    и недостающие индексы.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    dialect = db.engine.dialect
+    
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                print(f"⚠️ Can't add NOT NULL column {table.name}.{column.name} without default")
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect)}'
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable:
+                ddl += ' NOT NULL'
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(ddl)
+            print(f"✅ Column {table.name}.{column.name} added")
+        
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.engine)
+                print(f"✅ Index {index.name} created")
@@ -0,0 +1,39 @@
+import os
+import threading
+from flask import current_app, g, request
+from sampling_profiler import StackSampler, sampled, verify_token, write_profile
+
+PROFILE_HEADER = 'X-Profile'
+
+
+def _start_profile():
+    config = current_app.config
+    by_header = verify_token(config.get('PROFILE_SECRET'), request.headers.get(PROFILE_HEADER))
+    if not by_header and not sampled(config.get('PROFILE_SAMPLE_RATE', 0)):
+        return
+    g.profiler = StackSampler(threading.get_ident(), config.get('PROFILE_INTERVAL_MS', 5) / 1000).start()
+    g.profile_by_header = by_header
+
+
+def _finish_profile(response):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return response
+    sampler.stop()
+    path = write_profile(current_app.config['PROFILE_DIR'], f'{request.method}-{request.endpoint}', sampler)
+    if path and g.pop('profile_by_header', False):
+        # Тот, кто запросил профиль заголовком, узнаёт имя файла
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
+
+
+def init_profiling(app):
+    """
+    Профилирование запросов: доля PROFILE_SAMPLE_RATE или подписанный заголовок
+    X-Profile (flask profile-token). Если не задано ни то, ни другое - хуки
+    не регистрируются вовсе.
+    """
+    if not app.config.get('PROFILE_SAMPLE_RATE') and not app.config.get('PROFILE_SECRET'):
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
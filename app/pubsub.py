@@ -0,0 +1,215 @@
+import json
+import queue
+import select
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class Subscription:
+    """Очередь сообщений одного подписчика (одно SSE-соединение)"""
+
+    def __init__(self, channel, maxsize=100):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LocalBroker:
+    """
+    Pub/sub в памяти процесса. Сообщения доходят только до подписчиков этого же
+    процесса - при нескольких воркерах gunicorn нужен внешний брокер с тем же
+    интерфейсом (subscribe / unsubscribe / publish), см. set_broker().
+    """
+
+    # Доходят ли сообщения до подписчиков других процессов - без этого SSE выключен
+    cross_process = False
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Медленный клиент: пропускаем, он догонит через /events/changes
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Pub/sub между процессами через LISTEN/NOTIFY PostgreSQL. Публикация -
+    pg_notify в общий канал; фоновый поток каждого процесса слушает канал
+    и раздаёт сообщения своим подписчикам. Сообщение, потерянное при обрыве
+    соединения, клиент догонит через /events/changes.
+    """
+
+    cross_process = True
+    PG_CHANNEL = 'schedule_changes'
+    # NOTIFY принимает до 8000 байт
+    MAX_PAYLOAD_BYTES = 7900
+    RECONNECT_SECONDS = 5
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self._publish_connection = None
+        self._publish_lock = threading.Lock()
+        threading.Thread(target=self._listen, name='pubsub-listener', daemon=True).start()
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(self.url)
+        connection.autocommit = True
+        return connection
+
+    def publish(self, channel, message):
+        import psycopg2
+
+        payload = json.dumps({'channel': channel, 'message': message})
+        if len(payload.encode('utf-8')) > self.MAX_PAYLOAD_BYTES:
+            # Не влезает в NOTIFY - только версии, клиент запросит дельту сам
+            message = dict(message, changed=[], deleted=[], complete=False)
+            payload = json.dumps({'channel': channel, 'message': message})
+
+        with self._publish_lock:
+            try:
+                if self._publish_connection is None or self._publish_connection.closed:
+                    self._publish_connection = self._connect()
+                with self._publish_connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_notify(%s, %s)', (self.PG_CHANNEL, payload))
+            except psycopg2.Error:
+                # Вызывается после коммита - запись уже сохранена, теряется только push
+                self._publish_connection = None
+
+    def _listen(self):
+        import psycopg2
+
+        while True:
+            connection = None
+            try:
+                connection = self._connect()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.PG_CHANNEL}')
+                while True:
+                    if not select.select([connection], [], [], 60)[0]:
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        data = json.loads(connection.notifies.pop(0).payload)
+                        super().publish(data['channel'], data['message'])
+            except psycopg2.Error:
+                time.sleep(self.RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+broker = LocalBroker()
+
+
+def get_broker():
+    return broker
+
+
+def set_broker(new_broker):
+    """Подменить брокер (например, на Redis pub/sub) при старте приложения"""
+    global broker
+    broker = new_broker
+
+
+def stream_enabled():
+    """
+    SSE (/events/stream) - только с брокером между процессами: с брокером в памяти
+    воркер не увидит изменений, закоммиченных в другом воркере. Без него страница
+    опрашивает /events/changes.
+    """
+    return broker.cross_process
+
+
+def init_pubsub(app):
+    url = app.config.get('PUBSUB_URL')
+    # Брокер (и его поток-слушатель) - один на процесс, даже если create_app вызывается снова
+    if url and getattr(broker, 'url', None) != url:
+        set_broker(PostgresBroker(url))
+    app.jinja_env.globals['event_stream_enabled'] = stream_enabled
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+# ======== ПУБЛИКАЦИЯ ИЗМЕНЕНИЙ ПОСЛЕ КОММИТА ========
+
+@event.listens_for(Session, 'after_flush')
+def _collect_event_changes(session, flush_context):
+    """Сериализуем изменённые события сразу после flush - после коммита объекты уже expired"""
+    from app.models import Event
+
+    pending = session.info.setdefault('pubsub_events', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Event) and obj.user_id:
+            pending.setdefault(obj.user_id, {})[obj.id] = obj.to_dict() if obj.deleted_at is None else None
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_changes(session):
+    """
+    Сообщение на пользователя за транзакцию:
+    {version, previous_version, changed, deleted, complete}.
+    complete=false - были массовые изменения в обход ORM, клиенту нужно /events/changes.
+    """
+    if session.in_nested_transaction():
+        # Точка сохранения (batch) - ждём коммита всей транзакции
+        return
+    versions = session.info.pop('data_versions', {})
+    events = session.info.pop('pubsub_events', {})
+    bulk_users = session.info.pop('bulk_changed_users', set())
+
+    for user_id, (first_version, last_version) in versions.items():
+        user_events = events.get(user_id, {})
+        broker.publish(user_channel(user_id), {
+            'version': last_version,
+            'previous_version': first_version - 1,
+            'changed': [data for data in user_events.values() if data is not None],
+            'deleted': [event_id for event_id, data in user_events.items() if data is None],
+            'complete': user_id not in bulk_users
+        })
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop('data_versions', None)
+    session.info.pop('pubsub_events', None)
+    session.info.pop('bulk_changed_users', None)
@@ -0,0 +1,146 @@
+import math
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_login import current_user
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+from app.cache import TTLCache
+
+REPLICA_BIND = 'replica'
+# Cookie с unix-временем, до которого клиент читает из основной БД - работает
+# и когда следующий запрос попадает в другой процесс gunicorn
+STICKY_COOKIE = 'rw_until'
+
+# user_id -> unix-время, до которого пользователь читает из основной БД.
+# Покрывает клиентов без cookie (бот) в пределах процесса
+recent_writes = TTLCache(maxsize=10000)
+
+
+class RoutingSession(FlaskSession):
+    """
+    Сессия, которая в эндпоинтах с @read_replica выполняет чтение на реплике.
+    Flush, INSERT/UPDATE/DELETE и всё вне таких эндпоинтов - основная БД.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_request_context() and g.get('read_replica')):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads_from_replica():
+    """Идут ли запросы текущего обработчика на реплику"""
+    return has_request_context() and g.get('read_replica', False)
+
+
+def _request_user_id():
+    if current_user.is_authenticated:
+        return current_user.id
+    # telegram_auth_required кладёт пользователя в request
+    user = getattr(request, 'current_user', None)
+    return user.id if user is not None else None
+
+
+def _sticky(user_id):
+    now = time.time()
+    cookie = request.cookies.get(STICKY_COOKIE, '')
+    if cookie.isdigit() and int(cookie) > now:
+        return True
+    return user_id is not None and recent_writes.get(user_id, 0) > now
+
+
+def read_replica(view):
+    """
+    Эндпоинт только для чтения: запросы идут на реплику (SQLALCHEMY_BINDS['replica']).
+    Пользователь, писавший последние READ_YOUR_WRITES_SECONDS, читает из основной БД -
+    реплика могла ещё не догнать его запись. Без реплики декоратор ничего не делает.
+    Флаг восстанавливается после обработчика: операции /batch делят g с внешним
+    запросом, и следующая операция не должна унаследовать чтение с реплики.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get('read_replica', False)
+        if REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}) and not g.get('primary_reads'):
+            g.read_replica = not _sticky(_request_user_id())
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.read_replica = previous
+    return wrapper
+
+
+def primary_reads(view):
+    """
+    Всё внутри обработчика читает из основной БД, даже вложенные @read_replica -
+    для /batch: его операции должны видеть то, что предыдущие операции уже
+    записали (flush) в незакоммиченную транзакцию основной БД.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        previous = g.get('primary_reads', False)
+        g.primary_reads = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.primary_reads = previous
+    return wrapper
+
+
+# ======== ЗАПОМИНАЕМ ЗАПИСИ ПОЛЬЗОВАТЕЛЕЙ ========
+
+@event.listens_for(Session, 'after_flush')
+def _collect_written_users(session, flush_context):
+    users = session.info.setdefault('written_users', set())
+    # data_versions - в том числе массовые изменения в обход ORM (bump_data_version)
+    users.update(session.info.get('data_versions', {}))
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        user_id = getattr(obj, 'user_id', None)
+        if user_id:
+            users.add(user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remember_writes(session):
+    if session.in_nested_transaction():
+        return
+    users = session.info.pop('written_users', None)
+    if not users or not has_request_context():
+        return
+    until = time.time() + current_app.config.get('READ_YOUR_WRITES_SECONDS', 0)
+    for user_id in users:
+        recent_writes.set(user_id, until)
+    g.sticky_until = until
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_writes(session):
+    if not session.in_nested_transaction():
+        session.info.pop('written_users', None)
+
+
+def _set_sticky_cookie(response):
+    until = g.pop('sticky_until', None)
+    if until is not None:
+        if current_user.is_authenticated:
+            # Запись в профиль и т.п. без user_id в изменённых строках
+            recent_writes.set(current_user.id, until)
+        response.set_cookie(STICKY_COOKIE, str(math.ceil(until)),
+                            max_age=math.ceil(until - time.time()), httponly=True, samesite='Lax')
+    return response
+
+
+def init_replica(app):
+    """Реплика настраивается как основная БД; без неё хуки не регистрируются"""
+    from app import db
+    from app.models import configure_sqlite_transactions
+
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+    configure_sqlite_transactions(db.engines[REPLICA_BIND])
+    app.after_request(_set_sticky_cookie)
@@ -1,9 +1,24 @@
-from flask import Blueprint, request, jsonify
-from flask_login import login_required
+from flask import Blueprint, request, jsonify, current_app, g, has_app_context
+from flask_login import login_required, current_user
 from app import db
-from app.models import User, Category, Event, Template
+from app.models import (User, Category, Event, Template, bump_data_version,
+                        get_user_categories, get_user_category, user_has_categories,
+                        category_row_to_dict, prime_user_categories)
 from app.auth import telegram_auth_required
-from datetime import datetime, timedelta
+from app.cache import category_cache
+from app.compaction import add_event
+from app.replica import primary_reads, read_replica
+from app.utils import (load_busy_intervals, find_free_intervals, free_slots_to_dict,
+                       parse_week_id, get_week_start, current_week, normalize_template_data,
+                       expand_template, merge_intervals, overlaps_any)
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from bisect import insort
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from werkzeug.exceptions import HTTPException
+import copy
+import hashlib
 import re
 
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
@@ -28,36 +43,137 @@ def telegram_auth():
             'status': 'authenticated',
             'user_id': user.id,
             'username': user.username,
-            'has_categories': Category.query.filter_by(user_id=user.id).count() > 0
+            'has_categories': user_has_categories(user.id)
         }), 200
     else:
         # Новый пользователь - нужно зарегистрироваться через веб
-        return jsonify({
-            'status': 'needs_registration',
-            'message': 'Please complete registration via web interface first',
-            'registration_url': f'https://time-tracker-z6co.onrender.com/register?telegram_id={telegram_id}'
-        }), 404
+        return needs_registration(telegram_id)
 
-@api_bp.route('/telegram/categories', methods=['GET'])
-@telegram_auth_required
-def telegram_categories():
-    """Получить категории пользователя для Telegram-бота"""
-    user = request.current_user
-    categories = Category.query.filter_by(user_id=user.id).all()
-    
-    # Формат для inline-клавиатуры Telegram
+def needs_registration(telegram_id):
     return jsonify({
+        'status': 'needs_registration',
+        'message': 'Please complete registration via web interface first',
+        'registration_url': f'https://time-tracker-z6co.onrender.com/register?telegram_id={telegram_id}'
+    }), 404
+
+def telegram_categories_payload(categories):
+    """Категории в формате для inline-клавиатуры Telegram"""
+    return {
         'categories': [{
-            'id': cat.id,
-            'name': cat.name,
-            'color': cat.color
+            'id': cat['id'],
+            'name': cat['name'],
+            'color': cat['color']
         } for cat in categories],
         'quick_replies': [
-            {'text': cat.name, 'callback_data': f'cat_{cat.id}'}
+            {'text': cat['name'], 'callback_data': f"cat_{cat['id']}"}
             for cat in categories[:10]  # Ограничение для Telegram
         ]
+    }
+
+def categories_etag(categories):
+    """ETag набора категорий: меняется при добавлении, удалении и изменении категорий"""
+    key = repr([(cat['id'], cat['name'], cat['color']) for cat in categories])
+    return f"cat-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+@api_bp.route('/telegram/categories', methods=['GET'])
+@telegram_auth_required
+@read_replica
+def telegram_categories():
+    """
+    Получить категории пользователя для Telegram-бота.
+    Бот кэширует клавиатуру и перепроверяет её с If-None-Match - без изменений 304.
+    """
+    user = request.current_user
+    categories = get_user_categories(user.id)
+    etag = categories_etag(categories)
+    
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(telegram_categories_payload(categories))
+    response.set_etag(etag)
+    return response
+
+@api_bp.route('/telegram/bootstrap', methods=['GET'])
+def telegram_bootstrap():
+    """
+    Старт диалога с ботом за один вызов: пользователь, категории, быстрые ответы
+    и текущее состояние (идущие сейчас события плана и факта).
+    Всё читается одним запросом: users LEFT JOIN идущие события LEFT JOIN categories.
+    """
+    telegram_id = request.headers.get('X-Telegram-ID') or request.args.get('telegram_id')
+    if not telegram_id:
+        return jsonify({'error': 'Telegram ID required'}), 401
+    
+    now = datetime.utcnow()
+    rows = db.session.execute(bootstrap_query(str(telegram_id), now)).mappings().all()
+    if not rows:
+        return needs_registration(telegram_id)
+    
+    first = rows[0]
+    user_id = first['user_id']
+    categories = [category_row_to_dict(row, prefix='category_')
+                  for row in rows if row['category_id'] is not None]
+    prime_user_categories(user_id, categories)
+    names = {category['id']: category['name'] for category in categories}
+    
+    def active_event(prefix):
+        if first[f'{prefix}_id'] is None:
+            return None
+        return {
+            'id': first[f'{prefix}_id'],
+            'category_id': first[f'{prefix}_category_id'],
+            'category_name': names.get(first[f'{prefix}_category_id']),
+            'start_time': first[f'{prefix}_start_time'].isoformat(),
+            'end_time': first[f'{prefix}_end_time'].isoformat()
+        }
+    
+    tracking = {'fact': active_event('fact'), 'plan': active_event('plan')}
+    tracking['active'] = tracking['fact'] is not None
+    
+    return jsonify({
+        'status': 'authenticated',
+        'user': {'id': user_id, 'username': first['username']},
+        'has_categories': bool(categories),
+        **telegram_categories_payload(categories),
+        'categories_etag': categories_etag(categories),
+        'tracking': tracking,
+        'server_time': now.isoformat()
     })
 
+def bootstrap_query(telegram_id, now):
+    """Строка на каждую категорию; колонки пользователя и текущих событий в них повторяются"""
+    users = User.__table__
+    events = Event.__table__
+    categories = Category.__table__
+    
+    def current_event_id(event_type):
+        # Последнее начавшееся событие типа, которое идёт в момент now
+        lookup = events.alias(f'current_{event_type}')
+        return select(lookup.c.id).where(
+            lookup.c.user_id == users.c.id,
+            lookup.c.type == event_type,
+            lookup.c.deleted_at.is_(None),
+            lookup.c.start_time <= now,
+            lookup.c.end_time > now
+        ).order_by(lookup.c.start_time.desc()).limit(1).scalar_subquery()
+    
+    fact = events.alias('fact')
+    plan = events.alias('plan')
+    columns = [users.c.id.label('user_id'), users.c.username]
+    for prefix, table in (('fact', fact), ('plan', plan)):
+        columns += [table.c[name].label(f'{prefix}_{name}')
+                    for name in ('id', 'category_id', 'start_time', 'end_time')]
+    columns += [categories.c[name].label(f'category_{name}')
+                for name in ('id', 'name', 'color', 'description', 'created_at')]
+    
+    return select(*columns).select_from(
+        users
+        .outerjoin(fact, fact.c.id == current_event_id('fact'))
+        .outerjoin(plan, plan.c.id == current_event_id('plan'))
+        .outerjoin(categories, categories.c.user_id == users.c.id)
+    ).where(users.c.telegram_id == telegram_id).order_by(categories.c.id)
+
 @api_bp.route('/telegram/events', methods=['POST'])
 @telegram_auth_required
 def telegram_create_event():
@@ -86,10 +202,7 @@ def telegram_create_event():
         return jsonify({'error': f'Invalid time format: {str(e)}'}), 400
     
     # Проверяем, что категория принадлежит пользователю
-    category = Category.query.filter_by(
-        id=category_id, 
-        user_id=user.id
-    ).first()
+    category = get_user_category(user.id, category_id)
     
     if not category:
         return jsonify({'error': 'Category not found'}), 404
@@ -97,20 +210,20 @@ def telegram_create_event():
     # Создаем событие
     event = Event(
         user_id=user.id,
-        category_id=category_id,
+        category_id=category['id'],
         type=event_type,
         start_time=start_time,
         end_time=end_time,
         source='telegram'
     )
     
-    db.session.add(event)
+    event = add_event(event)
     db.session.commit()
     
     return jsonify({
         'status': 'success',
         'event_id': event.id,
-        'message': f'Event added: {category.name} ({event_type})'
+        'message': f"Event added: {category['name']} ({event_type})"
     }), 201
 
 @api_bp.route('/telegram/quick', methods=['POST'])
@@ -145,7 +258,7 @@ def telegram_quick_event():
         source='telegram_quick'
     )
     
-    db.session.add(event)
+    event = add_event(event)
     db.session.commit()
     
     return jsonify({
@@ -154,6 +267,55 @@ def telegram_quick_event():
         'duration': duration_minutes
     })
 
+@api_bp.route('/telegram/free-slots', methods=['GET'])
+@telegram_auth_required
+def telegram_free_slots():
+    """
+    Ближайшие свободные интервалы - подсказка, когда начать следующую активность.
+    ?tz=<IANA> - часовой пояс пользователя: «сегодня» и рабочие часы считаются в нём,
+    времена слотов возвращаются в нём же (события хранятся в UTC).
+    """
+    user = request.current_user
+    min_minutes = request.args.get('min_minutes', 15, type=int)
+    days = min(max(request.args.get('days', 1, type=int), 1), 7)
+    tz_name = request.args.get('tz', 'UTC')
+    
+    if min_minutes <= 0:
+        return jsonify({'error': 'min_minutes must be positive'}), 400
+    try:
+        zone = ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return jsonify({'error': f'Unknown time zone: {tz_name}'}), 400
+    
+    def to_local(value):
+        return value.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None)
+    
+    def to_utc(value):
+        return value.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+    
+    now_utc = datetime.utcnow()
+    now = to_local(now_utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    range_end = to_utc(today + timedelta(days=days))
+    
+    busy = [(to_local(start), to_local(end)) for start, end in load_busy_intervals(user.id, now_utc, range_end)]
+    free = find_free_intervals(
+        busy, today, days,
+        current_app.config['SCHEDULE_DAY_START_HOUR'],
+        current_app.config['SCHEDULE_DAY_END_HOUR'],
+        min_minutes=min_minutes,
+        not_before=now
+    )
+    slots = free_slots_to_dict(free)
+    
+    return jsonify({
+        'status': 'success',
+        'timezone': tz_name,
+        'min_minutes': min_minutes,
+        'next_slot': slots[0] if slots else None,
+        'free_slots': slots
+    })
+
 # Вспомогательные функции для парсинга времени
 def parse_time(time_str):
     """Парсинг времени в формате '14:30' или '2:30 PM'"""
@@ -179,6 +341,134 @@ def parse_duration(duration_str):
         minutes = float(re.search(r'[\d.]+', duration_str).group())
         return timedelta(minutes=minutes)
 
+@api_bp.route('/templates', methods=['POST'])
+@login_required
+def create_template():
+    """Создать шаблон недели (формат data как в collectPlanData из schedule.html)"""
+    data = request.get_json()
+    
+    if not isinstance(data, dict) or 'data' not in data:
+        return jsonify({'error': 'Template name and data are required'}), 400
+    
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return jsonify({'error': 'Template name must be a non-empty string'}), 400
+    
+    try:
+        template_data = normalize_template_data(data['data'])
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': f'Invalid template data: {e}'}), 400
+    
+    # Все категории шаблона должны принадлежать пользователю
+    category_ids = {e['category_id'] for entries in template_data.values() for e in entries}
+    if any(get_user_category(current_user.id, cid) is None for cid in category_ids):
+        return jsonify({'error': 'Category not found'}), 404
+    
+    template = Template(
+        user_id=current_user.id,
+        name=name.strip(),
+        data=template_data
+    )
+    
+    db.session.add(template)
+    db.session.commit()
+    
+    return jsonify({'status': 'success', 'template': template.to_dict()}), 201
+
+@api_bp.route('/templates/<int:template_id>/apply', methods=['POST'])
+@login_required
+def apply_template(template_id):
+    """
+    Развернуть шаблон в плановые события недели.
+    mode=skip (по умолчанию) - пропускать слоты, пересекающиеся с уже существующим планом,
+    mode=replace - удалить план недели и заменить шаблоном.
+    """
+    template = Template.query.filter_by(
+        id=template_id,
+        user_id=current_user.id
+    ).first()
+    
+    if not template:
+        return jsonify({'status': 'error', 'message': 'Шаблон не найден'}), 404
+    
+    week_id = request.args.get('week')
+    mode = request.args.get('mode', 'skip')
+    
+    if mode not in ('skip', 'replace'):
+        return jsonify({'error': 'mode must be skip or replace'}), 400
+    
+    try:
+        year, week = parse_week_id(week_id) if week_id else current_week()
+        start_of_week = get_week_start(year, week)
+        template_data = normalize_template_data(template.data)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    end_of_week = start_of_week + timedelta(days=7)
+    
+    # Категории могли удалить после создания шаблона
+    owned = {cat['id'] for cat in get_user_categories(current_user.id)}
+    
+    week_plan_filter = (
+        Event.user_id == current_user.id,
+        Event.type == 'plan',
+        Event.deleted_at.is_(None),
+        Event.start_time < end_of_week,
+        Event.end_time > start_of_week
+    )
+    
+    if mode == 'replace':
+        existing = []
+    else:
+        existing = merge_intervals(
+            db.session.query(Event.start_time, Event.end_time)
+            .filter(*week_plan_filter)
+            .order_by(Event.start_time).all()
+        )
+    
+    rows = []
+    skipped = 0
+    for category_id, start, end in expand_template(template_data, start_of_week):
+        if category_id not in owned or overlaps_any(existing, start, end):
+            skipped += 1
+            continue
+        # Пересечения внутри самого шаблона тоже не дублируем
+        insort(existing, [start, end])
+        rows.append({
+            'user_id': current_user.id,
+            'category_id': category_id,
+            'start_time': start,
+            'end_time': end,
+            'type': 'plan',
+            'source': 'template',
+            'description': f'Из шаблона: {template.name}',
+            'created_at': datetime.utcnow()
+        })
+    
+    replaced = 0
+    if rows or mode == 'replace':
+        version = bump_data_version(current_user.id)
+        if mode == 'replace':
+            # Старый план недели - в tombstone, чтобы клиенты получили удаление через /events/changes
+            replaced = Event.query.filter(*week_plan_filter).update(
+                {'deleted_at': datetime.utcnow(), 'version': version},
+                synchronize_session=False
+            )
+        for row in rows:
+            row['version'] = version
+        # Одна пачка INSERT (executemany) вместо события на каждый слот
+        if rows:
+            db.session.bulk_insert_mappings(Event, rows)
+    db.session.commit()
+    
+    return jsonify({
+        'status': 'success',
+        'week': f'{year}-W{week:02d}',
+        'created': len(rows),
+        'skipped': skipped,
+        'replaced': replaced
+    }), 201
+
 @api_bp.route('/templates/<int:template_id>', methods=['DELETE'])
 @login_required
 def delete_template(template_id):
@@ -195,3 +485,140 @@ def delete_template(template_id):
     db.session.commit()
     
     return jsonify({'status': 'success', 'message': 'Шаблон удален'})
+
+# ======== BATCH: НЕСКОЛЬКО ОПЕРАЦИЙ ЗА ОДИН ЗАПРОС ========
+
+BATCH_MAX_OPERATIONS = 50
+# Заголовки исходного запроса, которые получает каждая операция (аутентификация)
+BATCH_FORWARD_HEADERS = ('X-Telegram-ID', 'Cookie', 'Authorization')
+# Эндпоинты, доступные операциям batch: обычные JSON-обработчики. Потоки (SSE,
+# экспорт), загрузка файлов, авторизация и сам batch сюда не входят
+BATCH_ENDPOINTS = frozenset({
+    'api.telegram_categories', 'api.telegram_bootstrap', 'api.telegram_create_event',
+    'api.telegram_quick_event', 'api.telegram_free_slots',
+    'api.create_template', 'api.apply_template', 'api.delete_template',
+    'schedule_api.get_categories', 'schedule_api.create_category', 'schedule_api.update_category',
+    'schedule_api.delete_category', 'schedule_api.create_event', 'schedule_api.delete_event',
+    'schedule_api.get_event_changes', 'schedule_api.get_current_week', 'schedule_api.get_week_events',
+    'schedule_api.get_free_slots',
+})
+
+@api_bp.route('/batch', methods=['POST'])
+@primary_reads
+def batch():
+    """
+    Несколько операций API за один HTTP-запрос и одну транзакцию:
+    {"atomic": false, "operations": [{"method": "POST", "path": "/telegram/events", "body": {...}}]}
+    
+    Операции выполняются по порядку обычными обработчиками (с их проверками и
+    аутентификацией по заголовкам запроса), каждая - в своей точке сохранения:
+    ошибка откатывает только её. atomic=true - первая ошибка откатывает всё,
+    остальные операции не выполняются.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    atomic = bool(data.get('atomic', False))
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'Too many operations (max {BATCH_MAX_OPERATIONS})'}), 400
+    
+    headers = {name: request.headers[name] for name in BATCH_FORWARD_HEADERS if name in request.headers}
+    session = db.session()
+    results = []
+    failed = False
+    
+    for index, operation in enumerate(operations):
+        if failed and atomic:
+            results.append({'index': index, 'status': None, 'skipped': True})
+            continue
+        status, body = run_batch_operation(session, operation, headers)
+        results.append({'index': index, 'status': status, 'body': body})
+        failed = failed or status >= 400
+    
+    committed = not (failed and atomic)
+    if committed:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    
+    return jsonify({
+        'status': 'success' if not failed else ('partial' if committed else 'rolled_back'),
+        'committed': committed,
+        'results': results
+    }), 200
+
+def run_batch_operation(session, operation, headers):
+    """
+    Одна операция batch в точке сохранения -> (HTTP-статус, тело ответа).
+    Вызывается только обработчик (dispatch_request): before/after_request хуки -
+    метрики, профайлер, cookie реплики - для операций не выполняются. Вложенный
+    контекст делит g с внешним запросом, и хуки перезаписали бы его состояние;
+    метрики и профиль снимаются с /batch целиком, а коммит (и cookie реплики)
+    происходит во внешнем запросе.
+    
+    Обработчики сами вызывают commit(): внутри точки сохранения (Session не в
+    режиме future) он лишь отпускает её. Поэтому обработчик работает во
+    вложенной точке, которая после каждого его commit() открывается заново
+    (_reopen_handler_savepoint), а точка операции остаётся для отката.
+    """
+    if not isinstance(operation, dict) or not operation.get('path'):
+        return 400, {'error': 'operation must have a path'}
+    
+    method = str(operation.get('method', 'GET')).upper()
+    path = '/' + str(operation['path']).lstrip('/')
+    if not path.startswith(api_bp.url_prefix + '/'):
+        path = api_bp.url_prefix + path
+    
+    try:
+        endpoint, _ = current_app.url_map.bind_to_environ(request.environ).match(path.split('?')[0], method)
+    except HTTPException as e:
+        return e.code, {'error': e.description}
+    if endpoint not in BATCH_ENDPOINTS:
+        return 400, {'error': f'{method} {path} is not allowed in batch'}
+    
+    # session.info копит изменения для публикации после коммита - при откате
+    # точки сохранения возвращаем его к состоянию до операции
+    info = copy.deepcopy(session.info)
+    savepoint = session.begin_nested()
+    g.batch_savepoint = savepoint
+    session.begin_nested()
+    try:
+        with current_app.test_request_context(path, method=method, headers=headers,
+                                              json=operation.get('body')):
+            response = current_app.make_response(current_app.dispatch_request())
+        status = response.status_code
+        body = response.get_json(silent=True)
+        if body is None:
+            body = response.get_data(as_text=True)
+    except HTTPException as e:
+        status, body = e.code, {'error': e.description}
+    except Exception:
+        current_app.logger.exception(f'Batch operation failed: {method} {path}')
+        status, body = 500, {'error': 'Internal error'}
+    finally:
+        g.batch_savepoint = None
+    
+    if status < 400:
+        handler_savepoint = session.get_nested_transaction()
+        if handler_savepoint is not savepoint:
+            handler_savepoint.commit()
+        savepoint.commit()
+    else:
+        if savepoint.is_active:
+            savepoint.rollback()
+        # Категории, прочитанные в кэш внутри операции, могли откатиться вместе с ней
+        for user_id in session.info.get('category_cache_users', ()):
+            category_cache.pop(user_id)
+        session.info.clear()
+        session.info.update(info)
+    return status, body
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _reopen_handler_savepoint(session, transaction):
+    """commit() обработчика внутри batch отпустил его точку сохранения - открываем следующую"""
+    savepoint = g.get('batch_savepoint') if has_app_context() else None
+    if savepoint is not None and savepoint.is_active and transaction.nested and transaction.parent is savepoint:
+        session.begin_nested()
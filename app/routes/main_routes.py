@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort, Response
 from flask_login import current_user, login_required
 from app import db
-from app.models import User, Category, Event, Template
+from app.models import User, Category, Event, Template, get_user_categories, get_user_category
 from app.auth import login_required
+from app.utils import current_week, normalize_template_data
+from app.cache import calendar_cache
+from app.calendar_feed import build_calendar_feed, feed_etag
+from app.archive import archived_counts, archived_events
+from app.replica import read_replica
 from datetime import datetime, timedelta
 import json
 
@@ -18,6 +23,16 @@ def index():
 @login_required
 def schedule():
     """Страница с недельным расписанием и графиками"""
+    return render_schedule()
+
+@main_bp.route('/schedule/benchmark')
+@login_required
+def schedule_benchmark():
+    """Сетка расписания на синтетической неделе (?events=2000) - замер скорости отрисовки"""
+    events = min(max(request.args.get('events', 2000, type=int), 1), 20000)
+    return render_schedule(benchmark_events=events)
+
+def render_schedule(**context):
     today = datetime.now().date()
     start_of_week = today - timedelta(days=today.weekday())
     
@@ -39,7 +54,8 @@ def schedule():
     
     return render_template('schedule.html', 
                           days=days, 
-                          current_week=current_week)
+                          current_week=current_week,
+                          **context)
 
 # ... остальные функции (profile, manage_categories и т.д.) оставьте без изменений
 
@@ -47,7 +63,95 @@ def schedule():
 @login_required
 def profile():
     """Страница профиля пользователя"""
-    return render_template('profile.html', user=current_user)
+    calendar_url = url_for('main.calendar_feed', token=current_user.get_calendar_token(), _external=True)
+    user_stats = {
+        'categories': len(get_user_categories(current_user.id)),
+        'events': Event.query.filter_by(user_id=current_user.id, deleted_at=None).count()
+    }
+    return render_template('profile.html', user=current_user, user_stats=user_stats,
+                           calendar_url=calendar_url)
+
+@main_bp.route('/profile', methods=['POST'])
+@login_required
+def update_profile():
+    """Изменение имени пользователя и Telegram ID"""
+    username = (request.form.get('username') or '').strip()
+    telegram_id = (request.form.get('telegram_id') or '').strip() or None
+    
+    if not username:
+        flash('Имя пользователя обязательно', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    if username != current_user.username and User.query.filter_by(username=username).first():
+        flash('Это имя пользователя уже занято', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    if telegram_id and telegram_id != current_user.telegram_id and \
+            User.query.filter_by(telegram_id=telegram_id).first():
+        flash('Этот Telegram ID уже привязан к другому аккаунту', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    current_user.username = username
+    current_user.telegram_id = telegram_id
+    db.session.commit()
+    
+    flash('Профиль обновлён', 'success')
+    return redirect(url_for('main.profile'))
+
+@main_bp.route('/profile/password', methods=['POST'])
+@login_required
+def change_password():
+    """Смена пароля"""
+    current_password = request.form.get('current_password')
+    new_password = request.form.get('new_password') or ''
+    confirm_password = request.form.get('confirm_password')
+    
+    if not current_user.check_password(current_password):
+        flash('Неверный текущий пароль', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    if new_password != confirm_password:
+        flash('Пароли не совпадают', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    if len(new_password) < 6:
+        flash('Пароль должен содержать минимум 6 символов', 'danger')
+        return redirect(url_for('main.profile'))
+    
+    current_user.set_password(new_password)
+    db.session.commit()
+    
+    flash('Пароль изменён', 'success')
+    return redirect(url_for('main.profile'))
+
+@main_bp.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    """
+    Подписка на план в формате ICS.
+    Кэш на пользователя по data_version: пока данные не менялись, Event не запрашивается,
+    а клиент с актуальным If-None-Match получает 304.
+    """
+    row = db.session.query(User.id, User.data_version).filter_by(calendar_token=token).first()
+    if not row:
+        abort(404)
+    
+    user_id, version = row
+    etag = feed_etag(user_id, version)
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        feed = calendar_cache.get(user_id)
+        if feed is None or feed.version != version:
+            feed = build_calendar_feed(user_id, version, previous=feed)
+            calendar_cache.set(user_id, feed)
+        response = Response(feed.body, mimetype='text/calendar')
+        response.headers['Content-Disposition'] = 'inline; filename=plan.ics'
+    
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 300
+    return response
 
 @main_bp.route('/categories', methods=['GET', 'POST'])
 @login_required
@@ -62,12 +166,7 @@ def manage_categories():
             return redirect(url_for('main.manage_categories'))
         
         # Проверяем уникальность для этого пользователя
-        existing = Category.query.filter_by(
-            user_id=current_user.id, 
-            name=name
-        ).first()
-        
-        if existing:
+        if any(cat['name'] == name for cat in get_user_categories(current_user.id)):
             flash('Категория с таким названием уже существует', 'warning')
             return redirect(url_for('main.manage_categories'))
         
@@ -84,7 +183,7 @@ def manage_categories():
         return redirect(url_for('main.dashboard'))
     
     # все категории пользователя
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    categories = get_user_categories(current_user.id)
     return render_template('categories.html', categories=categories)
 
 @main_bp.route('/events', methods=['GET', 'POST'])
@@ -99,12 +198,7 @@ def manage_events():
         description = request.form.get('description', '')
         
         # Валидация
-        category = Category.query.filter_by(
-            id=category_id, 
-            user_id=current_user.id
-        ).first()
-        
-        if not category:
+        if not get_user_category(current_user.id, category_id):
             flash('Выберите корректную категорию', 'danger')
             return redirect(url_for('main.manage_events'))
         
@@ -136,7 +230,7 @@ def manage_events():
             return redirect(url_for('main.manage_events'))
     
     # показать форму с категориями пользователя
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    categories = get_user_categories(current_user.id)
     return render_template('events.html', categories=categories)
 
 @main_bp.route('/templates', methods=['GET', 'POST'])
@@ -146,28 +240,37 @@ def manage_templates():
     if request.method == 'POST':
         name = request.form.get('name')
         category_id = request.form.get('category_id')
+        start_time = request.form.get('start_time', '09:00')
         duration_minutes = request.form.get('duration_minutes', 60)
-        description = request.form.get('description', '')
+        days = request.form.getlist('days')
         
-        if not name or not category_id:
-            flash('Название и категория обязательны', 'danger')
+        if not name or not category_id or not days:
+            flash('Название, категория и дни недели обязательны', 'danger')
             return redirect(url_for('main.manage_templates'))
         
         # Проверяем, что категория принадлежит пользователю
-        category = Category.query.filter_by(
-            id=category_id, 
-            user_id=current_user.id
-        ).first()
+        category = get_user_category(current_user.id, category_id)
         
         if not category:
             flash('Выберите корректную категорию', 'danger')
             return redirect(url_for('main.manage_templates'))
         
+        # Шаблон - повторяющийся недельный план: {день недели: [слоты]}
+        try:
+            data = normalize_template_data({
+                day: [{
+                    'time': start_time,
+                    'category_id': category['id'],
+                    'duration': int(duration_minutes)
+                }] for day in days
+            })
+        except ValueError:
+            flash('Неверное время или длительность', 'danger')
+            return redirect(url_for('main.manage_templates'))
+        
         template = Template(
             name=name,
-            category_id=category_id,
-            duration_minutes=int(duration_minutes),
-            description=description,
+            data=data,
             user_id=current_user.id
         )
         
@@ -175,22 +278,29 @@ def manage_templates():
         db.session.commit()
         
         flash(f'Шаблон "{name}" создан!', 'success')
-        return redirect(url_for('main.dashboard'))
+        return redirect(url_for('main.manage_templates'))
     
     # Получаем все шаблоны пользователя
     templates = Template.query.filter_by(user_id=current_user.id).all()
-    categories = Category.query.filter_by(user_id=current_user.id).all()
+    categories = get_user_categories(current_user.id)
+    year, week = current_week()
     
     return render_template('templates.html', 
                          templates=templates, 
-                         categories=categories)
+                         categories=categories,
+                         current_week=f'{year}-W{week:02d}',
+                         categories_by_id={c['id']: c for c in categories},
+                         day_names=['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'])
     
 @main_bp.route('/api/my/stats')
 @login_required
+@read_replica
 def api_my_stats():
     """Статистика текущего пользователя"""
     today = datetime.utcnow().date()
     tomorrow = today + timedelta(days=1)
+    # Итоги включают историю, перенесённую в архив (flask archive-events)
+    archived = archived_counts(current_user.id)
     
     return jsonify({
         'user': {
@@ -199,22 +309,27 @@ def api_my_stats():
             'telegram_linked': bool(current_user.telegram_id)
         },
         'stats': {
-            'categories': Category.query.filter_by(user_id=current_user.id).count(),
+            'categories': len(get_user_categories(current_user.id)),
             'events_today': Event.query.filter(
                 Event.user_id == current_user.id,
+                Event.deleted_at.is_(None),
                 Event.start_time >= today,
                 Event.start_time < tomorrow
             ).count(),
-            'events_total': Event.query.filter_by(user_id=current_user.id).count(),
+            'events_total': Event.query.filter_by(user_id=current_user.id, deleted_at=None).count()
+                            + sum(archived.values()),
             'plans_vs_facts': {
-                'plan': Event.query.filter_by(user_id=current_user.id, type='plan').count(),
-                'fact': Event.query.filter_by(user_id=current_user.id, type='fact').count()
+                'plan': Event.query.filter_by(user_id=current_user.id, type='plan', deleted_at=None).count()
+                        + archived.get('plan', 0),
+                'fact': Event.query.filter_by(user_id=current_user.id, type='fact', deleted_at=None).count()
+                        + archived.get('fact', 0)
             }
         }
     })
 
 @main_bp.route('/api/my/events')
 @login_required
+@read_replica
 def api_my_events():
     """События текущего пользователя с фильтрацией"""
     # Параметры фильтрации
@@ -223,23 +338,31 @@ def api_my_events():
     category_id = request.args.get('category_id')
     event_type = request.args.get('type')
     
-    query = Event.query.filter_by(user_id=current_user.id)
+    query = Event.query.filter_by(user_id=current_user.id, deleted_at=None)
+    date_from = datetime.fromisoformat(start_date) if start_date else None
+    date_to = datetime.fromisoformat(end_date) if end_date else None
     
-    if start_date:
-        query = query.filter(Event.start_time >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(Event.start_time <= datetime.fromisoformat(end_date))
+    if date_from:
+        query = query.filter(Event.start_time >= date_from)
+    if date_to:
+        query = query.filter(Event.start_time <= date_to)
     if category_id:
         query = query.filter(Event.category_id == category_id)
     if event_type:
         query = query.filter(Event.type == event_type)
     
     events = query.order_by(Event.start_time.desc()).limit(100).all()
+    if len(events) < 100:
+        # Не хватило свежих - добираем из архива (он старше всего в events)
+        events += archived_events(current_user.id, date_from, date_to, end_inclusive=True,
+                                  category_id=int(category_id) if category_id else None,
+                                  event_type=event_type or None, limit=100 - len(events), newest_first=True)
+    categories = {cat['id']: cat for cat in get_user_categories(current_user.id)}
     
     return jsonify([{
         'id': e.id,
-        'category': e.category.name,
-        'category_color': e.category.color,
+        'category': categories.get(e.category_id, {}).get('name'),
+        'category_color': categories.get(e.category_id, {}).get('color'),
         'type': e.type,
         'start_time': e.start_time.isoformat(),
         'end_time': e.end_time.isoformat(),
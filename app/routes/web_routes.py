@@ -1,9 +1,24 @@
 # app/routes/web_routes.py
-from flask import Blueprint, jsonify, request, render_template
+from flask import Blueprint, jsonify, request, render_template, current_app, Response, stream_with_context
 from flask_login import current_user, login_required
 from app import db
-from app.models import Category, Event
+from app.models import (Category, Event, User, bump_data_version, get_user_categories, get_user_category,
+                        get_data_version, get_sync_versions)
+from app.cache import user_cache
+from app.importer import import_events, iter_records, detect_format
+from app.compression import compress_response
+from app.compaction import add_event
+from app.archive import archived_counts, archived_events, archived_months
+from app.replica import read_replica
+from app import pubsub
+from app.utils import (SLOT_MINUTES, parse_week_id, get_week_start, current_week,
+                       load_busy_intervals, find_free_intervals, free_slots_to_dict)
 from datetime import datetime, timedelta
+import csv
+import heapq
+import io
+import json
+import threading
 
 # ====== Blueprint для веб-страниц ======
 web_pages_bp = Blueprint('web_pages', __name__)
@@ -43,10 +58,10 @@ def schedule_page():
 
 @schedule_api_bp.route('/categories', methods=['GET'])
 @login_required
+@read_replica
 def get_categories():
     """Получить ВСЕ категории текущего пользователя"""
-    categories = Category.query.filter_by(user_id=current_user.id).all()
-    categories_list = [cat.to_dict() for cat in categories]
+    categories_list = get_user_categories(current_user.id)
 
     return jsonify({
         'status': 'success',
@@ -66,18 +81,14 @@ def create_category():
         return jsonify({'error': 'Category name is required'}), 400
     
     # Проверка уникальности
-    existing = Category.query.filter_by(
-        user_id=current_user.id,
-        name=data['name'].strip()
-    ).first()
-    
-    if existing:
+    name = data['name'].strip()
+    if any(cat['name'] == name for cat in get_user_categories(current_user.id)):
         return jsonify({'error': 'Category already exists'}), 409
     
     # Создание категории
     category = Category(
         user_id=current_user.id,
-        name=data['name'].strip(),
+        name=name,
         color=data.get('color', '#4361ee'),
         description=data.get('description', '')
     )
@@ -92,6 +103,63 @@ def create_category():
     }), 201
 
 
+@schedule_api_bp.route('/categories/<int:category_id>', methods=['PUT'])
+@login_required
+def update_category(category_id):
+    """Изменить категорию (название, цвет, описание)"""
+    data = request.get_json() or {}
+    
+    category = Category.query.filter_by(id=category_id, user_id=current_user.id).first()
+    if not category:
+        return jsonify({'error': 'Category not found'}), 404
+    
+    if 'name' in data:
+        name = (data['name'] or '').strip()
+        if not name:
+            return jsonify({'error': 'Category name is required'}), 400
+        if any(cat['name'] == name and cat['id'] != category_id
+               for cat in get_user_categories(current_user.id)):
+            return jsonify({'error': 'Category already exists'}), 409
+        category.name = name
+    if 'color' in data:
+        category.color = data['color']
+    if 'description' in data:
+        category.description = data['description']
+    
+    db.session.commit()
+    
+    return jsonify({'status': 'success', 'category': category.to_dict()})
+
+
+@schedule_api_bp.route('/categories/<int:category_id>', methods=['DELETE'])
+@login_required
+def delete_category(category_id):
+    """Удалить категорию (только если по ней нет событий)"""
+    category = Category.query.filter_by(id=category_id, user_id=current_user.id).first()
+    if not category:
+        return jsonify({'error': 'Category not found'}), 404
+    
+    if db.session.query(Event.query.filter_by(category_id=category_id, deleted_at=None).exists()).scalar():
+        return jsonify({'error': 'Category has events'}), 409
+    # В архиве нет внешнего ключа - без этой проверки его события остались бы без категории
+    if archived_counts(current_user.id, category_id):
+        return jsonify({'error': 'Category has archived events'}), 409
+    
+    # Tombstone-ы удалённых событий ссылаются на категорию - убираем их вместе с ней.
+    # Как при компактизации: клиенты с версией старше purged получат reset вместо дельты
+    purged = Event.query.filter_by(category_id=category_id).delete(synchronize_session=False)
+    if purged:
+        version = bump_data_version(current_user.id)
+        db.session.execute(User.__table__.update().where(User.__table__.c.id == current_user.id)
+                           .values(events_purged_version=version))
+    db.session.delete(category)
+    db.session.commit()
+    if purged:
+        user_cache.pop(current_user.id)
+    
+    return jsonify({'status': 'success', 'message': 'Category deleted'})
+
+
 @schedule_api_bp.route('/events', methods=['POST'])
 @login_required
 def create_event():
@@ -104,12 +172,7 @@ def create_event():
         return jsonify({'error': 'Missing required fields'}), 400
 
     # Проверяем, что категория принадлежит пользователю
-    category = Category.query.filter_by(
-        id=data['category_id'],
-        user_id=current_user.id
-    ).first()
-
-    if not category:
+    if not get_user_category(current_user.id, data['category_id']):
         return jsonify({'error': 'Category not found'}), 404
 
     # Создаём событие (по умолчанию type='plan', source='web')
@@ -122,7 +185,7 @@ def create_event():
         source='web'
     )
 
-    db.session.add(event)
+    event = add_event(event)
     db.session.commit()
 
     return jsonify({
@@ -132,6 +195,138 @@ def create_event():
     }), 201
 
 
+@schedule_api_bp.route('/events/<int:event_id>', methods=['DELETE'])
+@login_required
+def delete_event(event_id):
+    """Удалить событие (мягкое удаление: tombstone для /events/changes)"""
+    event = Event.query.filter_by(id=event_id, user_id=current_user.id, deleted_at=None).first()
+    
+    if not event:
+        return jsonify({'error': 'Event not found'}), 404
+    
+    event.deleted_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify({'status': 'success', 'version': event.version})
+
+
+CHANGES_LIMIT = 1000
+
+
+@schedule_api_bp.route('/events/changes', methods=['GET'])
+@login_required
+@compress_response
+def get_event_changes():
+    """
+    Изменения событий после версии клиента (?since=<version>[&week=YYYY-Www]):
+    добавленные/изменённые события и id удалённых. При слишком большом
+    расхождении возвращает reset=true - клиенту проще перезагрузить неделю.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since is required'}), 400
+    
+    version, purged_version = get_sync_versions(current_user.id)
+    if since >= version:
+        return jsonify({'status': 'success', 'version': version, 'reset': False,
+                        'changed': [], 'deleted': []})
+    if since < purged_version:
+        # Часть удалений стёрта физически (компактизация) - дельту не восстановить
+        return jsonify({'status': 'success', 'version': version, 'reset': True,
+                        'changed': [], 'deleted': []})
+    
+    query = Event.query.filter(Event.user_id == current_user.id, Event.version > since)
+    
+    week_id = request.args.get('week')
+    if week_id:
+        try:
+            start_of_week = get_week_start(*parse_week_id(week_id))
+        except ValueError:
+            return jsonify({'error': 'Invalid week format. Use: YYYY-Www'}), 400
+        query = query.filter(
+            Event.start_time >= start_of_week,
+            Event.start_time <= start_of_week + timedelta(days=7)
+        )
+    
+    events = query.order_by(Event.version).limit(CHANGES_LIMIT + 1).all()
+    if len(events) > CHANGES_LIMIT:
+        return jsonify({'status': 'success', 'version': version, 'reset': True,
+                        'changed': [], 'deleted': []})
+    
+    return jsonify({
+        'status': 'success',
+        'version': version,
+        'reset': False,
+        'changed': [event.to_dict() for event in events if event.deleted_at is None],
+        'deleted': [event.id for event in events if event.deleted_at is not None]
+    })
+
+
+SSE_KEEPALIVE_SECONDS = 20
+SSE_RETRY_AFTER_SECONDS = 30
+
+
+def _stream_slots():
+    """Семафор на SSE_MAX_STREAMS одновременных потоков в процессе"""
+    slots = current_app.extensions.get('sse_stream_slots')
+    if slots is None:
+        slots = current_app.extensions.setdefault(
+            'sse_stream_slots', threading.BoundedSemaphore(current_app.config['SSE_MAX_STREAMS'])
+        )
+    return slots
+
+
+@schedule_api_bp.route('/events/stream', methods=['GET'])
+@login_required
+def stream_event_changes():
+    """
+    Server-Sent Events: изменения событий пользователя сразу после коммита
+    (из веба, бота, импорта). Соединение держит поток воркера gthread, поэтому
+    потоков в процессе не больше SSE_MAX_STREAMS - остальные потоки остаются
+    обычным запросам. Сверх лимита - 503 с Retry-After: страница догоняет
+    изменения через /events/changes и переподключается позже.
+    Без брокера между процессами (PUBSUB_URL) - 404: страница опрашивает /events/changes.
+    """
+    if not pubsub.stream_enabled():
+        return jsonify({'error': 'Event stream is disabled'}), 404
+    
+    slots = _stream_slots()
+    if not slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open streams, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_RETRY_AFTER_SECONDS)
+        return response
+    
+    channel = pubsub.user_channel(current_user.id)
+    # Соединение с БД потоку не нужно
+    db.session.close()
+    
+    def generate():
+        subscription = pubsub.get_broker().subscribe(channel)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                message = subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"id: {message['version']}\nevent: changes\ndata: {json.dumps(message)}\n\n"
+        finally:
+            pubsub.get_broker().unsubscribe(subscription)
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Слот освобождается при закрытии ответа - даже если генератор не начинал работу
+    response.call_on_close(slots.release)
+    return response
+
+
 # ======== НОВЫЕ ЭНДПОИНТЫ ========
 
 @schedule_api_bp.route('/week', methods=['GET'])
@@ -172,14 +367,17 @@ def get_current_week():
 @schedule_api_bp.route('/events/week/<week_id>', methods=['GET'])
 @schedule_api_bp.route('/events/week', methods=['GET'])
 @login_required
+@read_replica
+@compress_response
 def get_week_events(week_id=None):
-    """Получить события недели (поддерживает оба формата URL)"""
+    """
+    Получить события недели (поддерживает оба формата URL).
+    ?format=columnar - компактный формат для сетки: параллельные массивы вместо объектов.
+    """
     # Если передан week_id в формате "2025-W52"
     if week_id:
         try:
-            year_str, week_str = week_id.split('-W')
-            year = int(year_str)
-            week = int(week_str)
+            year, week = parse_week_id(week_id)
         except ValueError:
             return jsonify({'error': 'Invalid week format. Use: YYYY-Www'}), 400
     else:
@@ -189,21 +387,112 @@ def get_week_events(week_id=None):
         
         # Если не указаны - текущая неделя
         if not year or not week:
-            today = datetime.now().date()
-            year, week, _ = today.isocalendar()
+            year, week = current_week()
     
     # Рассчитываем начало и конец недели
-    start_of_week = datetime.strptime(f'{year}-W{week:02d}-1', "%Y-W%W-%w")
+    try:
+        start_of_week = get_week_start(year, week)
+    except ValueError:
+        return jsonify({'error': 'Invalid week format. Use: YYYY-Www'}), 400
     end_of_week = start_of_week + timedelta(days=6)
     
-    # Получаем события пользователя за эту неделю
-    events = Event.query.filter(
+    week_info = {
+        'year': year,
+        'week_number': week,
+        'start_date': start_of_week.strftime('%Y-%m-%d'),
+        'end_date': end_of_week.strftime('%Y-%m-%d')
+    }
+    week_filter = (
         Event.user_id == current_user.id,
+        Event.deleted_at.is_(None),
         Event.start_time >= start_of_week,
         Event.start_time <= end_of_week + timedelta(days=1)
-    ).order_by(Event.start_time).all()
+    )
+    # Версия читается до событий: клиент продолжит с неё через /events/changes
+    version = get_data_version(current_user.id)
+    # Старые недели - из архива (app/archive.py); они старше всего, что в events
+    archived = archived_events(current_user.id, start_of_week, end_of_week + timedelta(days=1),
+                               end_inclusive=True)
+    
+    if request.args.get('format') == 'columnar':
+        return jsonify(columnar_week_events(start_of_week, week_filter, week_info, version, archived))
+    
+    # Получаем события пользователя за эту неделю
+    events = Event.query.filter(*week_filter).order_by(Event.start_time).all()
     
-    events_list = [event.to_dict() for event in events]
+    events_list = [event.to_dict() for event in archived] + [event.to_dict() for event in events]
+    
+    return jsonify({
+        'status': 'success',
+        'week': week_info,
+        'version': version,
+        'count': len(events_list),
+        'events': events_list
+    })
+
+
+def columnar_week_events(start_of_week, week_filter, week_info, version, archived=()):
+    """
+    События недели параллельными массивами: start - минуты от начала недели,
+    slots - длительность в 15-минутных слотах, fact - 1 для факта, 0 для плана.
+    Выбираются только нужные колонки, без объектов ORM.
+    """
+    rows = [(e.id, e.category_id, e.start_time, e.end_time, e.type) for e in archived]
+    rows += db.session.query(
+        Event.id, Event.category_id, Event.start_time, Event.end_time, Event.type
+    ).filter(*week_filter).order_by(Event.start_time).all()
+    
+    ids, category_ids, starts, slots, facts = [], [], [], [], []
+    slot_seconds = SLOT_MINUTES * 60
+    for event_id, category_id, start, end, event_type in rows:
+        ids.append(event_id)
+        category_ids.append(category_id)
+        starts.append(int((start - start_of_week).total_seconds() // 60))
+        slots.append(max(1, round((end - start).total_seconds() / slot_seconds)))
+        facts.append(1 if event_type == 'fact' else 0)
+    
+    return {
+        'status': 'success',
+        'format': 'columnar',
+        'week': week_info,
+        'version': version,
+        'slot_minutes': SLOT_MINUTES,
+        'count': len(ids),
+        'columns': {
+            'id': ids,
+            'category_id': category_ids,
+            'start': starts,
+            'slots': slots,
+            'fact': facts
+        }
+    }
+
+
+@schedule_api_bp.route('/free-slots', methods=['GET'])
+@login_required
+def get_free_slots():
+    """Свободные интервалы недели в пределах рабочих часов"""
+    week_id = request.args.get('week')
+    min_minutes = request.args.get('min_minutes', 15, type=int)
+    
+    try:
+        year, week = parse_week_id(week_id) if week_id else current_week()
+        start_of_week = get_week_start(year, week)
+    except ValueError:
+        return jsonify({'error': 'Invalid week format. Use: YYYY-Www'}), 400
+    
+    if min_minutes <= 0:
+        return jsonify({'error': 'min_minutes must be positive'}), 400
+    
+    end_of_week = start_of_week + timedelta(days=7)
+    
+    busy = load_busy_intervals(current_user.id, start_of_week, end_of_week)
+    free = find_free_intervals(
+        busy, start_of_week, 7,
+        current_app.config['SCHEDULE_DAY_START_HOUR'],
+        current_app.config['SCHEDULE_DAY_END_HOUR'],
+        min_minutes=min_minutes
+    )
     
     return jsonify({
         'status': 'success',
@@ -211,8 +500,124 @@ def get_week_events(week_id=None):
             'year': year,
             'week_number': week,
             'start_date': start_of_week.strftime('%Y-%m-%d'),
-            'end_date': end_of_week.strftime('%Y-%m-%d')
+            'end_date': (end_of_week - timedelta(days=1)).strftime('%Y-%m-%d')
         },
-        'count': len(events_list),
-        'events': events_list
+        'min_minutes': min_minutes,
+        'count': len(free),
+        'free_slots': free_slots_to_dict(free)
     })
+
+
+EXPORT_COLUMNS = ['id', 'type', 'category', 'start_time', 'end_time', 'duration_minutes', 'source', 'description']
+EXPORT_BATCH_SIZE = 1000
+
+
+@schedule_api_bp.route('/export', methods=['GET'])
+@login_required
+def export_events():
+    """
+    Потоковый экспорт истории событий (?from=&to=&format=csv|ndjson).
+    Строки читаются курсором на стороне сервера пачками (yield_per) и сразу
+    отдаются клиенту - память не растёт с объёмом истории.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    try:
+        date_from = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        date_to = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO format: YYYY-MM-DD'}), 400
+    
+    # Только нужные колонки - без объектов ORM и identity map
+    query = db.session.query(
+        Event.id, Event.type, Category.name, Event.start_time, Event.end_time,
+        Event.source, Event.description
+    ).outerjoin(Category, Category.id == Event.category_id).filter(
+        Event.user_id == current_user.id,
+        Event.deleted_at.is_(None)
+    )
+    
+    if date_from:
+        query = query.filter(Event.start_time >= date_from)
+    if date_to:
+        query = query.filter(Event.start_time < date_to)
+    
+    rows = query.order_by(Event.start_time).execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+    
+    # Архивная история - тоже потоком, слиянием с events по start_time
+    if archived_months():
+        category_names = {cat['id']: cat['name'] for cat in get_user_categories(current_user.id)}
+        archived = ((e.id, e.type, category_names.get(e.category_id), e.start_time, e.end_time, e.source,
+                     e.description) for e in archived_events(current_user.id, date_from, date_to))
+        rows = heapq.merge(archived, rows, key=lambda row: row[3])
+    
+    def to_record(row):
+        event_id, event_type, category, start, end, source, description = row
+        return [event_id, event_type, category, start.isoformat(), end.isoformat(),
+                int((end - start).total_seconds() // 60), source, description or '']
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+        
+        buffer.seek(0)
+        buffer.truncate()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(to_record(row))
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    def generate_ndjson():
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(dict(zip(EXPORT_COLUMNS, to_record(row))), ensure_ascii=False))
+            if len(chunk) == EXPORT_BATCH_SIZE:
+                yield '\n'.join(chunk) + '\n'
+                chunk = []
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+    
+    if export_format == 'csv':
+        generator, mimetype = generate_csv(), 'text/csv'
+    else:
+        generator, mimetype = generate_ndjson(), 'application/x-ndjson'
+    
+    filename = f"events_{datetime.now().strftime('%Y%m%d')}.{export_format}"
+    return Response(
+        stream_with_context(generator),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@schedule_api_bp.route('/import', methods=['POST'])
+@login_required
+def import_events_file():
+    """Импорт истории из CSV/ICS (multipart, поле file; ?format=csv|ics)"""
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'File is required'}), 400
+    
+    file_format = detect_format(upload.filename, request.args.get('format'))
+    create_categories = request.args.get('create_categories', '1') != '0'
+    
+    try:
+        records = iter_records(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'), file_format)
+        stats = import_events(current_user.id, records, create_categories=create_categories)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not stats.complete:
+        # Пачки до ошибки в файле уже сохранены - сообщаем, что импорт частичный
+        return jsonify({'status': 'partial', 'format': file_format, **stats.to_dict()}), 200
+    return jsonify({'status': 'success', 'format': file_format, **stats.to_dict()}), 201
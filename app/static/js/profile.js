@@ -0,0 +1,58 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Подтверждение удаления аккаунта
+    const confirmDeleteInput = document.getElementById('confirmDelete');
+    const confirmDeleteBtn = document.getElementById('confirmDeleteBtn');
+
+    confirmDeleteInput.addEventListener('input', function() {
+        confirmDeleteBtn.disabled = this.value !== 'УДАЛИТЬ';
+    });
+
+    // Обработка удаления аккаунта
+    confirmDeleteBtn.addEventListener('click', function() {
+        if (!confirm('Точно удалить аккаунт? Это действие необратимо!')) return;
+
+        fetch('/api/my/account', {
+            method: 'DELETE',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (response.ok) {
+                window.location.href = '/';
+            }
+        });
+    });
+
+    // Обработка очистки данных
+    document.getElementById('confirmClearBtn').addEventListener('click', function() {
+        if (!confirm('Точно очистить все данные? Это действие необратимо!')) return;
+
+        fetch('/api/my/data', {
+            method: 'DELETE',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => {
+            if (response.ok) {
+                location.reload();
+            }
+        });
+    });
+
+    // Валидация формы смены пароля
+    const newPassword = document.getElementById('new_password');
+    const confirmPassword = document.getElementById('confirm_password');
+
+    function validatePassword() {
+        if (newPassword.value !== confirmPassword.value) {
+            confirmPassword.setCustomValidity('Пароли не совпадают');
+        } else {
+            confirmPassword.setCustomValidity('');
+        }
+    }
+
+    newPassword.addEventListener('input', validatePassword);
+    confirmPassword.addEventListener('input', validatePassword);
+});
@@ -0,0 +1,1541 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Конфигурация
+    const config = {
+        startHour: 4,
+        endHour: 22.5,
+        slotMinutes: 15,
+        slotHeight: 25,
+        benchmarkEvents: parseInt(document.getElementById('scheduleTable').dataset.benchmarkEvents || '0', 10),
+        // SSE включён на сервере (есть брокер между процессами); иначе - опрос /events/changes
+        eventStream: document.getElementById('scheduleTable').dataset.eventStream === '1',
+        pollSeconds: 30
+    };
+
+    // Состояние приложения
+    const state = {
+        selectedCells: new Set(),
+        categories: [],
+        events: [],
+        version: null,
+        weekRange: null,
+        eventSource: null,
+        templates: [],
+        isCtrlPressed: false,
+        isShiftPressed: false,
+        lastSelectedCell: null,
+        timeSettings: {
+            startHour: localStorage.getItem('startHour') || 4,
+            endHour: localStorage.getItem('endHour') || 22.5
+        }
+    };
+
+    // Элементы DOM
+    const elements = {
+        scheduleBody: document.getElementById('scheduleBody'),
+        scheduleTable: document.getElementById('scheduleTable'),
+        weekPicker: document.getElementById('weekPicker'),
+        weekRange: document.getElementById('weekRange'),
+        currentWeekBtn: document.getElementById('currentWeekBtn'),
+        prevWeekBtn: document.getElementById('prevWeekBtn'),
+        nextWeekBtn: document.getElementById('nextWeekBtn'),
+        timeSettingsBtn: document.getElementById('timeSettingsBtn'),
+        saveTemplateBtn: document.getElementById('saveTemplateBtn'),
+        templatesBtn: document.getElementById('templatesBtn'),
+        addCategoryBtn: document.getElementById('addCategoryBtn'),
+        bulkEditPanel: document.getElementById('bulkEditPanel'),
+        selectedCount: document.getElementById('selectedCount'),
+        bulkCategorySelect: document.getElementById('bulkCategorySelect'),
+        bulkPlanBtn: document.getElementById('bulkPlanBtn'),
+        bulkFactBtn: document.getElementById('bulkFactBtn'),
+        bulkClearBtn: document.getElementById('bulkClearBtn'),
+        bulkCancelBtn: document.getElementById('bulkCancelBtn'),
+        categoriesList: document.getElementById('categoriesList'),
+        categorySelect: document.getElementById('categorySelect'),
+        quickCategory: document.getElementById('quickCategory'),
+        balanceWheel: document.getElementById('balanceWheel'),
+        wheelPeriod: document.getElementById('wheelPeriod'),
+        wheelLegend: document.getElementById('wheelLegend'),
+        quickEventBtn: document.getElementById('quickEventBtn'),
+        clearDayBtn: document.getElementById('clearDayBtn'),
+        copyDayBtn: document.getElementById('copyDayBtn'),
+        statsBtn: document.getElementById('statsBtn')
+    };
+
+    // Отрисованные в сетке события: id -> {element, key}
+    const renderedEvents = new Map();
+    let renderFrame = null;
+    let categoryIndex = { source: null, size: 0, byId: new Map() };
+
+    // Инициализация
+    init();
+
+    async function init() {
+        loadTimeSettings();
+        initSchedule();
+        initTimeSelects();
+        await loadCategories();
+        if (config.benchmarkEvents) {
+            updateWeekRange();
+            runRenderBenchmark(config.benchmarkEvents);
+            return;
+        }
+        await loadEvents();
+        initEventHandlers();
+        initEventStream();
+        initCurrentTimeIndicator();
+        updateWeekRange();
+    }
+
+    // Раздел 1.1: Двухколоночная структура дня
+    function initSchedule() {
+        elements.scheduleBody.innerHTML = '';
+        renderedEvents.clear();
+
+        const startHour = parseFloat(state.timeSettings.startHour);
+        const endHour = parseFloat(state.timeSettings.endHour);
+
+        for (let hour = startHour; hour < endHour; hour += config.slotMinutes / 60) {
+            const hourInt = Math.floor(hour);
+            const minute = (hour - hourInt) * 60;
+            const timeString = `${hourInt.toString().padStart(2, '0')}:${minute.toString().padStart(2, '0')}`;
+            const isHourMark = minute === 0;
+
+            const row = document.createElement('tr');
+            row.className = 'time-slot-row';
+            if (isHourMark) row.classList.add('hour-marker');
+
+            // Колонка времени
+            const timeCell = document.createElement('td');
+            timeCell.className = 'time-column';
+            timeCell.textContent = timeString;
+            row.appendChild(timeCell);
+
+            // Колонки для каждого дня (раздельные колонки План/Факт)
+            for (let day = 0; day < 7; day++) {
+                const planCell = document.createElement('td');
+                planCell.className = 'plan-column';
+                planCell.dataset.time = timeString;
+                planCell.dataset.day = day;
+                planCell.dataset.type = 'plan';
+                planCell.dataset.id = `${day}-${timeString}-plan`;
+
+                const factCell = document.createElement('td');
+                factCell.className = 'fact-column';
+                factCell.dataset.time = timeString;
+                factCell.dataset.day = day;
+                factCell.dataset.type = 'fact';
+                factCell.dataset.id = `${day}-${timeString}-fact`;
+
+                const dayCell = document.createElement('td');
+                dayCell.className = 'day-column';
+                dayCell.appendChild(planCell);
+                dayCell.appendChild(factCell);
+
+                row.appendChild(dayCell);
+            }
+
+            elements.scheduleBody.appendChild(row);
+        }
+
+        updateCurrentTimeHighlight();
+    }
+
+    // Раздел 1.2: Настройка временного интервала
+    function loadTimeSettings() {
+        const savedStart = localStorage.getItem('scheduleStartTime');
+        const savedEnd = localStorage.getItem('scheduleEndTime');
+
+        if (savedStart && savedEnd) {
+            const [startH, startM] = savedStart.split(':').map(Number);
+            const [endH, endM] = savedEnd.split(':').map(Number);
+
+            state.timeSettings.startHour = startH + startM / 60;
+            state.timeSettings.endHour = endH + endM / 60;
+
+            document.getElementById('startTimeInput').value = savedStart;
+            document.getElementById('endTimeInput').value = savedEnd;
+        }
+    }
+
+    // Раздел 1.4-1.5: Выбор и групповая обработка ячеек
+    function initSelectionHandlers() {
+        elements.scheduleTable.addEventListener('click', handleCellClick);
+        document.addEventListener('keydown', handleKeyDown);
+        document.addEventListener('keyup', handleKeyUp);
+    }
+
+    function handleCellClick(event) {
+        const cell = event.target.closest('.plan-column, .fact-column');
+        if (!cell) return;
+
+        event.preventDefault();
+        event.stopPropagation();
+
+        const cellId = cell.dataset.id;
+
+        if (state.isCtrlPressed || event.ctrlKey || event.metaKey) {
+            // Ctrl+Click: Добавить/удалить из выбора
+            toggleCellSelection(cell, cellId);
+        } else if (state.isShiftPressed && state.lastSelectedCell) {
+            // Shift+Click: Выделить диапазон
+            selectCellRange(state.lastSelectedCell, cell);
+        } else {
+            // Одиночный клик: Очистить и выбрать
+            clearSelection();
+            selectCell(cell, cellId);
+        }
+
+        state.lastSelectedCell = cell;
+        updateBulkEditPanel();
+    }
+
+    function toggleCellSelection(cell, cellId) {
+        if (state.selectedCells.has(cellId)) {
+            state.selectedCells.delete(cellId);
+            cell.classList.remove('selected');
+        } else {
+            state.selectedCells.add(cellId);
+            cell.classList.add('selected');
+        }
+    }
+
+    function selectCell(cell, cellId) {
+        state.selectedCells.add(cellId);
+        cell.classList.add('selected');
+    }
+
+    function selectCellRange(startCell, endCell) {
+        const startCoords = getCellCoordinates(startCell);
+        const endCoords = getCellCoordinates(endCell);
+
+        const minDay = Math.min(startCoords.day, endCoords.day);
+        const maxDay = Math.max(startCoords.day, endCoords.day);
+        const minTime = Math.min(startCoords.timeValue, endCoords.timeValue);
+        const maxTime = Math.max(startCoords.timeValue, endCoords.timeValue);
+        const type = startCell.dataset.type;
+
+        // Выбираем все ячейки в диапазоне
+        for (let day = minDay; day <= maxDay; day++) {
+            for (let time = minTime; time <= maxTime; time += 15) {
+                const hours = Math.floor(time / 60);
+                const minutes = time % 60;
+                const timeString = `${hours.toString().padStart(2, '0')}:${minutes.toString().padStart(2, '0')}`;
+                const cellId = `${day}-${timeString}-${type}`;
+
+                const cell = document.querySelector(`[data-id="${cellId}"]`);
+                if (cell) {
+                    state.selectedCells.add(cellId);
+                    cell.classList.add('selected');
+                }
+            }
+        }
+    }
+
+    function getCellCoordinates(cell) {
+        const day = parseInt(cell.dataset.day);
+        const [hours, minutes] = cell.dataset.time.split(':').map(Number);
+        return {
+            day: day,
+            timeValue: hours * 60 + minutes
+        };
+    }
+
+    function clearSelection() {
+        state.selectedCells.forEach(cellId => {
+            const cell = document.querySelector(`[data-id="${cellId}"]`);
+            if (cell) cell.classList.remove('selected');
+        });
+        state.selectedCells.clear();
+    }
+
+    function handleKeyDown(event) {
+        if (event.key === 'Control' || event.key === 'Meta') {
+            state.isCtrlPressed = true;
+        } else if (event.key === 'Shift') {
+            state.isShiftPressed = true;
+        } else if (event.key === 'Escape') {
+            clearSelection();
+            hideBulkEditPanel();
+        }
+    }
+
+    function handleKeyUp(event) {
+        if (event.key === 'Control' || event.key === 'Meta') {
+            state.isCtrlPressed = false;
+        } else if (event.key === 'Shift') {
+            state.isShiftPressed = false;
+        }
+    }
+
+    // Раздел 1.5: Массовое заполнение ячеек
+    function updateBulkEditPanel() {
+        const count = state.selectedCells.size;
+
+        if (count === 0) {
+            elements.bulkEditPanel.classList.remove('show');
+            return;
+        }
+
+        elements.selectedCount.textContent = `${count} ${getNoun(count, 'ячейка', 'ячейки', 'ячеек')} выбрано`;
+        elements.bulkEditPanel.classList.add('show');
+    }
+
+    function hideBulkEditPanel() {
+        elements.bulkEditPanel.classList.remove('show');
+    }
+
+    function getNoun(number, one, two, five) {
+        let n = Math.abs(number);
+        n %= 100;
+        if (n >= 5 && n <= 20) return five;
+        n %= 10;
+        if (n === 1) return one;
+        if (n >= 2 && n <= 4) return two;
+        return five;
+    }
+
+    // Раздел 1.3: Функционал работы с категориями
+    async function loadCategories() {
+        try {
+            const response = await fetch('/api/v1/categories');
+            if (response.ok) {
+                const data = await response.json();
+                state.categories = data.categories || data;
+            } else {
+                loadDefaultCategories();
+            }
+        } catch (error) {
+            console.error('Ошибка загрузки категорий:', error);
+            loadDefaultCategories();
+        }
+
+        updateCategorySelects();
+        updateCategoriesList();
+    }
+
+    function loadDefaultCategories() {
+        state.categories = [
+            { id: 1, name: 'Работа', color: '#4361ee', description: 'Рабочие задачи' },
+            { id: 2, name: 'Учёба', color: '#7209b7', description: 'Обучение и образование' },
+            { id: 3, name: 'Спорт', color: '#f72585', description: 'Физическая активность' },
+            { id: 4, name: 'Отдых', color: '#4cc9f0', description: 'Время для отдыха' },
+            { id: 5, name: 'Семья', color: '#2a9d8f', description: 'Время с семьей' },
+            { id: 6, name: 'Хобби', color: '#e9c46a', description: 'Личные увлечения' }
+        ];
+    }
+
+    function updateCategorySelects() {
+        // Основной селект категорий
+        elements.categorySelect.innerHTML = '<option value="">Выберите категорию</option>';
+        elements.bulkCategorySelect.innerHTML = '<option value="">Выберите категорию</option>';
+        elements.quickCategory.innerHTML = '<option value="">Выберите категорию</option>';
+
+        state.categories.forEach(category => {
+            const option = document.createElement('option');
+            option.value = category.id;
+            option.textContent = category.name;
+            option.style.color = category.color;
+            elements.categorySelect.appendChild(option.cloneNode(true));
+            elements.bulkCategorySelect.appendChild(option.cloneNode(true));
+            elements.quickCategory.appendChild(option);
+        });
+    }
+
+    function updateCategoriesList() {
+        elements.categoriesList.innerHTML = '';
+
+        state.categories.forEach(category => {
+            const categoryDiv = document.createElement('div');
+            categoryDiv.className = 'category-item';
+            categoryDiv.style.borderLeftColor = category.color;
+
+            categoryDiv.innerHTML = `
+                <div class="category-color" style="background-color: ${category.color}"></div>
+                <div class="category-info">
+                    <div class="category-name">${category.name}</div>
+                    ${category.description ? `<small class="text-muted">${category.description}</small>` : ''}
+                </div>
+                <div class="category-actions">
+                    <button class="btn btn-sm btn-outline-secondary edit-category-btn me-1" data-id="${category.id}">
+                        <i class="bi bi-pencil"></i>
+                    </button>
+                    <button class="btn btn-sm btn-outline-danger delete-category-btn" data-id="${category.id}">
+                        <i class="bi bi-trash"></i>
+                    </button>
+                </div>
+            `;
+
+            elements.categoriesList.appendChild(categoryDiv);
+        });
+
+        // Обработчики удаления категорий
+        document.querySelectorAll('.delete-category-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                const categoryId = this.dataset.id;
+                const category = getCategory(categoryId);
+
+                if (category) {
+                    document.getElementById('deleteMessage').textContent = 
+                        `Вы уверены, что хотите удалить категорию "${category.name}"? Все связанные события будут очищены.`;
+
+                    const modal = new bootstrap.Modal(document.getElementById('confirmDeleteModal'));
+                    modal.show();
+
+                    document.getElementById('confirmDeleteBtn').onclick = function() {
+                        deleteCategory(categoryId);
+                        modal.hide();
+                    };
+                }
+            });
+        });
+    }
+
+    function deleteCategory(categoryId) {
+        // Удаляем события этой категории
+        state.events = state.events.filter(event => event.category_id != categoryId);
+
+        // Удаляем категорию
+        state.categories = state.categories.filter(c => c.id != categoryId);
+
+        // Обновляем интерфейс
+        updateCategorySelects();
+        updateCategoriesList();
+        renderEvents();
+        updateBalanceWheel();
+
+        // Сохраняем в localStorage
+        saveData();
+    }
+
+    // Раздел 1.7: Уменьшенные ячейки
+    function initTimeSelects() {
+        const startTimeSelect = document.getElementById('startTime');
+        const endTimeSelect = document.getElementById('endTime');
+
+        startTimeSelect.innerHTML = '';
+        endTimeSelect.innerHTML = '';
+
+        for (let hour = 0; hour < 24; hour++) {
+            for (let minute = 0; minute < 60; minute += config.slotMinutes) {
+                const time = `${hour.toString().padStart(2, '0')}:${minute.toString().padStart(2, '0')}`;
+
+                const option1 = document.createElement('option');
+                option1.value = time;
+                option1.textContent = time;
+                startTimeSelect.appendChild(option1);
+
+                const option2 = document.createElement('option');
+                option2.value = time;
+                option2.textContent = time;
+                endTimeSelect.appendChild(option2);
+            }
+        }
+    }
+
+    // Раздел 2.1-2.2: Очистка верхней панели и улучшение виджета недели
+    function updateWeekRange() {
+        const [year, week] = elements.weekPicker.value.split('-W');
+        const dates = getWeekDates(year, week);
+
+        if (dates.start && dates.end) {
+            const startStr = formatDate(dates.start);
+            const endStr = formatDate(dates.end);
+            elements.weekRange.textContent = `${year} - Неделя ${week} (${startStr} - ${endStr})`;
+
+            // Обновляем даты в заголовках дней
+            updateDayHeaders(dates.start);
+        }
+    }
+
+    function getWeekDates(year, week) {
+        const simple = new Date(year, 0, 1 + (week - 1) * 7);
+        const dow = simple.getDay();
+        const start = new Date(simple);
+
+        if (dow <= 4) {
+            start.setDate(simple.getDate() - simple.getDay() + 1);
+        } else {
+            start.setDate(simple.getDate() + 8 - simple.getDay());
+        }
+
+        const end = new Date(start);
+        end.setDate(start.getDate() + 6);
+
+        return { start, end };
+    }
+
+    function updateDayHeaders(startDate) {
+        const dayElements = document.querySelectorAll('.day-date');
+
+        dayElements.forEach((el, index) => {
+            const date = new Date(startDate);
+            date.setDate(startDate.getDate() + parseInt(el.dataset.day));
+            el.textContent = formatDate(date);
+        });
+    }
+
+    function formatDate(date) {
+        const day = date.getDate().toString().padStart(2, '0');
+        const month = (date.getMonth() + 1).toString().padStart(2, '0');
+        return `${day}.${month}`;
+    }
+
+    // Раздел 3.1: Динамическая подсветка текущего времени
+    function initCurrentTimeIndicator() {
+        updateCurrentTimeHighlight();
+        setInterval(updateCurrentTimeHighlight, 60000); // Обновлять каждую минуту
+    }
+
+    function updateCurrentTimeHighlight() {
+        // Удаляем старую подсветку
+        document.querySelectorAll('.current-time-slot').forEach(el => {
+            el.classList.remove('current-time-slot');
+        });
+
+        const now = new Date();
+        const currentDay = now.getDay();
+        const adjustedDay = currentDay === 0 ? 6 : currentDay - 1;
+
+        // Находим текущий временной слот
+        const currentHour = now.getHours() + now.getMinutes() / 60;
+        const slots = document.querySelectorAll('.time-slot-row');
+
+        slots.forEach((row, index) => {
+            const timeCell = row.querySelector('.time-column');
+            if (!timeCell) return;
+
+            const [hours, minutes] = timeCell.textContent.split(':').map(Number);
+            const slotTime = hours + minutes / 60;
+
+            if (Math.abs(currentHour - slotTime) < config.slotMinutes / 120) {
+                // Подсвечиваем текущий слот
+                const planCell = row.children[adjustedDay + 1]?.querySelector('.plan-column');
+                const factCell = row.children[adjustedDay + 1]?.querySelector('.fact-column');
+
+                if (planCell) planCell.classList.add('current-time-slot');
+                if (factCell) factCell.classList.add('current-time-slot');
+            }
+        });
+    }
+
+    // Раздел 4: Система шаблонов
+    async function loadTemplates() {
+        try {
+            const templates = localStorage.getItem('scheduleTemplates');
+            if (templates) {
+                state.templates = JSON.parse(templates);
+            }
+        } catch (error) {
+            console.error('Ошибка загрузки шаблонов:', error);
+            state.templates = [];
+        }
+    }
+
+    function saveTemplate(name) {
+        if (!name.trim()) {
+            alert('Введите название шаблона');
+            return;
+        }
+
+        // Собираем данные плана из текущей недели
+        const templateData = {
+            id: Date.now(),
+            name: name.trim(),
+            createdAt: new Date().toISOString(),
+            data: collectPlanData(),
+            settings: {
+                startHour: state.timeSettings.startHour,
+                endHour: state.timeSettings.endHour
+            }
+        };
+
+        state.templates.push(templateData);
+        saveTemplatesToStorage();
+
+        alert(`Шаблон "${name}" сохранен!`);
+        return templateData;
+    }
+
+    function collectPlanData() {
+        const planData = {};
+
+        // Собираем события типа "план" из текущей недели
+        const planEvents = state.events.filter(event => event.type === 'plan');
+
+        planEvents.forEach(event => {
+            const start = new Date(event.start_time);
+            const day = start.getDay();
+            const adjustedDay = day === 0 ? 6 : day - 1;
+
+            if (!planData[adjustedDay]) planData[adjustedDay] = [];
+
+            planData[adjustedDay].push({
+                time: event.start_time.split('T')[1].substring(0, 5),
+                categoryId: event.category_id,
+                duration: event.duration
+            });
+        });
+
+        return planData;
+    }
+
+    function applyTemplate(templateId) {
+        const template = state.templates.find(t => t.id == templateId);
+        if (!template) return;
+
+        if (confirm(`Применить шаблон "${template.name}" к текущей неделе?`)) {
+            // Очищаем существующие события плана
+            state.events = state.events.filter(event => event.type !== 'plan');
+
+            // Добавляем события из шаблона
+            const weekStart = getWeekStartDate();
+
+            Object.keys(template.data).forEach(dayIndex => {
+                const day = parseInt(dayIndex);
+                const events = template.data[day];
+
+                events.forEach(eventData => {
+                    const eventDate = new Date(weekStart);
+                    eventDate.setDate(weekStart.getDate() + day);
+
+                    const startTime = new Date(`${eventDate.toDateString()} ${eventData.time}`);
+                    const endTime = new Date(startTime);
+                    endTime.setMinutes(endTime.getMinutes() + (eventData.duration || 60));
+
+                    const newEvent = {
+                        id: Date.now() + Math.random(),
+                        type: 'plan',
+                        category_id: eventData.categoryId,
+                        start_time: startTime.toISOString(),
+                        end_time: endTime.toISOString(),
+                        description: `Из шаблона: ${template.name}`
+                    };
+
+                    state.events.push(newEvent);
+                });
+            });
+
+            renderEvents();
+            updateBalanceWheel();
+            saveData();
+
+            alert(`Шаблон "${template.name}" применен!`);
+        }
+    }
+
+    function saveTemplatesToStorage() {
+        localStorage.setItem('scheduleTemplates', JSON.stringify(state.templates));
+    }
+
+    // Раздел 5: Колесо баланса
+    function updateBalanceWheel() {
+        const period = elements.wheelPeriod.value;
+        const data = calculateBalanceWheelData(period);
+        renderBalanceWheel(data);
+    }
+
+    function calculateBalanceWheelData(period) {
+        const now = new Date();
+        let filteredEvents = [];
+
+        if (period === 'day') {
+            const today = now.toISOString().split('T')[0];
+            filteredEvents = state.events.filter(event => {
+                const eventDate = event.start_time.split('T')[0];
+                return eventDate === today;
+            });
+        } else {
+            // Неделя
+            const weekStart = getWeekStartDate();
+            const weekEnd = new Date(weekStart);
+            weekEnd.setDate(weekEnd.getDate() + 6);
+
+            filteredEvents = state.events.filter(event => {
+                const eventDate = new Date(event.start_time);
+                return eventDate >= weekStart && eventDate <= weekEnd;
+            });
+        }
+
+        // Группируем по категориям
+        const categoryStats = {};
+        let totalHours = 0;
+
+        filteredEvents.forEach(event => {
+            const start = new Date(event.start_time);
+            const end = new Date(event.end_time);
+            const duration = (end - start) / (1000 * 60 * 60); // Часы
+
+            const category = getCategory(event.category_id);
+            const categoryName = category ? category.name : 'Без категории';
+
+            if (!categoryStats[categoryName]) {
+                categoryStats[categoryName] = {
+                    hours: 0,
+                    color: category ? category.color : '#6c757d'
+                };
+            }
+
+            categoryStats[categoryName].hours += duration;
+            totalHours += duration;
+        });
+
+        // Преобразуем в массив и считаем проценты
+        const result = Object.keys(categoryStats).map(name => ({
+            name,
+            hours: categoryStats[name].hours,
+            color: categoryStats[name].color,
+            percentage: totalHours > 0 ? (categoryStats[name].hours / totalHours) * 100 : 0
+        }));
+
+        // Сортируем по убыванию
+        result.sort((a, b) => b.hours - a.hours);
+
+        return result;
+    }
+
+    function renderBalanceWheel(data) {
+        const ctx = elements.balanceWheel.getContext('2d');
+        const centerX = elements.balanceWheel.width / 2;
+        const centerY = elements.balanceWheel.height / 2;
+        const radius = Math.min(centerX, centerY) - 10;
+
+        // Очищаем canvas
+        ctx.clearRect(0, 0, elements.balanceWheel.width, elements.balanceWheel.height);
+
+        if (data.length === 0) {
+            // Отображаем пустое колесо
+            ctx.beginPath();
+            ctx.arc(centerX, centerY, radius, 0, Math.PI * 2);
+            ctx.fillStyle = '#f8f9fa';
+            ctx.fill();
+            ctx.strokeStyle = '#dee2e6';
+            ctx.lineWidth = 2;
+            ctx.stroke();
+
+            // Текст "Нет данных"
+            ctx.fillStyle = '#6c757d';
+            ctx.font = '14px Arial';
+            ctx.textAlign = 'center';
+            ctx.textBaseline = 'middle';
+            ctx.fillText('Нет данных', centerX, centerY);
+
+            elements.wheelLegend.innerHTML = '<div class="text-muted">Нет данных для отображения</div>';
+            return;
+        }
+
+        let startAngle = 0;
+
+        // Рисуем сектора
+        data.forEach(item => {
+            const sliceAngle = (item.percentage / 100) * Math.PI * 2;
+
+            ctx.beginPath();
+            ctx.moveTo(centerX, centerY);
+            ctx.arc(centerX, centerY, radius, startAngle, startAngle + sliceAngle);
+            ctx.closePath();
+
+            ctx.fillStyle = item.color;
+            ctx.fill();
+            ctx.strokeStyle = '#fff';
+            ctx.lineWidth = 1;
+            ctx.stroke();
+
+            startAngle += sliceAngle;
+        });
+
+        // Центральный круг
+        ctx.beginPath();
+        ctx.arc(centerX, centerY, radius * 0.4, 0, Math.PI * 2);
+        ctx.fillStyle = '#fff';
+        ctx.fill();
+        ctx.strokeStyle = '#dee2e6';
+        ctx.lineWidth = 1;
+        ctx.stroke();
+
+        // Обновляем легенду
+        updateWheelLegend(data);
+    }
+
+    function updateWheelLegend(data) {
+        elements.wheelLegend.innerHTML = '';
+
+        data.forEach(item => {
+            const legendItem = document.createElement('div');
+            legendItem.className = 'wheel-legend-item';
+            legendItem.innerHTML = `
+                <span class="legend-dot" style="background-color: ${item.color}; width: 12px; height: 12px; border-radius: 50%;"></span>
+                <span>${item.name}</span>
+                <small class="text-muted">(${Math.round(item.hours)}ч, ${Math.round(item.percentage)}%)</small>
+            `;
+            elements.wheelLegend.appendChild(legendItem);
+        });
+    }
+
+    // Вспомогательные функции
+    async function loadEvents() {
+        // В режиме бенчмарка сетка работает на синтетических данных
+        if (config.benchmarkEvents) return;
+
+        try {
+            const [year, week] = elements.weekPicker.value.split('-W');
+            const response = await fetch(`/api/v1/events/week/${year}-W${week}?format=columnar`);
+
+            if (response.ok) {
+                const data = await response.json();
+                state.events = data.columns ? decodeColumnarEvents(data) : (data.events || data);
+                state.version = data.version ?? null;
+                const [y, m, d] = data.week.start_date.split('-').map(Number);
+                state.weekRange = [new Date(y, m - 1, d), new Date(y, m - 1, d + 7)];
+            }
+        } catch (error) {
+            console.error('Ошибка загрузки событий:', error);
+        }
+
+        renderEvents();
+        updateBalanceWheel();
+    }
+
+    // Догрузка только изменений недели после state.version (вместо полной перезагрузки)
+    async function syncChanges() {
+        if (state.version === null) return loadEvents();
+
+        try {
+            const [year, week] = elements.weekPicker.value.split('-W');
+            const response = await fetch(`/api/v1/events/changes?since=${state.version}&week=${year}-W${week}`);
+            if (!response.ok) return;
+
+            const data = await response.json();
+            if (data.reset) return loadEvents();
+            if (!data.changed.length && !data.deleted.length) {
+                state.version = data.version;
+                return;
+            }
+
+            applyChanges(data.changed, data.deleted, data.version);
+        } catch (error) {
+            console.error('Ошибка синхронизации событий:', error);
+        }
+    }
+
+    function applyChanges(changed, deleted, version) {
+        const removed = new Set(deleted);
+        changed.forEach(event => removed.add(event.id));
+
+        // Сетка показывает одну неделю - события других недель не добавляем
+        const inWeek = event => {
+            if (!state.weekRange) return true;
+            const start = new Date(event.start_time);
+            return start >= state.weekRange[0] && start < state.weekRange[1];
+        };
+
+        state.events = state.events.filter(event => !removed.has(event.id))
+            .concat(changed.filter(inWeek));
+        state.version = version;
+
+        renderEvents();
+        updateBalanceWheel();
+    }
+
+    // Push-обновления (SSE): факты из бота появляются без перезагрузки
+    function initEventStream() {
+        if (!config.eventStream || !window.EventSource) {
+            setInterval(() => {
+                if (document.visibilityState === 'visible') syncChanges();
+            }, config.pollSeconds * 1000);
+            return;
+        }
+
+        state.eventSource = new EventSource('/api/v1/events/stream');
+        state.eventSource.addEventListener('changes', message => {
+            const data = JSON.parse(message.data);
+            if (state.version === null || data.version <= state.version) return;
+
+            // Сообщение продолжает нашу версию и содержит все изменения - применяем сразу
+            if (data.complete && data.previous_version === state.version) {
+                applyChanges(data.changed, data.deleted, data.version);
+            } else {
+                syncChanges();
+            }
+        });
+        // Сервер отказал (лимит потоков, 503) - EventSource сам не переподключится:
+        // догоняем изменения и пробуем снова позже
+        state.eventSource.onerror = () => {
+            if (state.eventSource.readyState !== EventSource.CLOSED) return;
+            syncChanges();
+            setTimeout(initEventStream, 30000);
+        };
+    }
+
+    // Компактный формат недели (?format=columnar) -> массив событий как у Event.to_dict()
+    function decodeColumnarEvents(data) {
+        const columns = data.columns;
+        const [y, m, d] = data.week.start_date.split('-').map(Number);
+        const events = new Array(data.count);
+
+        for (let i = 0; i < data.count; i++) {
+            const start = new Date(y, m - 1, d, 0, columns.start[i]);
+            const end = new Date(y, m - 1, d, 0, columns.start[i] + columns.slots[i] * data.slot_minutes);
+            events[i] = {
+                id: columns.id[i],
+                category_id: columns.category_id[i],
+                start_time: toLocalISOString(start),
+                end_time: toLocalISOString(end),
+                type: columns.fact[i] ? 'fact' : 'plan'
+            };
+        }
+        return events;
+    }
+
+    function toLocalISOString(date) {
+        const pad = n => n.toString().padStart(2, '0');
+        return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}` +
+               `T${pad(date.getHours())}:${pad(date.getMinutes())}:00`;
+    }
+
+    function getCategory(categoryId) {
+        // Индекс пересобирается, только если список категорий заменили или дополнили
+        if (categoryIndex.source !== state.categories || categoryIndex.size !== state.categories.length) {
+            categoryIndex = {
+                source: state.categories,
+                size: state.categories.length,
+                byId: new Map(state.categories.map(category => [String(category.id), category]))
+            };
+        }
+        return categoryIndex.byId.get(String(categoryId));
+    }
+
+    // Перерисовка откладывается до ближайшего кадра: несколько вызовов подряд - одна запись в DOM
+    function renderEvents() {
+        if (renderFrame !== null) return;
+        renderFrame = requestAnimationFrame(() => {
+            renderFrame = null;
+            renderEventsNow();
+        });
+    }
+
+    function getEventPlacement(event) {
+        const start = new Date(event.start_time);
+        const end = new Date(event.end_time);
+
+        const startHour = start.getHours() + start.getMinutes() / 60;
+        const endHour = end.getHours() + end.getMinutes() / 60;
+
+        const durationSlots = Math.round((endHour - startHour) * 4);
+        const startSlot = Math.round((startHour - state.timeSettings.startHour) * 4);
+
+        if (startSlot < 0 || startSlot >= elements.scheduleBody.children.length) return null;
+
+        const dayOfWeek = start.getDay();
+        const adjustedDay = dayOfWeek === 0 ? 6 : dayOfWeek - 1;
+
+        const row = elements.scheduleBody.children[startSlot];
+        if (!row) return null;
+
+        const dayCell = row.children[adjustedDay + 1];
+        if (!dayCell) return null;
+
+        const cell = event.type === 'plan' ? 
+            dayCell.querySelector('.plan-column') : 
+            dayCell.querySelector('.fact-column');
+
+        return cell ? { cell, startSlot, adjustedDay, durationSlots } : null;
+    }
+
+    function fillEventElement(eventDiv, event, category, durationSlots) {
+        eventDiv.className = event.type === 'plan' ? 'plan-event' : 'fact-event';
+        eventDiv.textContent = category ? category.name : 'Без категории';
+        eventDiv.dataset.eventId = event.id;
+        eventDiv.dataset.categoryId = event.category_id;
+        eventDiv.style.borderLeftColor = category ? category.color : '';
+
+        if (durationSlots > 1) {
+            eventDiv.style.height = `${durationSlots * config.slotHeight - 2}px`;
+            eventDiv.style.top = '1px';
+        } else {
+            eventDiv.style.height = '';
+            eventDiv.style.top = '';
+        }
+    }
+
+    // Сравнение с уже отрисованным по id: создаются, меняются и удаляются только отличающиеся узлы
+    function renderEventsNow() {
+        const seen = new Set();
+        const writes = [];
+
+        // Сначала вычисляем изменения, затем одним проходом пишем в DOM
+        state.events.forEach(event => {
+            try {
+                const placement = getEventPlacement(event);
+                if (!placement) return;
+
+                const id = String(event.id);
+                const category = getCategory(event.category_id);
+                const key = [
+                    event.type, placement.startSlot, placement.adjustedDay, placement.durationSlots,
+                    event.category_id, category ? category.name : '', category ? category.color : ''
+                ].join('|');
+                seen.add(id);
+
+                const rendered = renderedEvents.get(id);
+                if (rendered && rendered.key === key && rendered.element.isConnected) return;
+                writes.push({ id, event, category, key, placement, rendered });
+            } catch (error) {
+                console.error('Ошибка рендеринга события:', error);
+            }
+        });
+
+        const stats = { created: 0, updated: 0, removed: 0 };
+
+        renderedEvents.forEach((rendered, id) => {
+            if (!seen.has(id)) {
+                rendered.element.remove();
+                renderedEvents.delete(id);
+                stats.removed++;
+            }
+        });
+
+        writes.forEach(({ id, event, category, key, placement, rendered }) => {
+            const eventDiv = rendered ? rendered.element : document.createElement('div');
+            fillEventElement(eventDiv, event, category, placement.durationSlots);
+            if (eventDiv.parentNode !== placement.cell) {
+                placement.cell.appendChild(eventDiv);
+            }
+            renderedEvents.set(id, { element: eventDiv, key });
+            stats[rendered ? 'updated' : 'created']++;
+        });
+
+        return stats;
+    }
+
+    // Бенчмарк сетки (/schedule/benchmark): синтетическая неделя без обращений к API
+    function generateSyntheticWeek(count) {
+        if (!state.categories.length) loadDefaultCategories();
+
+        const weekStart = getWeekStartDate();
+        const slots = elements.scheduleBody.children.length;
+        const events = [];
+
+        for (let i = 0; i < count; i++) {
+            const start = new Date(weekStart);
+            start.setDate(start.getDate() + i % 7);
+            start.setHours(0, 0, 0, 0);
+            start.setMinutes(state.timeSettings.startHour * 60 + Math.floor(Math.random() * slots) * config.slotMinutes);
+
+            const end = new Date(start);
+            end.setMinutes(end.getMinutes() + config.slotMinutes * (1 + Math.floor(Math.random() * 4)));
+
+            events.push({
+                id: `bench-${i}`,
+                type: i % 2 ? 'fact' : 'plan',
+                category_id: state.categories[i % state.categories.length].id,
+                start_time: toLocalISOString(start),
+                end_time: toLocalISOString(end),
+                description: ''
+            });
+        }
+        return events;
+    }
+
+    function measureRender(label, prepare, runs = 5) {
+        const timings = [];
+        let stats = null;
+
+        for (let run = 0; run < runs; run++) {
+            prepare(run);
+            const started = performance.now();
+            stats = renderEventsNow();
+            // Принудительный layout, чтобы в замер попала и перекладка страницы
+            void elements.scheduleTable.offsetHeight;
+            timings.push(performance.now() - started);
+        }
+
+        timings.sort((a, b) => a - b);
+        return { label, median_ms: +timings[Math.floor(runs / 2)].toFixed(2), ...stats };
+    }
+
+    function runRenderBenchmark(count) {
+        state.events = generateSyntheticWeek(count);
+        const changeCount = Math.max(1, Math.round(count / 100));
+
+        const results = [
+            // Прежнее поведение: удалить все узлы и построить заново
+            measureRender('Полная перерисовка', () => {
+                renderedEvents.forEach(rendered => rendered.element.remove());
+                renderedEvents.clear();
+            }),
+            measureRender('Без изменений', () => {}),
+            measureRender(`Изменено ${changeCount} событий`, run => {
+                for (let i = 0; i < changeCount; i++) {
+                    const event = state.events[(i * 97 + run) % count];
+                    const category = state.categories[(run + 1) % state.categories.length];
+                    state.events[(i * 97 + run) % count] = { ...event, category_id: category.id };
+                }
+            })
+        ];
+
+        console.table(results);
+
+        const panel = document.createElement('div');
+        panel.className = 'alert alert-info';
+        panel.innerHTML = `<strong>Бенчмарк сетки: ${count} событий</strong>` +
+            '<table class="table table-sm mb-0 mt-2"><thead><tr><th>Сценарий</th><th>Медиана, мс</th>' +
+            '<th>Создано</th><th>Изменено</th><th>Удалено</th></tr></thead><tbody>' +
+            results.map(r => `<tr><td>${r.label}</td><td>${r.median_ms}</td><td>${r.created}</td>` +
+                `<td>${r.updated}</td><td>${r.removed}</td></tr>`).join('') +
+            '</tbody></table>';
+        elements.scheduleTable.parentElement.before(panel);
+    }
+
+    function getWeekStartDate() {
+        const [year, week] = elements.weekPicker.value.split('-W');
+        const dates = getWeekDates(year, week);
+        return dates.start;
+    }
+
+    function saveData() {
+        // Сохраняем события в localStorage (в реальном приложении - на сервер)
+        localStorage.setItem('scheduleEvents', JSON.stringify(state.events));
+        localStorage.setItem('scheduleCategories', JSON.stringify(state.categories));
+    }
+
+    function initEventHandlers() {
+        // Навигация по неделям
+        elements.currentWeekBtn.addEventListener('click', setCurrentWeek);
+        elements.prevWeekBtn.addEventListener('click', prevWeek);
+        elements.nextWeekBtn.addEventListener('click', nextWeek);
+        elements.weekPicker.addEventListener('change', updateWeek);
+
+        // Настройки времени
+        elements.timeSettingsBtn.addEventListener('click', showTimeSettings);
+        document.getElementById('timeSettingsForm').addEventListener('submit', saveTimeSettings);
+
+        // Шаблоны
+        elements.saveTemplateBtn.addEventListener('click', showSaveTemplateDialog);
+        elements.templatesBtn.addEventListener('click', showTemplatesModal);
+        document.getElementById('createTemplateBtn').addEventListener('click', createTemplate);
+
+        // Категории
+        elements.addCategoryBtn.addEventListener('click', showCategoryModal);
+        document.getElementById('categoryForm').addEventListener('submit', createCategory);
+
+        // Массовое заполнение
+        elements.bulkPlanBtn.addEventListener('click', () => bulkFill('plan'));
+        elements.bulkFactBtn.addEventListener('click', () => bulkFill('fact'));
+        elements.bulkClearBtn.addEventListener('click', bulkClear);
+        elements.bulkCancelBtn.addEventListener('click', clearSelection);
+
+        // Быстрые действия
+        elements.quickEventBtn.addEventListener('click', showQuickEventModal);
+        elements.clearDayBtn.addEventListener('click', clearCurrentDay);
+        elements.copyDayBtn.addEventListener('click', copyCurrentDay);
+        elements.statsBtn.addEventListener('click', showStatistics);
+
+        // Колесо баланса
+        elements.wheelPeriod.addEventListener('change', updateBalanceWheel);
+
+        // При возврате на вкладку догружаем изменения (например, факты из бота)
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') syncChanges();
+        });
+
+        // Инициализация клавиш для выбора ячеек
+        initSelectionHandlers();
+
+        // Загрузка шаблонов
+        loadTemplates();
+    }
+
+    function setCurrentWeek() {
+        const today = new Date();
+        const year = today.getFullYear();
+        const week = getWeekNumber(today);
+        elements.weekPicker.value = `${year}-W${week.toString().padStart(2, '0')}`;
+        updateWeek();
+    }
+
+    function getWeekNumber(date) {
+        const firstDayOfYear = new Date(date.getFullYear(), 0, 1);
+        const pastDaysOfYear = (date - firstDayOfYear) / 86400000;
+        return Math.ceil((pastDaysOfYear + firstDayOfYear.getDay() + 1) / 7);
+    }
+
+    function prevWeek() {
+        const [year, week] = elements.weekPicker.value.split('-W');
+        let newWeek = parseInt(week) - 1;
+        let newYear = parseInt(year);
+
+        if (newWeek < 1) {
+            newYear--;
+            newWeek = 52;
+        }
+
+        elements.weekPicker.value = `${newYear}-W${newWeek.toString().padStart(2, '0')}`;
+        updateWeek();
+    }
+
+    function nextWeek() {
+        const [year, week] = elements.weekPicker.value.split('-W');
+        let newWeek = parseInt(week) + 1;
+        let newYear = parseInt(year);
+
+        if (newWeek > 52) {
+            newYear++;
+            newWeek = 1;
+        }
+
+        elements.weekPicker.value = `${newYear}-W${newWeek.toString().padStart(2, '0')}`;
+        updateWeek();
+    }
+
+    function updateWeek() {
+        updateWeekRange();
+        loadEvents();
+        updateBalanceWheel();
+    }
+
+    function showTimeSettings() {
+        const modal = new bootstrap.Modal(document.getElementById('timeSettingsModal'));
+        modal.show();
+    }
+
+    function saveTimeSettings(event) {
+        event.preventDefault();
+
+        const startTime = document.getElementById('startTimeInput').value;
+        const endTime = document.getElementById('endTimeInput').value;
+        const saveSettings = document.getElementById('saveTimeSettings').checked;
+
+        const [startH, startM] = startTime.split(':').map(Number);
+        const [endH, endM] = endTime.split(':').map(Number);
+
+        state.timeSettings.startHour = startH + startM / 60;
+        state.timeSettings.endHour = endH + endM / 60;
+
+        if (saveSettings) {
+            localStorage.setItem('scheduleStartTime', startTime);
+            localStorage.setItem('scheduleEndTime', endTime);
+        }
+
+        initSchedule();
+        loadEvents();
+
+        bootstrap.Modal.getInstance(document.getElementById('timeSettingsModal')).hide();
+    }
+
+    function showSaveTemplateDialog() {
+        const name = prompt('Введите название шаблона:');
+        if (name) {
+            saveTemplate(name);
+        }
+    }
+
+    function showTemplatesModal() {
+        updateTemplatesList();
+        const modal = new bootstrap.Modal(document.getElementById('templatesModal'));
+        modal.show();
+    }
+
+    function updateTemplatesList() {
+        const list = document.getElementById('templatesList');
+        list.innerHTML = '';
+
+        if (state.templates.length === 0) {
+            list.innerHTML = '<div class="text-center py-4 text-muted">Нет сохраненных шаблонов</div>';
+            return;
+        }
+
+        state.templates.forEach(template => {
+            const date = new Date(template.createdAt);
+            const item = document.createElement('div');
+            item.className = 'list-group-item list-group-item-action';
+            item.innerHTML = `
+                <div class="d-flex justify-content-between align-items-center">
+                    <div>
+                        <h6 class="mb-1">${template.name}</h6>
+                        <small class="text-muted">Создан: ${date.toLocaleDateString()}</small>
+                    </div>
+                    <div class="btn-group">
+                        <button class="btn btn-sm btn-outline-primary apply-template-btn" data-id="${template.id}">
+                            Применить
+                        </button>
+                        <button class="btn btn-sm btn-outline-secondary rename-template-btn" data-id="${template.id}">
+                            <i class="bi bi-pencil"></i>
+                        </button>
+                        <button class="btn btn-sm btn-outline-danger delete-template-btn" data-id="${template.id}">
+                            <i class="bi bi-trash"></i>
+                        </button>
+                    </div>
+                </div>
+            `;
+
+            list.appendChild(item);
+        });
+
+        // Обработчики для кнопок шаблонов
+        document.querySelectorAll('.apply-template-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                applyTemplate(this.dataset.id);
+                bootstrap.Modal.getInstance(document.getElementById('templatesModal')).hide();
+            });
+        });
+
+        document.querySelectorAll('.delete-template-btn').forEach(btn => {
+            btn.addEventListener('click', function() {
+                if (confirm('Удалить этот шаблон?')) {
+                    deleteTemplate(this.dataset.id);
+                    updateTemplatesList();
+                }
+            });
+        });
+    }
+
+    function createTemplate() {
+        const nameInput = document.getElementById('templateName');
+        const name = nameInput.value.trim();
+
+        if (!name) {
+            alert('Введите название шаблона');
+            return;
+        }
+
+        saveTemplate(name);
+        nameInput.value = '';
+        updateTemplatesList();
+    }
+
+    function deleteTemplate(templateId) {
+        state.templates = state.templates.filter(t => t.id != templateId);
+        saveTemplatesToStorage();
+    }
+
+    function showCategoryModal() {
+        initColorPicker();
+        const modal = new bootstrap.Modal(document.getElementById('categoryModal'));
+        modal.show();
+    }
+
+    function initColorPicker() {
+        const colors = [
+            '#4361ee', '#3a0ca3', '#7209b7', '#f72585',
+            '#4cc9f0', '#2a9d8f', '#e9c46a', '#f4a261',
+            '#e76f51', '#264653', '#2a9d8f', '#e9c46a'
+        ];
+
+        const container = document.getElementById('colorPicker');
+        container.innerHTML = '';
+
+        colors.forEach(color => {
+            const colorBtn = document.createElement('button');
+            colorBtn.type = 'button';
+            colorBtn.className = 'btn btn-sm rounded-circle';
+            colorBtn.style.width = '30px';
+            colorBtn.style.height = '30px';
+            colorBtn.style.backgroundColor = color;
+            colorBtn.style.border = '2px solid #fff';
+            colorBtn.style.boxShadow = '0 2px 4px rgba(0,0,0,0.1)';
+            colorBtn.title = color;
+
+            colorBtn.addEventListener('click', function(e) {
+                e.preventDefault();
+                document.getElementById('selectedColor').value = color;
+
+                // Убираем выделение со всех кнопок
+                container.querySelectorAll('button').forEach(btn => {
+                    btn.style.border = '2px solid #fff';
+                });
+
+                // Добавляем выделение выбранной кнопке
+                this.style.border = '2px solid #000';
+            });
+
+            container.appendChild(colorBtn);
+        });
+    }
+
+    function createCategory(event) {
+        event.preventDefault();
+
+        const name = document.getElementById('categoryName').value.trim();
+        const color = document.getElementById('selectedColor').value;
+        const description = document.getElementById('categoryDescription').value.trim();
+
+        if (!name) {
+            alert('Введите название категории');
+            return;
+        }
+
+        const newCategory = {
+            id: Date.now(),
+            name,
+            color,
+            description
+        };
+
+        state.categories.push(newCategory);
+        updateCategorySelects();
+        updateCategoriesList();
+        saveData();
+
+        document.getElementById('categoryForm').reset();
+        bootstrap.Modal.getInstance(document.getElementById('categoryModal')).hide();
+    }
+
+    function bulkFill(type) {
+        const categoryId = elements.bulkCategorySelect.value;
+        if (!categoryId) {
+            alert('Выберите категорию');
+            return;
+        }
+
+        const category = getCategory(categoryId);
+        if (!category) return;
+
+        state.selectedCells.forEach(cellId => {
+            const [day, time, cellType] = cellId.split('-');
+
+            if (cellType === type) {
+                // Создаем событие
+                const weekStart = getWeekStartDate();
+                const eventDate = new Date(weekStart);
+                eventDate.setDate(weekStart.getDate() + parseInt(day));
+
+                const [hours, minutes] = time.split(':').map(Number);
+                const startTime = new Date(eventDate);
+                startTime.setHours(hours, minutes, 0, 0);
+
+                const endTime = new Date(startTime);
+                endTime.setMinutes(endTime.getMinutes() + config.slotMinutes);
+
+                const eventId = `${cellId}-${Date.now()}`;
+
+                // Добавляем или обновляем событие
+                const existingIndex = state.events.findIndex(e => 
+                    e.type === type && 
+                    new Date(e.start_time).getHours() === hours &&
+                    new Date(e.start_time).getMinutes() === minutes &&
+                    new Date(e.start_time).getDate() === eventDate.getDate()
+                );
+
+                const eventData = {
+                    id: eventId,
+                    type: type,
+                    category_id: categoryId,
+                    start_time: startTime.toISOString(),
+                    end_time: endTime.toISOString(),
+                    description: ''
+                };
+
+                if (existingIndex >= 0) {
+                    state.events[existingIndex] = eventData;
+                } else {
+                    state.events.push(eventData);
+                }
+            }
+        });
+
+        renderEvents();
+        clearSelection();
+        updateBalanceWheel();
+        saveData();
+    }
+
+    function bulkClear() {
+        state.selectedCells.forEach(cellId => {
+            const [day, time, type] = cellId.split('-');
+
+            // Удаляем соответствующие события
+            const weekStart = getWeekStartDate();
+            const eventDate = new Date(weekStart);
+            eventDate.setDate(weekStart.getDate() + parseInt(day));
+
+            const [hours, minutes] = time.split(':').map(Number);
+
+            state.events = state.events.filter(event => {
+                if (event.type !== type) return true;
+
+                const eventTime = new Date(event.start_time);
+                return !(
+                    eventTime.getDate() === eventDate.getDate() &&
+                    eventTime.getHours() === hours &&
+                    eventTime.getMinutes() === minutes
+                );
+            });
+        });
+
+        renderEvents();
+        clearSelection();
+        updateBalanceWheel();
+        saveData();
+    }
+
+    function showQuickEventModal() {
+        updateCategorySelects(); // Обновляем список категорий
+        const modal = new bootstrap.Modal(document.getElementById('quickEventModal'));
+        modal.show();
+    }
+
+    function clearCurrentDay() {
+        const today = new Date();
+
+        if (confirm('Очистить все события на сегодня?')) {
+            // Очищаем события текущего дня
+            const todayStr = today.toISOString().split('T')[0];
+            state.events = state.events.filter(event => {
+                const eventDate = event.start_time.split('T')[0];
+                return eventDate !== todayStr;
+            });
+
+            renderEvents();
+            updateBalanceWheel();
+            saveData();
+        }
+    }
+
+    function copyCurrentDay() {
+        const today = new Date();
+        const tomorrow = new Date(today);
+        tomorrow.setDate(tomorrow.getDate() + 1);
+
+        if (confirm('Скопировать сегодняшние события на завтра?')) {
+            const todayStr = today.toISOString().split('T')[0];
+            const tomorrowStr = tomorrow.toISOString().split('T')[0];
+
+            // Находим события сегодняшнего дня
+            const todayEvents = state.events.filter(event => {
+                const eventDate = event.start_time.split('T')[0];
+                return eventDate === todayStr;
+            });
+
+            // Копируем события на завтра
+            todayEvents.forEach(event => {
+                const startTime = new Date(event.start_time);
+                const endTime = new Date(event.end_time);
+
+                startTime.setDate(startTime.getDate() + 1);
+                endTime.setDate(endTime.getDate() + 1);
+
+                const newEvent = {
+                    ...event,
+                    id: Date.now() + Math.random(),
+                    start_time: startTime.toISOString(),
+                    end_time: endTime.toISOString()
+                };
+
+                state.events.push(newEvent);
+            });
+
+            renderEvents();
+            updateBalanceWheel();
+            saveData();
+
+            alert('События скопированы на завтра!');
+        }
+    }
+
+    function showStatistics() {
+        alert('Статистика будет доступна в следующих версиях приложения');
+    }
+
+    // Инициализация текущей недели
+    setCurrentWeek();
+});
@@ -0,0 +1,165 @@
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from app import db
+from app.models import Event
+
+SLOT_MINUTES = 15
+
+
+def parse_week_id(week_id):
+    """Парсинг недели в формате '2025-W52' -> (год, номер недели)"""
+    year_str, week_str = week_id.split('-W')
+    return int(year_str), int(week_str)
+
+
+def get_week_start(year, week):
+    """
+    Начало ISO-недели (понедельник 00:00) - нумерация как у current_week и
+    <input type="week"> сетки расписания. Несуществующая неделя - ValueError.
+    """
+    return datetime.combine(date.fromisocalendar(year, week, 1), time.min)
+
+
+def current_week():
+    """Текущая неделя (год, номер)"""
+    year, week, _ = datetime.now().date().isocalendar()
+    return year, week
+
+
+def floor_to_slot(dt):
+    """Округление вниз до 15-минутного слота"""
+    return dt.replace(minute=dt.minute - dt.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def ceil_to_slot(dt):
+    """Округление вверх до 15-минутного слота"""
+    floored = floor_to_slot(dt)
+    return floored if floored == dt else floored + timedelta(minutes=SLOT_MINUTES)
+
+
+def merge_intervals(intervals):
+    """
+    Склеивает пересекающиеся и соседние интервалы.
+    Ожидает список (start, end), отсортированный по start.
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def find_free_intervals(busy, range_start, days, day_start_hour, day_end_hour,
+                        min_minutes=SLOT_MINUTES, not_before=None):
+    """
+    Свободные интервалы внутри рабочих часов каждого дня.
+
+    busy - занятые интервалы (start, end), отсортированные по start.
+    Один проход по склеенным интервалам для всей недели, без запросов по слотам.
+    """
+    merged = merge_intervals(busy)
+    min_length = timedelta(minutes=min_minutes)
+    free = []
+    i = 0
+
+    for day in range(days):
+        day_date = range_start + timedelta(days=day)
+        window_start = day_date + timedelta(hours=day_start_hour)
+        window_end = day_date + timedelta(hours=day_end_hour)
+        if not_before and not_before > window_start:
+            window_start = ceil_to_slot(not_before)
+        if window_start >= window_end:
+            continue
+
+        # Пропускаем интервалы, закончившиеся до начала окна
+        while i < len(merged) and merged[i][1] <= window_start:
+            i += 1
+
+        cursor = window_start
+        j = i
+        while j < len(merged) and merged[j][0] < window_end:
+            busy_start, busy_end = merged[j]
+            gap_start, gap_end = ceil_to_slot(cursor), floor_to_slot(busy_start)
+            if gap_end - gap_start >= min_length:
+                free.append((gap_start, gap_end))
+            cursor = max(cursor, busy_end)
+            j += 1
+
+        gap_start, gap_end = ceil_to_slot(cursor), floor_to_slot(window_end)
+        if gap_end - gap_start >= min_length:
+            free.append((gap_start, gap_end))
+
+    return free
+
+
+def load_busy_intervals(user_id, range_start, range_end):
+    """Занятые интервалы пользователя за период - один запрос, только нужные колонки"""
+    return db.session.query(Event.start_time, Event.end_time).filter(
+        Event.user_id == user_id,
+        Event.deleted_at.is_(None),
+        Event.start_time < range_end,
+        Event.end_time > range_start
+    ).order_by(Event.start_time).all()
+
+
+def free_slots_to_dict(free):
+    return [{
+        'start_time': start.isoformat(),
+        'end_time': end.isoformat(),
+        'duration_minutes': int((end - start).total_seconds() // 60)
+    } for start, end in free]
+
+
+def normalize_template_data(data):
+    """
+    Приводит данные шаблона к виду {день недели (0-6): [{time, category_id, duration}]}.
+    Понимает и формат из schedule.html (ключ categoryId).
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Template data must be an object')
+    
+    normalized = {}
+    for day_key, items in data.items():
+        day = int(day_key)
+        if not 0 <= day <= 6:
+            raise ValueError(f'Invalid day index: {day_key}')
+        entries = []
+        for item in items or []:
+            hours, minutes = map(int, str(item['time']).split(':'))
+            if not (0 <= hours < 24 and 0 <= minutes < 60):
+                raise ValueError(f"Invalid time: {item['time']}")
+            duration = int(item.get('duration') or 60)
+            if duration <= 0:
+                raise ValueError('Duration must be positive')
+            entries.append({
+                'time': f'{hours:02d}:{minutes:02d}',
+                'category_id': int(item.get('category_id') or item['categoryId']),
+                'duration': duration
+            })
+        if entries:
+            normalized[str(day)] = sorted(entries, key=lambda e: e['time'])
+    return normalized
+
+
+def expand_template(data, week_start):
+    """Разворачивает шаблон в интервалы (category_id, start, end) конкретной недели"""
+    expanded = []
+    for day_key, entries in data.items():
+        day_date = week_start + timedelta(days=int(day_key))
+        for entry in entries:
+            hours, minutes = map(int, entry['time'].split(':'))
+            start = day_date + timedelta(hours=hours, minutes=minutes)
+            expanded.append((entry['category_id'], start, start + timedelta(minutes=entry['duration'])))
+    expanded.sort(key=lambda e: e[1])
+    return expanded
+
+
+def overlaps_any(merged, start, end):
+    """Пересекается ли [start, end) со склеенными интервалами (бинарный поиск)"""
+    index = bisect_right(merged, [start, start]) - 1
+    if index >= 0 and merged[index][1] > start:
+        return True
+    return index + 1 < len(merged) and merged[index + 1][0] < end
@@ -0,0 +1,60 @@
+from typing import Optional
+
+import requests
+from bot.config import API_BASE_URL, API_TIMEOUT, BOT_TIMEZONE
+
+# Клиент бэкенда (/api/v1/telegram/*). Функции синхронные -
+# из обработчиков вызываются через asyncio.to_thread
+
+
+def _get(path: str, telegram_id: int, params: dict = None) -> dict:
+    response = requests.get(
+        f"{API_BASE_URL}/api/v1{path}",
+        headers={'X-Telegram-ID': str(telegram_id)},
+        params=params,
+        timeout=API_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_categories(telegram_id: int, etag: str = None) -> Optional[dict]:
+    """
+    Категории пользователя (+ 'etag'). С etag - условный запрос:
+    None, если категории не менялись (304).
+    """
+    headers = {'X-Telegram-ID': str(telegram_id)}
+    if etag:
+        headers['If-None-Match'] = f'"{etag}"'
+    response = requests.get(f"{API_BASE_URL}/api/v1/telegram/categories", headers=headers, timeout=API_TIMEOUT)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    data = response.json()
+    data['etag'] = response.headers.get('ETag', '').strip('"') or None
+    return data
+
+
+def get_free_slots(telegram_id: int, min_minutes: int = 15, days: int = 1) -> dict:
+    """Свободные интервалы пользователя, начиная с текущего момента (времена - в BOT_TIMEZONE)"""
+    return _get('/telegram/free-slots', telegram_id, {'min_minutes': min_minutes, 'days': days, 'tz': BOT_TIMEZONE})
+
+
+def bootstrap(telegram_id: int) -> dict:
+    """Пользователь, категории, быстрые ответы и текущее состояние - одним запросом"""
+    return _get('/telegram/bootstrap', telegram_id)
+
+
+def batch(telegram_id: int, operations: list, atomic: bool = False) -> dict:
+    """
+    Несколько операций за один запрос и одну транзакцию:
+    operations = [{'method': 'POST', 'path': '/telegram/events', 'body': {...}}, ...]
+    """
+    response = requests.post(
+        f"{API_BASE_URL}/api/v1/batch",
+        headers={'X-Telegram-ID': str(telegram_id)},
+        json={'operations': operations, 'atomic': atomic},
+        timeout=API_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
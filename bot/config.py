@@ -3,6 +3,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+API_BASE_URL = os.getenv('API_BASE_URL', 'https://time-tracker-z6co.onrender.com').rstrip('/')
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 10))
+# Часовой пояс пользователей бота (IANA): «сегодня» и времена в /free считаются в нём
+BOT_TIMEZONE = os.getenv('BOT_TIMEZONE', 'UTC')
 
 if not BOT_TOKEN:
     raise ValueError("Токен бота не найден! Проверь файл .env")
\ No newline at end of file
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import requests
+from telegram import ReplyKeyboardMarkup
+
+from bot import api
+
+logger = logging.getLogger(__name__)
+
+STOP_BUTTON = "⏹️ Остановить всё"
+
+# Категории по умолчанию - пока пользователь не зарегистрирован в веб-интерфейсе
+DEFAULT_CATEGORIES = [
+    "💼 Работа",
+    "📚 Учёба",
+    "🏃 Спорт",
+    "🎮 Отдых",
+    "🍽️ Еда",
+    "🚌 Транспорт"
+]
+
+# Через сколько секунд перепроверять категории (условный запрос, обычно 304)
+KEYBOARD_TTL = int(os.getenv('BOT_KEYBOARD_TTL', 600))
+# После ошибки бэкенда не долбим его на каждое сообщение
+ERROR_TTL = 60
+
+
+def build_keyboard(names: List[str]) -> ReplyKeyboardMarkup:
+    buttons = list(names) + [STOP_BUTTON]
+    keyboard = [buttons[i:i+2] for i in range(0, len(buttons), 2)]
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
+
+
+# Собирается один раз, а не на каждый ответ
+DEFAULT_KEYBOARD = build_keyboard(DEFAULT_CATEGORIES)
+
+
+class KeyboardEntry:
+    __slots__ = ('markup', 'etag', 'expires')
+
+    def __init__(self, markup: ReplyKeyboardMarkup, etag: Optional[str], expires: float):
+        self.markup = markup
+        self.etag = etag
+        self.expires = expires
+
+
+class KeyboardCache:
+    """
+    Готовые клавиатуры категорий по telegram_id. Пока запись свежая - без обращения
+    к бэкенду; по истечении TTL - запрос с If-None-Match, и при 304 прежняя
+    клавиатура просто продлевается.
+    """
+
+    def __init__(self, ttl: int = KEYBOARD_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, KeyboardEntry] = {}
+
+    def put(self, telegram_id: int, names: List[str], etag: Optional[str] = None) -> ReplyKeyboardMarkup:
+        markup = build_keyboard(names) if names else DEFAULT_KEYBOARD
+        self._entries[telegram_id] = KeyboardEntry(markup, etag, time.monotonic() + self.ttl)
+        return markup
+
+    def invalidate(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+
+    async def get(self, telegram_id: int, refresh: bool = False) -> ReplyKeyboardMarkup:
+        """Клавиатура пользователя; refresh=True - перепроверить категории сейчас"""
+        entry = self._entries.get(telegram_id)
+        now = time.monotonic()
+        if entry is not None and entry.expires > now and not refresh:
+            return entry.markup
+
+        try:
+            data = await asyncio.to_thread(api.get_categories, telegram_id, entry.etag if entry else None)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # Не зарегистрирован - категории по умолчанию
+                return self.put(telegram_id, [])
+            return self._fallback(telegram_id, entry, e)
+        except requests.RequestException as e:
+            return self._fallback(telegram_id, entry, e)
+
+        if data is None:
+            entry.expires = now + self.ttl
+            return entry.markup
+        return self.put(telegram_id, [category['name'] for category in data.get('categories', [])],
+                        data.get('etag'))
+
+    async def bootstrap(self, telegram_id: int) -> ReplyKeyboardMarkup:
+        """
+        Начало диалога (/start): категории приходят одним вызовом /telegram/bootstrap
+        вместе с categories_etag - клавиатура кладётся в кэш, и дальнейшие
+        перепроверки идут условным запросом с этим etag.
+        """
+        entry = self._entries.get(telegram_id)
+        try:
+            data = await asyncio.to_thread(api.bootstrap, telegram_id)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return self.put(telegram_id, [])
+            return self._fallback(telegram_id, entry, e)
+        except requests.RequestException as e:
+            return self._fallback(telegram_id, entry, e)
+
+        return self.put(telegram_id, [category['name'] for category in data.get('categories', [])],
+                        data.get('categories_etag'))
+
+    def _fallback(self, telegram_id: int, entry: Optional[KeyboardEntry], error) -> ReplyKeyboardMarkup:
+        logger.error(f"Ошибка получения категорий для {telegram_id}: {error}")
+        if entry is None:
+            entry = KeyboardEntry(DEFAULT_KEYBOARD, None, 0)
+            self._entries[telegram_id] = entry
+        entry.expires = time.monotonic() + ERROR_TTL
+        return entry.markup
+
+
+keyboard_cache = KeyboardCache()
+
+
+async def categories_keyboard(update) -> ReplyKeyboardMarkup:
+    return await keyboard_cache.get(update.effective_user.id)
+
+
+async def start_keyboard(update) -> ReplyKeyboardMarkup:
+    """Клавиатура для /start - свежие категории через bootstrap"""
+    return await keyboard_cache.bootstrap(update.effective_user.id)
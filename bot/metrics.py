@@ -0,0 +1,87 @@
+import functools
+import logging
+import os
+import time
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Порт для /metrics бота (только localhost); 0 - не поднимать
+METRICS_PORT = int(os.getenv('BOT_METRICS_PORT', 9101))
+METRICS_ADDR = os.getenv('BOT_METRICS_ADDR', '127.0.0.1')
+
+HANDLER_LATENCY = Histogram(
+    'bot_handler_duration_seconds', 'Время обработки апдейта',
+    ['handler'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+UPDATES = Counter('bot_updates_total', 'Обработанные апдейты (rate() - апдейтов в секунду)', ['handler', 'result'])
+STATE_SAVE_SECONDS = Histogram(
+    'bot_state_save_seconds', 'Сохранение состояний в хранилище',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+USER_STATES = Gauge('bot_user_states', 'Состояний пользователей в памяти процесса')
+REMINDERS_PENDING = Gauge('bot_reminders_pending', 'Ожидающих напоминаний в планировщике')
+
+
+class OutboxCollector:
+    """Глубина и счётчики очереди отправки (bot/outbox.py) на момент запроса метрик"""
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+
+    def collect(self):
+        # Сервер метрик работает в своём потоке, очередь меняется в event loop -
+        # при гонке с изменением словаря просто снимаем ещё раз
+        for _ in range(3):
+            try:
+                stats = self.outbox.stats()
+                break
+            except RuntimeError:
+                continue
+        else:
+            return
+        depth = GaugeMetricFamily('bot_outbox_depth', 'Сообщений в очереди отправки', labels=['priority'])
+        depth.add_metric(['interactive'], stats['depth_interactive'])
+        depth.add_metric(['reminder'], stats['depth_reminder'])
+        yield depth
+        yield GaugeMetricFamily('bot_outbox_oldest_wait_seconds', 'Ожидание самого старого сообщения',
+                                value=stats['oldest_wait_seconds'])
+        messages = CounterMetricFamily('bot_outbox_messages', 'Сообщения очереди по результату', labels=['result'])
+        for result in ('sent', 'failed', 'throttled', 'retried'):
+            messages.add_metric([result], stats[result])
+        yield messages
+
+
+def instrumented(handler):
+    """Обёртка обработчика: латентность и число апдейтов по имени обработчика"""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        result = 'ok'
+        try:
+            return await handler(update, context)
+        except Exception:
+            result = 'error'
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
+            UPDATES.labels(name, result).inc()
+    return wrapper
+
+
+def register_runtime_gauges(state_manager, reminder_scheduler, outbox):
+    """Значения снимаются в момент запроса метрик"""
+    USER_STATES.set_function(lambda: len(state_manager.user_states))
+    REMINDERS_PENDING.set_function(lambda: len(reminder_scheduler))
+    REGISTRY.register(OutboxCollector(outbox))
+
+
+def start_metrics_server():
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT, addr=METRICS_ADDR)
+        logger.info(f"Метрики бота: http://{METRICS_ADDR}:{METRICS_PORT}/metrics")
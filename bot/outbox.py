@@ -0,0 +1,268 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше. Ответы на сообщения не ждут за пачкой напоминаний
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REMINDER = 1
+
+# Лимиты Telegram: ~30 сообщений/с на бота и ~1/с в один чат (короткие всплески допустимы)
+GLOBAL_RATE = float(os.getenv('BOT_SEND_RATE', 25))
+CHAT_RATE = float(os.getenv('BOT_CHAT_SEND_RATE', 1))
+CHAT_BURST = int(os.getenv('BOT_CHAT_SEND_BURST', 3))
+MAX_IN_FLIGHT = 16
+MAX_ATTEMPTS = 3
+# Глубина очереди, начиная с которой пишем предупреждение в лог
+DEPTH_WARNING = 500
+# Сколько корзин чатов держать, прежде чем выбрасывать простаивающие
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float, now: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до появления токена (0 - можно отправлять)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutgoingMessage:
+    __slots__ = ('chat_id', 'send', 'priority', 'seq', 'future', 'attempts', 'queued_at')
+
+    def __init__(self, chat_id: int, send: Callable[[], Awaitable], priority: int, seq: int,
+                 future: asyncio.Future):
+        self.chat_id = chat_id
+        self.send = send
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений бота. Отправка идёт с учётом общего лимита и лимита
+    на чат (token bucket), сообщения одного чата уходят по порядку. Всплески
+    (напоминания на границе 15 минут) растягиваются во времени, а не упираются в 429;
+    если Telegram всё же ответил RetryAfter - отправка приостанавливается на указанное время.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, chat_burst: int = CHAT_BURST):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = TokenBucket(rate, rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._heap: List[Tuple[int, int, OutgoingMessage]] = []
+        # Ждут, пока у чата появится токен: (когда, приоритет, seq, сообщение)
+        self._delayed: List[Tuple[float, int, int, OutgoingMessage]] = []
+        # Ждут, пока уйдёт предыдущее сообщение того же чата
+        self._blocked: Dict[int, Deque[OutgoingMessage]] = {}
+        self._in_flight: Dict[int, asyncio.Task] = {}
+        self._paused_until = 0.0
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.retried = 0
+        self.max_wait = 0.0
+
+    # ======== ПОСТАНОВКА В ОЧЕРЕДЬ ========
+
+    def submit(self, chat_id: int, send: Callable[[], Awaitable], priority: int = PRIORITY_INTERACTIVE) -> asyncio.Future:
+        """
+        Ставит отправку в очередь. send - функция без аргументов, возвращающая корутину
+        (например, lambda: bot.send_message(...)). Результат - future с ответом Telegram.
+        """
+        future = asyncio.get_running_loop().create_future()
+        message = OutgoingMessage(chat_id, send, priority, next(self._counter), future)
+        heapq.heappush(self._heap, (priority, message.seq, message))
+
+        depth = self.depth()
+        if depth == DEPTH_WARNING:
+            logger.warning(f"Очередь исходящих сообщений: {depth}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    async def send(self, chat_id: int, send: Callable[[], Awaitable], priority: int = PRIORITY_INTERACTIVE):
+        """Как submit, но дожидается отправки и возвращает её результат"""
+        return await self.submit(chat_id, send, priority)
+
+    def send_later(self, chat_id: int, send: Callable[[], Awaitable], priority: int = PRIORITY_REMINDER):
+        """Отправка без ожидания результата (напоминания); ошибки только логируются"""
+        future = self.submit(chat_id, send, priority)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Не удалось отправить сообщение: {future.exception()}")
+
+    # ======== МЕТРИКИ ========
+
+    def depth(self) -> int:
+        return len(self._heap) + len(self._delayed) + sum(len(q) for q in self._blocked.values())
+
+    def stats(self) -> dict:
+        by_priority = {}
+        queued = [entry[2] for entry in self._heap] + [entry[3] for entry in self._delayed]
+        queued += [message for q in self._blocked.values() for message in q]
+        now = time.monotonic()
+        for message in queued:
+            by_priority[message.priority] = by_priority.get(message.priority, 0) + 1
+        return {
+            'depth': len(queued),
+            'depth_interactive': by_priority.get(PRIORITY_INTERACTIVE, 0),
+            'depth_reminder': by_priority.get(PRIORITY_REMINDER, 0),
+            'oldest_wait_seconds': round(max((now - m.queued_at for m in queued), default=0.0), 3),
+            'in_flight': len(self._in_flight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'throttled': self.throttled,
+            'retried': self.retried,
+            'max_wait_seconds': round(self.max_wait, 3),
+            'paused_seconds': round(max(self._paused_until - now, 0.0), 3)
+        }
+
+    # ======== ОТПРАВКА ========
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {cid: b for cid, b in self._chat_buckets.items() if not b.is_idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _release_delayed(self, now: float):
+        while self._delayed and self._delayed[0][0] <= now:
+            _, priority, seq, message = heapq.heappop(self._delayed)
+            heapq.heappush(self._heap, (priority, seq, message))
+
+    def _next_timeout(self, now: float) -> Optional[float]:
+        if self._heap:
+            return max(self._paused_until - now, self._global.wait_time(now), 0.0)
+        if self._delayed:
+            return max(self._delayed[0][0] - now, 0.0)
+        return None
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            self._release_delayed(now)
+            # При заполненных слотах отправки цикл разбудит завершившийся _deliver
+            timeout = None if len(self._in_flight) >= MAX_IN_FLIGHT else self._next_timeout(now)
+            if timeout != 0.0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, message = heapq.heappop(self._heap)
+            if message.chat_id in self._in_flight:
+                self._blocked.setdefault(message.chat_id, deque()).append(message)
+                continue
+            bucket = self._chat_bucket(message.chat_id, now)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait > 0:
+                self.throttled += 1
+                heapq.heappush(self._delayed, (now + chat_wait, message.priority, message.seq, message))
+                continue
+
+            self._global.take(now)
+            bucket.take(now)
+            self.max_wait = max(self.max_wait, now - message.queued_at)
+            self._in_flight[message.chat_id] = asyncio.get_running_loop().create_task(self._deliver(message))
+
+    async def _deliver(self, message: OutgoingMessage):
+        message.attempts += 1
+        try:
+            result = await message.send()
+        except Exception as e:
+            # telegram.error.RetryAfter - превысили лимит, Telegram говорит, сколько ждать
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None and message.attempts < MAX_ATTEMPTS:
+                self.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + float(retry_after))
+                logger.warning(f"Telegram RetryAfter {retry_after}с, отправка приостановлена")
+                heapq.heappush(self._heap, (message.priority, message.seq, message))
+            else:
+                self.failed += 1
+                if not message.future.done():
+                    message.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not message.future.done():
+                message.future.set_result(result)
+        finally:
+            self._in_flight.pop(message.chat_id, None)
+            # Следующие сообщения этого чата возвращаются в очередь в исходном порядке
+            blocked = self._blocked.pop(message.chat_id, None)
+            for queued in blocked or ():
+                heapq.heappush(self._heap, (queued.priority, queued.seq, queued))
+            self._wakeup.set()
+
+    def start(self):
+        """Запуск цикла отправки в текущем event loop"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        if self.depth():
+            logger.warning(f"Остановка бота: не отправлено {self.depth()} сообщений")
+
+
+async def reply(update, text: str, **kwargs):
+    """Ответ на сообщение пользователя через очередь (интерактивный приоритет)"""
+    return await outbox.send(
+        update.effective_chat.id,
+        lambda: update.message.reply_text(text, **kwargs),
+        PRIORITY_INTERACTIVE
+    )
+
+
+# Глобальная очередь отправки (как reminder_scheduler)
+outbox = Outbox()
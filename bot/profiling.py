@@ -0,0 +1,38 @@
+import functools
+import logging
+import os
+import threading
+
+from sampling_profiler import StackSampler, sampled, write_profile
+
+logger = logging.getLogger(__name__)
+
+# Доля профилируемых апдейтов (0 - выключено) и куда писать профили
+PROFILE_SAMPLE_RATE = float(os.getenv('BOT_PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.getenv('BOT_PROFILE_DIR', 'profiles/bot')
+PROFILE_INTERVAL = float(os.getenv('BOT_PROFILE_INTERVAL_MS', 5)) / 1000
+
+
+def profiled(handler):
+    """
+    Обёртка обработчика: для доли апдейтов снимает стек потока event loop, пока
+    выполняется обработчик. Пока идёт await, в профиль попадают и другие
+    корутины - смотреть стоит на ветки с именем обработчика.
+    При BOT_PROFILE_SAMPLE_RATE=0 обработчик возвращается без обёртки.
+    """
+    if not PROFILE_SAMPLE_RATE:
+        return handler
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        if not sampled(PROFILE_SAMPLE_RATE):
+            return await handler(update, context)
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL).start()
+        try:
+            return await handler(update, context)
+        finally:
+            sampler.stop()
+            path = write_profile(PROFILE_DIR, handler.__name__, sampler)
+            if path:
+                logger.info(f"Профиль {handler.__name__}: {path}")
+    return wrapper
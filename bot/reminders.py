@@ -0,0 +1,165 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Виды напоминаний: у пользователя не больше одного ожидающего напоминания каждого вида
+REMINDER_START = 'start'
+REMINDER_LONG_ACTIVITY = 'long_activity'
+
+# Предупреждение о длинной активности и упреждение напоминания о старте
+LONG_ACTIVITY_AFTER = timedelta(hours=4)
+START_REMINDER_LEAD = timedelta(seconds=10)
+
+
+class Reminder:
+    __slots__ = ('deadline', 'user_id', 'kind', 'data', 'cancelled')
+
+    def __init__(self, deadline: datetime, user_id: int, kind: str, data: dict):
+        self.deadline = deadline
+        self.user_id = user_id
+        self.kind = kind
+        self.data = data
+        self.cancelled = False
+
+
+class ReminderScheduler:
+    """
+    Один таймер на весь бот вместо job_queue.run_once на каждое переключение.
+    Дедлайны лежат в куче; новый дедлайн того же вида заменяет прежний (старая
+    запись помечается отменённой и выбрасывается при извлечении), поэтому живых
+    напоминаний не больше, чем активных пользователей × видов.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, Reminder]] = []
+        self._pending: Dict[Tuple[int, str], Reminder] = {}
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._handler: Optional[Callable[[Reminder], Awaitable[None]]] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, user_id: int, kind: str, when: datetime, data: dict = None) -> Reminder:
+        """Ставит (или переставляет) напоминание вида kind для пользователя"""
+        previous = self._pending.get((user_id, kind))
+        if previous is not None:
+            previous.cancelled = True
+
+        reminder = Reminder(when, user_id, kind, data or {})
+        self._pending[(user_id, kind)] = reminder
+        heapq.heappush(self._heap, (when, next(self._counter), reminder))
+        self._compact()
+
+        # Новый дедлайн раньше текущего ожидания - будим цикл
+        if self._wakeup is not None and self._heap[0][2] is reminder:
+            self._wakeup.set()
+        return reminder
+
+    def schedule_many(self, items: Iterable[Tuple[int, str, datetime, dict]]) -> int:
+        """Массовая постановка (user_id, kind, when, data) с одной пересборкой кучи"""
+        count = 0
+        for user_id, kind, when, data in items:
+            previous = self._pending.get((user_id, kind))
+            if previous is not None:
+                previous.cancelled = True
+            reminder = Reminder(when, user_id, kind, data or {})
+            self._pending[(user_id, kind)] = reminder
+            self._heap.append((when, next(self._counter), reminder))
+            count += 1
+        self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+        heapq.heapify(self._heap)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    def cancel(self, user_id: int, kind: str = None):
+        """Отменяет напоминание вида kind (или все виды) пользователя"""
+        kinds = [kind] if kind else [k for uid, k in self._pending if uid == user_id]
+        for k in kinds:
+            reminder = self._pending.pop((user_id, k), None)
+            if reminder is not None:
+                reminder.cancelled = True
+
+    def pending(self, user_id: int, kind: str) -> Optional[Reminder]:
+        return self._pending.get((user_id, kind))
+
+    def next_deadline(self) -> Optional[datetime]:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Reminder]:
+        """Извлекает все наступившие напоминания"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, reminder = heapq.heappop(self._heap)
+            if reminder.cancelled:
+                continue
+            del self._pending[(reminder.user_id, reminder.kind)]
+            due.append(reminder)
+        return due
+
+    def _compact(self):
+        # Отменённые записи копятся в куче до извлечения - пересобираем, если их стало много
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max((deadline - datetime.now()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            for reminder in self.pop_due(datetime.now()):
+                try:
+                    await self._handler(reminder)
+                except Exception as e:
+                    logger.error(f"Ошибка напоминания {reminder.kind} для user_id={reminder.user_id}: {e}")
+
+    def start(self, handler: Callable[[Reminder], Awaitable[None]]):
+        """Запуск цикла в текущем event loop; handler(reminder) вызывается по наступлении"""
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def pending_reminders(states, now: datetime):
+    """
+    Напоминания, которые должны ожидать для сохранённых состояний (восстановление
+    после рестарта). Просроченные склеиваются: пропущенный старт не напоминается,
+    пропущенное предупреждение о длинной активности уходит один раз - сейчас.
+    """
+    for state in states:
+        if not (state.is_tracking and state.start_time and state.current_category):
+            continue
+        # В личном чате chat_id совпадает с user_id - для состояний без chat_id
+        data = {'category': state.current_category, 'chat_id': state.chat_id or state.user_id}
+        start_at = state.start_time - START_REMINDER_LEAD
+        if start_at > now:
+            yield state.user_id, REMINDER_START, start_at, data
+        yield state.user_id, REMINDER_LONG_ACTIVITY, max(state.start_time + LONG_ACTIVITY_AFTER, now), data
+
+
+# Глобальный планировщик напоминаний (как state_manager)
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,44 @@
+import asyncio
+import functools
+import os
+
+# Число шардов: апдейты одного шарда обрабатываются строго по очереди,
+# разные шарды - параллельно
+SHARD_COUNT = int(os.getenv('BOT_SHARDS', 16))
+
+
+def shard_for(user_id: int, shards: int = SHARD_COUNT) -> int:
+    return user_id % shards
+
+
+class ShardLocks:
+    """
+    Замок на шард. asyncio.Lock будит ожидающих в порядке очереди, поэтому переходы
+    одного пользователя применяются в порядке прихода апдейтов даже при
+    concurrent_updates.
+    """
+
+    def __init__(self, shards: int = SHARD_COUNT):
+        self.shards = shards
+        self._locks = [asyncio.Lock() for _ in range(shards)]
+
+    def lock(self, user_id: int) -> asyncio.Lock:
+        return self._locks[shard_for(user_id, self.shards)]
+
+
+shard_locks = ShardLocks()
+
+
+def sharded(handler):
+    """
+    Обёртка обработчика: апдейт выполняется под замком шарда пользователя.
+    Шарды - только внутри процесса: все апдейты получает один процесс бота (getUpdates).
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await handler(update, context)
+        async with shard_locks.lock(user.id):
+            return await handler(update, context)
+    return wrapper
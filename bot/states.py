@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import pickle
 import os
 import logging
 
+from bot.storage import StateStore
+from bot.metrics import STATE_SAVE_SECONDS
+
 logger = logging.getLogger(__name__)
 
 class UserState:
@@ -11,6 +14,7 @@ class UserState:
         self.user_id = user_id
         self.current_category: Optional[str] = None
         self.start_time: Optional[datetime] = None
+        self.chat_id: Optional[int] = None
         self.is_tracking = False
         self.last_update = datetime.now()
     
@@ -31,61 +35,94 @@ class UserState:
             'category': self.current_category,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'is_tracking': self.is_tracking,
+            'chat_id': self.chat_id,
             'last_update': self.last_update.isoformat()
         }
     
     def is_expired(self, timeout_minutes=30):
         return (datetime.now() - self.last_update) > timedelta(minutes=timeout_minutes)
 
+    @classmethod
+    def from_dict(cls, data: dict) -> 'UserState':
+        state = cls(data['user_id'])
+        state.current_category = data.get('category')
+        start_time = data.get('start_time')
+        state.start_time = datetime.fromisoformat(start_time) if start_time else None
+        state.is_tracking = data.get('is_tracking', False)
+        state.chat_id = data.get('chat_id')
+        last_update = data.get('last_update')
+        state.last_update = datetime.fromisoformat(last_update) if last_update else datetime.now()
+        return state
+
 class StateManager:
-    def __init__(self, storage_file='bot_data/states.pkl'):
-        self.storage_file = storage_file
+    """
+    Состояния пользователей в общем хранилище (bot/storage.py) - его разделяют все
+    процессы бота. user_states - состояния, с которыми работает этот процесс;
+    get_state перечитывает состояние из хранилища, чтобы не опираться на устаревшую копию.
+    Методы блокирующие (sqlite3/psycopg2) - из обработчиков их вызывают через asyncio.to_thread.
+    """
+    def __init__(self, store: StateStore = None, legacy_file='bot_data/states.pkl'):
+        self.store = store or StateStore()
+        self.legacy_file = legacy_file
         self.user_states: Dict[int, UserState] = {}
         self.load_states()
     
     def load_states(self):
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.user_states = {}
-                    for user_id, state_data in data.items():
-                        state = UserState(user_id)
-                        state.current_category = state_data.get('category')
-                        start_time = state_data.get('start_time')
-                        state.start_time = datetime.fromisoformat(start_time) if start_time else None
-                        state.is_tracking = state_data.get('is_tracking', False)
-                        last_update = state_data.get('last_update')
-                        state.last_update = datetime.fromisoformat(last_update) if last_update else datetime.now()
-                        self.user_states[user_id] = state
-                logger.info(f"Загружено {len(self.user_states)} состояний")
-            except Exception as e:
-                logger.error(f"Ошибка загрузки состояний: {e}")
-                self.user_states = {}
+        """Состояния с идущей активностью - для восстановления напоминаний при старте"""
+        try:
+            self._import_legacy_file()
+            self.user_states = {
+                data['user_id']: UserState.from_dict(data)
+                for data in self.store.load_states(tracking_only=True)
+            }
+            logger.info(f"Загружено {len(self.user_states)} активных состояний")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки состояний: {e}")
+            self.user_states = {}
+    
+    def _import_legacy_file(self):
+        # Одноразовый перенос из states.pkl прежней версии бота
+        if not os.path.exists(self.legacy_file) or self.store.count_states():
+            return
+        with open(self.legacy_file, 'rb') as f:
+            data = pickle.load(f)
+        self.store.save_states(
+            UserState.from_dict({**state_data, 'user_id': user_id}).to_dict()
+            for user_id, state_data in data.items()
+        )
+        logger.info(f"Перенесено {len(data)} состояний из {self.legacy_file}")
+    
+    def save_state(self, state: UserState):
+        with STATE_SAVE_SECONDS.time():
+            self.store.save_states([state.to_dict()])
     
     def save_states(self):
-        os.makedirs(os.path.dirname(self.storage_file), exist_ok=True)
-        data = {uid: state.to_dict() for uid, state in self.user_states.items()}
-        with open(self.storage_file, 'wb') as f:
-            pickle.dump(data, f)
+        with STATE_SAVE_SECONDS.time():
+            self.store.save_states(state.to_dict() for state in self.user_states.values())
     
     def get_state(self, user_id: int) -> UserState:
-        if user_id not in self.user_states:
-            self.user_states[user_id] = UserState(user_id)
-        return self.user_states[user_id]
+        data = self.store.load_state(user_id)
+        stored = UserState.from_dict(data) if data else None
+        state = self.user_states.get(user_id)
+        if state is None:
+            state = stored or UserState(user_id)
+            self.user_states[user_id] = state
+        elif stored is not None and stored.last_update > state.last_update:
+            # Состояние обновил другой процесс
+            state.__dict__.update(stored.__dict__)
+        return state
     
-    def cleanup_expired(self):
-        expired = []
-        for user_id, state in self.user_states.items():
-            if state.is_expired() and state.is_tracking:
-                logger.info(f"Очистка просроченного состояния user_id={user_id}")
-                expired.append(user_id)
-        
+    def cleanup_expired(self, timeout_minutes=30):
+        expired = self.store.delete_expired(datetime.now() - timedelta(minutes=timeout_minutes))
         for user_id in expired:
-            del self.user_states[user_id]
-        
-        if expired:
-            self.save_states()
+            logger.info(f"Очистка просроченного состояния user_id={user_id}")
+            self.user_states.pop(user_id, None)
+    
+    def add_activity(self, user_id: int, activity: dict):
+        self.store.add_activity(user_id, activity)
+    
+    def activities(self, user_id: int, since: datetime = None) -> List[dict]:
+        return self.store.activities(user_id, since)
 
 # Важная строка! Создаём глобальный экземпляр менеджера
-state_manager = StateManager()
\ No newline at end of file
+state_manager = StateManager()
@@ -0,0 +1,181 @@
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# sqlite:///bot_data/states.db (по умолчанию) или postgresql://... (нужен psycopg2)
+BOT_STATE_URL = os.getenv('BOT_STATE_URL', 'sqlite:///bot_data/states.db')
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS bot_user_states (
+        user_id BIGINT PRIMARY KEY,
+        category TEXT,
+        start_time TEXT,
+        is_tracking INTEGER NOT NULL DEFAULT 0,
+        chat_id BIGINT,
+        last_update TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_bot_user_states_tracking ON bot_user_states (is_tracking, last_update)",
+    """CREATE TABLE IF NOT EXISTS bot_activities (
+        user_id BIGINT NOT NULL,
+        category TEXT,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        duration REAL NOT NULL,
+        slots INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_bot_activities_user_start ON bot_activities (user_id, start_time)"
+]
+
+STATE_COLUMNS = 'user_id, category, start_time, is_tracking, chat_id, last_update'
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class StateStore:
+    """
+    Состояния и история активностей в общей БД: несколько процессов бота видят
+    одни и те же данные. Время хранится строкой ISO - одинаково в SQLite и Postgres.
+    """
+
+    def __init__(self, url: str = BOT_STATE_URL):
+        self.url = url
+        self._lock = threading.Lock()
+        if url.startswith('sqlite:///'):
+            path = url[len('sqlite:///'):]
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Автокоммит; WAL + busy_timeout - чтобы процессы не мешали друг другу
+            self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._placeholder = '?'
+        elif url.startswith(('postgres://', 'postgresql://')):
+            import psycopg2
+            self._conn = psycopg2.connect(url)
+            self._conn.autocommit = True
+            self._placeholder = '%s'
+        else:
+            raise ValueError(f"Неподдерживаемый BOT_STATE_URL: {url}")
+
+        for statement in SCHEMA:
+            self._execute(statement)
+
+    def _sql(self, sql: str) -> str:
+        return sql.replace('?', self._placeholder)
+
+    def _execute(self, sql: str, params=(), fetch=False):
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute(self._sql(sql), params)
+                return cursor.fetchall() if fetch else None
+            finally:
+                cursor.close()
+
+    def _executemany(self, sql: str, rows: List[tuple]):
+        if not rows:
+            return
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                if self._placeholder == '?':
+                    cursor.execute('BEGIN')
+                cursor.executemany(self._sql(sql), rows)
+                if self._placeholder == '?':
+                    cursor.execute('COMMIT')
+            except Exception:
+                if self._placeholder == '?':
+                    cursor.execute('ROLLBACK')
+                raise
+            finally:
+                cursor.close()
+
+    # ======== СОСТОЯНИЯ ========
+
+    @staticmethod
+    def _state_row(state: dict) -> tuple:
+        return (state['user_id'], state['category'], state['start_time'],
+                int(bool(state['is_tracking'])), state['chat_id'], state['last_update'])
+
+    @staticmethod
+    def _state_dict(row) -> dict:
+        user_id, category, start_time, is_tracking, chat_id, last_update = row
+        return {
+            'user_id': user_id,
+            'category': category,
+            'start_time': start_time,
+            'is_tracking': bool(is_tracking),
+            'chat_id': chat_id,
+            'last_update': last_update
+        }
+
+    def load_state(self, user_id: int) -> Optional[dict]:
+        rows = self._execute(f'SELECT {STATE_COLUMNS} FROM bot_user_states WHERE user_id = ?',
+                             (user_id,), fetch=True)
+        return self._state_dict(rows[0]) if rows else None
+
+    def load_states(self, tracking_only: bool = False) -> List[dict]:
+        sql = f'SELECT {STATE_COLUMNS} FROM bot_user_states'
+        if tracking_only:
+            sql += ' WHERE is_tracking = 1'
+        return [self._state_dict(row) for row in self._execute(sql, fetch=True)]
+
+    def save_states(self, states: Iterable[dict]):
+        """Upsert состояний (словари UserState.to_dict())"""
+        self._executemany(
+            f"""INSERT INTO bot_user_states ({STATE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    category = excluded.category,
+                    start_time = excluded.start_time,
+                    is_tracking = excluded.is_tracking,
+                    chat_id = excluded.chat_id,
+                    last_update = excluded.last_update""",
+            [self._state_row(state) for state in states]
+        )
+
+    def delete_expired(self, cutoff: datetime) -> List[int]:
+        """Удаляет отслеживаемые состояния без обновлений с cutoff, возвращает user_id"""
+        rows = self._execute('SELECT user_id FROM bot_user_states WHERE is_tracking = 1 AND last_update < ?',
+                             (_iso(cutoff),), fetch=True)
+        user_ids = [row[0] for row in rows]
+        self._executemany('DELETE FROM bot_user_states WHERE user_id = ?', [(uid,) for uid in user_ids])
+        return user_ids
+
+    def count_states(self) -> int:
+        return self._execute('SELECT COUNT(*) FROM bot_user_states', fetch=True)[0][0]
+
+    # ======== ИСТОРИЯ АКТИВНОСТЕЙ ========
+
+    def add_activity(self, user_id: int, activity: Dict):
+        self._execute(
+            'INSERT INTO bot_activities (user_id, category, start_time, end_time, duration, slots) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (user_id, activity['category'], _iso(activity['start']), _iso(activity['end']),
+             activity['duration'], activity['slots'])
+        )
+
+    def activities(self, user_id: int, since: datetime = None) -> List[Dict]:
+        """Завершённые активности пользователя (с since - начатые не раньше), по времени начала"""
+        sql = 'SELECT category, start_time, end_time, duration, slots FROM bot_activities WHERE user_id = ?'
+        params = [user_id]
+        if since is not None:
+            sql += ' AND start_time >= ?'
+            params.append(_iso(since))
+        sql += ' ORDER BY start_time'
+        return [{
+            'category': category,
+            'start': _parse(start_time),
+            'end': _parse(end_time),
+            'duration': duration,
+            'slots': slots
+        } for category, start_time, end_time, duration, slots in self._execute(sql, tuple(params), fetch=True)]
@@ -1,13 +1,21 @@
 import logging
 import asyncio
-from datetime import datetime, timedelta
-from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove
+from datetime import datetime
+from telegram import ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
-from collections import defaultdict
+import requests
 
+from bot import api
 from bot.config import BOT_TOKEN
 from bot.states import state_manager
-from bot.utils import round_to_next_15, calculate_15min_slots
+from bot.sharding import sharded, SHARD_COUNT
+from bot.outbox import outbox, reply, PRIORITY_REMINDER
+from bot.keyboards import categories_keyboard, start_keyboard, STOP_BUTTON
+from bot.metrics import instrumented, register_runtime_gauges, start_metrics_server
+from bot.profiling import profiled
+from bot.reminders import (reminder_scheduler, pending_reminders, REMINDER_START, REMINDER_LONG_ACTIVITY,
+                           LONG_ACTIVITY_AFTER, START_REMINDER_LEAD)
+from bot.utils import round_to_next_15, calculate_15min_slots, today_start
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -15,33 +23,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Категории по умолчанию
-DEFAULT_CATEGORIES = [
-    "💼 Работа",
-    "📚 Учёба", 
-    "🏃 Спорт",
-    "🎮 Отдых",
-    "🍽️ Еда",
-    "🚌 Транспорт",
-    "⏹️ Остановить всё"
-]
-
-# Хранилище завершённых активностей (временное, до подключения бэкенда)
-activity_history = defaultdict(list)  # user_id -> list of activities
-
-def get_categories_keyboard():
-    keyboard = [DEFAULT_CATEGORIES[i:i+2] for i in range(0, len(DEFAULT_CATEGORIES), 2)]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
-
 async def start(update, context):
     user = update.effective_user
-    await update.message.reply_text(
+    await reply(
+        update,
         f"Привет, {user.first_name}! 👋\n\n"
         "📌 **Доступные команды:**\n"
         "/start - это сообщение\n"
         "/status - текущая активность\n"
         "/stats - статистика за сегодня\n"
         "/export - экспорт всех активностей\n"
+        "/free - когда свободно по плану\n"
         "/cancel - остановить всё\n\n"
         "📱 **Как использовать:**\n"
         "1. Выбери категорию - начнётся отсчёт\n"
@@ -51,7 +43,8 @@ async def start(update, context):
         "• Бот предупредит, если активность > 4 часов\n"
         "• Начало в следующий 15-минутный слот",
         parse_mode='Markdown',
-        reply_markup=get_categories_keyboard()
+        # /start - повод перепроверить категории, изменённые в веб-интерфейсе
+        reply_markup=await start_keyboard(update)
     )
 
 async def handle_category(update, context):
@@ -59,15 +52,17 @@ async def handle_category(update, context):
     category = update.message.text
     current_time = datetime.now()
     
-    state = state_manager.get_state(user.id)
+    state = await asyncio.to_thread(state_manager.get_state, user.id)
     state.last_update = current_time
+    state.chat_id = update.effective_chat.id
     
     # Остановка
-    if category == "⏹️ Остановить всё":
+    if category == STOP_BUTTON:
+        reminder_scheduler.cancel(user.id)
         if state.is_tracking:
             await stop_current_activity(update, state, current_time)
         else:
-            await update.message.reply_text("Сейчас ничего не отслеживается.")
+            await reply(update, "Сейчас ничего не отслеживается.")
         return
     
     # Завершаем предыдущую активность если есть
@@ -88,67 +83,63 @@ async def handle_category(update, context):
             f"⏱️ Через: {int(delay/60)} минут\n\n"
             f"_Продолжай свои дела до {start_time.strftime('%H:%M')}_"
         )
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await reply(update, message, parse_mode='Markdown')
         
-        # Напоминание когда время наступит
-        reminder_time = start_time - timedelta(seconds=10)
-        context.job_queue.run_once(
-            send_reminder,
-            when=reminder_time,
-            data={'user_id': user.id, 'category': category, 'chat_id': update.effective_chat.id},
-            name=f"reminder_{user.id}"
+        # Напоминание когда время наступит (заменяет прежнее, если было)
+        reminder_scheduler.schedule(
+            user.id, REMINDER_START, start_time - START_REMINDER_LEAD,
+            {'category': category, 'chat_id': update.effective_chat.id}
         )
     else:
+        reminder_scheduler.cancel(user.id, REMINDER_START)
         message = (
             f"🚀 **Начата активность:** {category}\n"
             f"🕐 Время: {start_time.strftime('%H:%M')}\n\n"
             f"_Работай продуктивно! Когда закончишь - выбери новую категорию_"
         )
-        await update.message.reply_text(message, parse_mode='Markdown', reply_markup=get_categories_keyboard())
-    
-    # Напоминание через 4 часа
-    warning_time = start_time + timedelta(hours=4)
-    context.job_queue.run_once(
-        send_long_activity_warning,
-        when=warning_time,
-        data={'user_id': user.id, 'chat_id': update.effective_chat.id, 'category': category},
-        name=f"warning_{user.id}"
+        await reply(update, message, parse_mode='Markdown', reply_markup=await categories_keyboard(update))
+    
+    # Напоминание через 4 часа: одно на пользователя, переключение его переставляет
+    reminder_scheduler.schedule(
+        user.id, REMINDER_LONG_ACTIVITY, start_time + LONG_ACTIVITY_AFTER,
+        {'category': category, 'chat_id': update.effective_chat.id}
     )
     
-    state_manager.save_states()
+    await asyncio.to_thread(state_manager.save_state, state)
 
-async def send_reminder(context):
+async def send_reminder(bot, reminder):
     """Напоминание о начале активности"""
-    job = context.job
-    user_id = job.data['user_id']
-    category = job.data['category']
-    chat_id = job.data['chat_id']
+    category = reminder.data['category']
+    chat_id = reminder.data['chat_id']
     
-    state = state_manager.get_state(user_id)
+    state = await asyncio.to_thread(state_manager.get_state, reminder.user_id)
     if state.is_tracking and state.current_category == category:
-        await context.bot.send_message(
+        outbox.send_later(chat_id, lambda: bot.send_message(
             chat_id=chat_id,
             text=f"⏰ **Время начать:** {category}\n"
                  f"Активность началась! Удачи! 🚀",
             parse_mode='Markdown'
-        )
+        ), PRIORITY_REMINDER)
 
-async def send_long_activity_warning(context):
+async def send_long_activity_warning(bot, reminder):
     """Предупреждение о слишком длинной активности"""
-    job = context.job
-    user_id = job.data['user_id']
-    chat_id = job.data['chat_id']
-    category = job.data['category']
+    chat_id = reminder.data['chat_id']
+    category = reminder.data['category']
     
-    state = state_manager.get_state(user_id)
+    state = await asyncio.to_thread(state_manager.get_state, reminder.user_id)
     if state.is_tracking and state.current_category == category:
-        await context.bot.send_message(
+        outbox.send_later(chat_id, lambda: bot.send_message(
             chat_id=chat_id,
             text=f"⚠️ **Внимание!**\n"
                  f"Активность '{category}' длится уже 4 часа.\n"
                  f"Может, стоит сделать перерыв? ☕",
             parse_mode='Markdown'
-        )
+        ), PRIORITY_REMINDER)
+
+REMINDER_HANDLERS = {
+    REMINDER_START: send_reminder,
+    REMINDER_LONG_ACTIVITY: send_long_activity_warning
+}
 
 async def finish_previous_activity(update, state, end_time: datetime, user_id: int):
     """Завершает предыдущую активность и сохраняет историю"""
@@ -166,13 +157,14 @@ async def finish_previous_activity(update, state, end_time: datetime, user_id: i
         'duration': (rounded_end - state.start_time).total_seconds() / 60,
         'slots': len(slots)
     }
-    activity_history[user_id].append(activity)
+    await asyncio.to_thread(state_manager.add_activity, user_id, activity)
     
     # Уведомляем пользователя
     duration_minutes = int((rounded_end - state.start_time).total_seconds() / 60)
     slots_text = f"{len(slots)} × 15 мин." if len(slots) > 1 else "15 мин."
     
-    await update.message.reply_text(
+    await reply(
+        update,
         f"✅ **Завершено:** {state.current_category}\n"
         f"⏱️ Длительность: {duration_minutes} мин. ({slots_text})\n"
         f"🕐 Время: {state.start_time.strftime('%H:%M')} - {rounded_end.strftime('%H:%M')}\n\n"
@@ -186,15 +178,17 @@ async def finish_previous_activity(update, state, end_time: datetime, user_id: i
 
 async def stop_current_activity(update, state, end_time: datetime):
     await finish_previous_activity(update, state, end_time, update.effective_user.id)
-    await update.message.reply_text(
+    await asyncio.to_thread(state_manager.save_state, state)
+    await reply(
+        update,
         "🛑 Все активности остановлены.",
-        reply_markup=get_categories_keyboard()
+        reply_markup=await categories_keyboard(update)
     )
 
 async def status(update, context):
     """Текущий статус"""
     user = update.effective_user
-    state = state_manager.get_state(user.id)
+    state = await asyncio.to_thread(state_manager.get_state, user.id)
     
     if state.is_tracking:
         current_time = datetime.now()
@@ -215,7 +209,7 @@ async def status(update, context):
         
         message += "_Используй кнопки ниже для управления_"
     else:
-        today_activities = activity_history.get(user.id, [])
+        today_activities = await asyncio.to_thread(state_manager.activities, user.id, today_start())
         total_today = sum(a['duration'] for a in today_activities)
         
         message = (
@@ -224,7 +218,7 @@ async def status(update, context):
             f"Выбери категорию чтобы начать! 🚀"
         )
     
-    await update.message.reply_text(message, parse_mode='Markdown', reply_markup=get_categories_keyboard())
+    await reply(update, message, parse_mode='Markdown', reply_markup=await categories_keyboard(update))
 
 async def stats_command(update, context):
     """Статистика за сегодня"""
@@ -232,13 +226,11 @@ async def stats_command(update, context):
     today = datetime.now().date()
     
     # Фильтруем сегодняшние активности
-    today_activities = [
-        a for a in activity_history.get(user.id, [])
-        if a['start'].date() == today
-    ]
+    today_activities = await asyncio.to_thread(state_manager.activities, user.id, today_start())
     
     if not today_activities:
-        await update.message.reply_text(
+        await reply(
+            update,
             "📊 **Статистика за сегодня**\n"
             "Активностей ещё нет. Начни отслеживать! 🚀",
             parse_mode='Markdown'
@@ -271,20 +263,18 @@ async def stats_command(update, context):
     
     message += f"\n_Хорошая продуктивность! 💪_"
     
-    await update.message.reply_text(message, parse_mode='Markdown')
+    await reply(update, message, parse_mode='Markdown')
 
 async def export_command(update, context):
     """Экспорт всех сегодняшних активностей"""
     user = update.effective_user
     today = datetime.now().date()
     
-    today_activities = [
-        a for a in activity_history.get(user.id, [])
-        if a['start'].date() == today
-    ]
+    today_activities = await asyncio.to_thread(state_manager.activities, user.id, today_start())
     
     if not today_activities:
-        await update.message.reply_text(
+        await reply(
+            update,
             "📋 **Экспорт активностей**\n"
             "Сегодня активностей ещё нет.",
             parse_mode='Markdown'
@@ -319,60 +309,128 @@ async def export_command(update, context):
     export_text += f"{total_minutes} мин., {total_slots} слотов\n"
     
     # Отправляем как отдельное сообщение с фиксированным шрифтом
-    await update.message.reply_text(
+    await reply(
+        update,
         f"```\n{export_text}\n```",
         parse_mode='MarkdownV2',
         reply_markup=ReplyKeyboardRemove()
     )
     
     # Также отправляем краткую версию
-    await update.message.reply_text(
+    await reply(
+        update,
         f"📤 Экспортировано {len(today_activities)} активностей\n"
         f"⏱ Общее время: {int(total_minutes)} минут\n"
         f"Дата: {today.strftime('%d.%m.%Y')}",
-        reply_markup=get_categories_keyboard()
+        reply_markup=await categories_keyboard(update)
     )
 
+async def free_command(update, context):
+    """Подсказка, когда начать следующую активность (свободные слоты из плана)"""
+    user = update.effective_user
+    
+    try:
+        data = await asyncio.to_thread(api.get_free_slots, user.id, 30)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            await reply(update, "Сначала зарегистрируйся через веб-интерфейс.")
+            return
+        logger.error(f"Ошибка получения свободных слотов: {e}")
+        await reply(update, "Не удалось получить расписание, попробуй позже.")
+        return
+    except requests.RequestException as e:
+        logger.error(f"Ошибка получения свободных слотов: {e}")
+        await reply(update, "Не удалось получить расписание, попробуй позже.")
+        return
+    
+    slots = data.get('free_slots', [])
+    if not slots:
+        await reply(update, "🗓 На сегодня свободных окон в плане нет.")
+        return
+    
+    message = "🗓 **Свободно сегодня:**\n\n"
+    for slot in slots[:8]:
+        start = datetime.fromisoformat(slot['start_time'])
+        end = datetime.fromisoformat(slot['end_time'])
+        message += f"• {start.strftime('%H:%M')} - {end.strftime('%H:%M')} ({slot['duration_minutes']} мин.)\n"
+    
+    next_start = datetime.fromisoformat(data['next_slot']['start_time'])
+    message += f"\n_Следующую активность можно начать в {next_start.strftime('%H:%M')}_"
+    
+    await reply(update, message, parse_mode='Markdown', reply_markup=await categories_keyboard(update))
+
 async def cancel(update, context):
     """Отмена всех активностей"""
     user = update.effective_user
-    state = state_manager.get_state(user.id)
+    state = await asyncio.to_thread(state_manager.get_state, user.id)
     
     if state.is_tracking:
         current_time = datetime.now()
         await finish_previous_activity(update, state, current_time, user.id)
+        await asyncio.to_thread(state_manager.save_state, state)
     
     # Очищаем все напоминания для этого пользователя
-    current_jobs = context.job_queue.get_jobs_by_name(f"reminder_{user.id}")
-    for job in current_jobs:
-        job.schedule_removal()
-    
-    current_warnings = context.job_queue.get_jobs_by_name(f"warning_{user.id}")
-    for job in current_warnings:
-        job.schedule_removal()
+    reminder_scheduler.cancel(user.id)
     
-    await update.message.reply_text(
+    await reply(
+        update,
         "🗑️ Все активности отменены, напоминания очищены.",
         reply_markup=ReplyKeyboardRemove()
     )
 
+async def post_init(application):
+    """Запуск общего таймера напоминаний в event loop бота"""
+    async def deliver(reminder):
+        await REMINDER_HANDLERS[reminder.kind](application.bot, reminder)
+    
+    # Напоминания живут только в памяти - восстанавливаем их из сохранённых состояний
+    restored = reminder_scheduler.schedule_many(
+        pending_reminders(state_manager.user_states.values(), datetime.now())
+    )
+    logger.info(f"Восстановлено напоминаний: {restored}")
+    # Все ответы и напоминания уходят через очередь с учётом лимитов Telegram
+    outbox.start()
+    reminder_scheduler.start(deliver)
+
+async def post_shutdown(application):
+    await reminder_scheduler.stop()
+    await outbox.stop()
+    logger.info(f"Очередь отправки: {outbox.stats()}")
+
+def handler(callback):
+    """Обработчик апдейта: очередь шарда пользователя + метрики + сэмплирующий профайлер"""
+    return sharded(instrumented(profiled(callback)))
+
 def main():
-    # Очищаем просроченные состояния при старте
-    state_manager.cleanup_expired()
-    
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Очищаем брошенные состояния при старте. Срок больше предупреждения о длинной
+    # активности - иначе идущие активности и их напоминания терялись бы при рестарте
+    state_manager.cleanup_expired(timeout_minutes=24 * 60)
+    
+    register_runtime_gauges(state_manager, reminder_scheduler, outbox)
+    start_metrics_server()
+    
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Апдейты разных шардов - параллельно, одного шарда - по очереди (см. bot/sharding.py)
+        .concurrent_updates(SHARD_COUNT)
+        .build()
+    )
     
     # Регистрируем обработчики команд
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("status", status))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("export", export_command))
-    application.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("start", handler(start)))
+    application.add_handler(CommandHandler("status", handler(status)))
+    application.add_handler(CommandHandler("stats", handler(stats_command)))
+    application.add_handler(CommandHandler("export", handler(export_command)))
+    application.add_handler(CommandHandler("free", handler(free_command)))
+    application.add_handler(CommandHandler("cancel", handler(cancel)))
     
     # Обработчик выбора категории
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND,
-        handle_category
+        handler(handle_category)
     ))
     
     logger.info("...")
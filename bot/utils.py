@@ -40,6 +40,10 @@ def calculate_15min_slots(start: datetime, end: datetime) -> list:
     
     return slots
 
+def today_start() -> datetime:
+    """Начало сегодняшнего дня (00:00)"""
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
 # Тестирующая функция
 def test_rounding():
     """Запусти эту функцию чтобы проверить округление"""
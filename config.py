@@ -6,3 +6,42 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///time_tracker.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
+    
+    # Реплика для чтения (app/replica.py): эндпоинты с @read_replica читают из неё,
+    # записи идут в основную БД. После своей записи пользователь ещё
+    # READ_YOUR_WRITES_SECONDS читает из основной - пока реплика догоняет
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': DATABASE_REPLICA_URL} if DATABASE_REPLICA_URL else {}
+    READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+    
+    # Рабочие часы дня для расписания (как в сетке schedule.html)
+    SCHEDULE_DAY_START_HOUR = float(os.environ.get('SCHEDULE_DAY_START_HOUR', 4))
+    SCHEDULE_DAY_END_HOUR = float(os.environ.get('SCHEDULE_DAY_END_HOUR', 22.5))
+    
+    # Склеивать новое событие с соседним той же категории и типа вместо новой строки
+    EVENT_MERGE_ON_WRITE = os.environ.get('EVENT_MERGE_ON_WRITE', '').lower() in ('1', 'true', 'yes')
+    
+    # Брокер push-обновлений между процессами gunicorn (app/pubsub.py): URL PostgreSQL
+    # для LISTEN/NOTIFY. Не задан - SSE выключен, страница опрашивает /events/changes
+    PUBSUB_URL = os.environ.get('PUBSUB_URL')
+    
+    # Одновременных SSE-потоков (/api/v1/events/stream) на процесс; каждый держит
+    # поток gthread, поэтому лимит должен быть меньше GUNICORN_THREADS в Dockerfile
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 16))
+    
+    # Токен для /metrics: Prometheus передаёт его в Authorization: Bearer ...
+    # (bearer_token в scrape_config). Не задан - /metrics выключен (404)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Сэмплирующий профайлер (app/profiling.py): доля профилируемых запросов (0 - выключен)
+    # и секрет для подписанного заголовка X-Profile; профили - в PROFILE_DIR
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SECRET = os.environ.get('PROFILE_SECRET')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    
+    # Архивация (flask archive-events): события старше ARCHIVE_HOT_MONTHS месяцев
+    # переносятся в events_archive, старше ARCHIVE_COLD_MONTHS - в сжатые файлы ARCHIVE_DIR
+    ARCHIVE_HOT_MONTHS = int(os.environ.get('ARCHIVE_HOT_MONTHS', 12))
+    ARCHIVE_COLD_MONTHS = int(os.environ.get('ARCHIVE_COLD_MONTHS', 36))
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
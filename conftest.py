@@ -0,0 +1,56 @@
+"""
+Общие фикстуры: приложение на временной SQLite и клиент с вошедшим пользователем.
+Кэши процесса сбрасываются - id пользователей в разных базах совпадают.
+"""
+import os
+import tempfile
+
+import pytest
+
+
+def clear_caches():
+    from app.archive import _months_cache
+    from app.cache import calendar_cache, category_cache, user_cache
+    from app.replica import recent_writes
+
+    for cache in (calendar_cache, category_cache, user_cache, recent_writes, _months_cache):
+        cache.clear()
+
+
+@pytest.fixture(scope='module')
+def app():
+    import config
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    previous = config.Config.SQLALCHEMY_DATABASE_URI
+    config.Config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+
+    from app import create_app, db
+    clear_caches()
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+
+    config.Config.SQLALCHEMY_DATABASE_URI = previous
+    clear_caches()
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(path)
+
+
+@pytest.fixture
+def web_client(app):
+    """Клиент нового пользователя (вход по паролю); логин и telegram_id - в атрибутах клиента"""
+    from app.models import User
+
+    with app.app_context():
+        number = User.query.count() + 1
+    client = app.test_client()
+    client.username = f'user{number}'
+    client.telegram_id = str(5000 + number)
+    client.post('/auth/register', data={'username': client.username, 'password': 'secret1',
+                                        'password_confirm': 'secret1', 'telegram_id': client.telegram_id})
+    response = client.post('/auth/login', data={'identifier': client.username, 'password': 'secret1'})
+    assert response.status_code == 302
+    return client
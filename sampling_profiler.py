@@ -0,0 +1,110 @@
+"""
+Сэмплирующий профайлер без зависимостей - общий для веб-приложения и бота.
+
+Пока идёт профилируемый запрос/апдейт, фоновый поток раз в interval снимает стек
+целевого потока (sys._current_frames). Результат - файл в формате collapsed stacks
+("f1;f2;f3 <число сэмплов>"), его понимают flamegraph.pl и speedscope.
+"""
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Сколько файлов профилей хранить в каталоге (старые удаляются)
+MAX_PROFILE_FILES = 200
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self) -> 'StackSampler':
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+                self.samples += 1
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame) -> str:
+    """Стек от корня к листу через ';'"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame).replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_profile(directory: str, name: str, sampler: StackSampler) -> str:
+    """Пишет профиль в directory, возвращает путь (или None, если сэмплов нет)"""
+    if not sampler.samples:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)[:80]
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(directory, f'{stamp}-{safe_name}-{int(sampler.duration * 1000)}ms.collapsed')
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    os.replace(tmp_path, path)
+    _prune(directory)
+    return path
+
+
+def _prune(directory: str):
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.collapsed'))
+    for name in files[:-MAX_PROFILE_FILES]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def sampled(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
+
+
+def sign_token(secret: str, expires: int) -> str:
+    """Токен для заголовка X-Profile: '<unix-время истечения>.<hmac>'"""
+    signature = hmac.new(secret.encode('utf-8'), str(expires).encode('utf-8'), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+
+def verify_token(secret: str, token: str) -> bool:
+    if not secret or not token or '.' not in token:
+        return False
+    expires, _ = token.split('.', 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign_token(secret, int(expires)), token)
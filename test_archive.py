@@ -0,0 +1,163 @@
+"""
+Архив событий (app/archive.py): арифметика месяцев, перенос в events_archive
+и в файлы, чтение диапазонов и счётчики с проваливанием в архив.
+
+    python -m pytest -q test_archive.py
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.archive import month_start, months_before, next_month, partition_name
+
+NOW = datetime(2025, 3, 15, 12)
+
+
+# ======== МЕСЯЦЫ ========
+
+def test_month_math():
+    assert month_start(datetime(2024, 2, 29, 23, 59)) == date(2024, 2, 1)
+    assert next_month(date(2024, 11, 1)) == date(2024, 12, 1)
+    assert next_month(date(2024, 12, 1)) == date(2025, 1, 1)
+    assert partition_name(date(2025, 3, 1)) == 'events_archive_2025_03'
+
+
+@pytest.mark.parametrize('count, expected', [
+    (0, date(2025, 3, 1)),
+    (2, date(2025, 1, 1)),
+    (3, date(2024, 12, 1)),
+    (12, date(2024, 3, 1)),
+    (15, date(2023, 12, 1)),
+    (36, date(2022, 3, 1)),
+])
+def test_months_before(count, expected):
+    assert months_before(NOW, count) == expected
+
+
+# ======== АРХИВАЦИЯ И ЧТЕНИЕ ========
+
+def _add_events(user_id, category_id, starts, event_type='fact'):
+    from app import db
+    from app.models import Event
+
+    for start in starts:
+        db.session.add(Event(user_id=user_id, category_id=category_id, start_time=start,
+                             end_time=start + timedelta(hours=1), type=event_type, source='web', version=1))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def archived(app, tmp_path_factory):
+    """Два пользователя; события в файле (2020), в events_archive (2023) и горячие"""
+    from app import db
+    from app.archive import archive_events
+    from app.models import Category, User
+
+    app.config.update(ARCHIVE_DIR=str(tmp_path_factory.mktemp('archive')),
+                      ARCHIVE_HOT_MONTHS=12, ARCHIVE_COLD_MONTHS=36)
+    with app.app_context():
+        ids = {}
+        for name in ('alice', 'bob'):
+            user = User(username=name)
+            user.set_password('secret1')
+            db.session.add(user)
+            db.session.flush()
+            category = Category(user_id=user.id, name='Work', color='#4361ee')
+            db.session.add(category)
+            db.session.flush()
+            ids[name] = (user.id, category.id)
+        db.session.commit()
+
+        alice, alice_category = ids['alice']
+        bob, bob_category = ids['bob']
+        _add_events(alice, alice_category, [datetime(2020, 1, 5, 9), datetime(2020, 1, 31, 23)])
+        _add_events(alice, alice_category, [datetime(2020, 2, 1, 9)], event_type='plan')
+        _add_events(alice, alice_category, [datetime(2023, 6, 10, 9), datetime(2023, 6, 30, 23)])
+        _add_events(alice, alice_category, [datetime(2025, 3, 1, 9)])
+        _add_events(bob, bob_category, [datetime(2020, 1, 10, 9), datetime(2023, 6, 11, 9)])
+
+        report = archive_events(now=NOW, dry_run=False).to_dict()
+        yield report, alice, alice_category, bob
+
+
+def test_archive_report(archived):
+    report = archived[0]
+    assert report['months'] == ['2020-01', '2020-02', '2023-06']
+    assert (report['rows_archived'], report['rows_to_files']) == (7, 4)
+
+
+def test_hot_events_stay(app, archived):
+    from app.models import Event, EventArchive
+
+    _, alice, _, _ = archived
+    with app.app_context():
+        assert [e.start_time for e in Event.query.filter_by(user_id=alice)] == [datetime(2025, 3, 1, 9)]
+        # В events_archive остался только тёплый месяц
+        assert EventArchive.query.count() == 3
+
+
+def test_archived_events_range(app, archived):
+    from app.archive import archived_events
+
+    _, alice, _, bob = archived
+    with app.app_context():
+        starts = [e.start_time for e in archived_events(alice)]
+        assert starts == [datetime(2020, 1, 5, 9), datetime(2020, 1, 31, 23), datetime(2020, 2, 1, 9),
+                          datetime(2023, 6, 10, 9), datetime(2023, 6, 30, 23)]
+
+        # Диапазон через границу месяцев: [start, end) по start_time
+        january_end = [e.start_time for e in archived_events(alice, datetime(2020, 1, 31), datetime(2020, 2, 1, 9))]
+        assert january_end == [datetime(2020, 1, 31, 23)]
+        inclusive = archived_events(alice, datetime(2020, 1, 31), datetime(2020, 2, 1, 9), end_inclusive=True)
+        assert [e.start_time for e in inclusive] == [datetime(2020, 1, 31, 23), datetime(2020, 2, 1, 9)]
+
+        assert [e.start_time for e in archived_events(bob)] == [datetime(2020, 1, 10, 9), datetime(2023, 6, 11, 9)]
+        # Новее архива - пусто
+        assert list(archived_events(alice, datetime(2024, 1, 1))) == []
+        assert next(archived_events(alice, datetime(2023, 6, 10, 9))).to_dict()['type'] == 'fact'
+
+
+def test_archived_events_filters_and_limit(app, archived, monkeypatch):
+    from app import archive
+    from app.archive import archived_events
+
+    _, alice, alice_category, bob = archived
+    with app.app_context():
+        newest = archived_events(alice, newest_first=True, limit=3)
+        assert [e.start_time for e in newest] == [datetime(2023, 6, 30, 23), datetime(2023, 6, 10, 9),
+                                                  datetime(2020, 2, 1, 9)]
+        plans = archived_events(alice, category_id=alice_category, event_type='plan')
+        assert [e.start_time for e in plans] == [datetime(2020, 2, 1, 9)]
+        assert list(archived_events(alice, category_id=alice_category + 100)) == []
+
+        # Файлы без строк пользователя (по счётчикам) не читаются; чтение останавливается на limit
+        opened = []
+        read_file = archive._read_file
+        monkeypatch.setattr(archive, '_read_file', lambda path: opened.append(path) or read_file(path))
+        assert [e.start_time for e in archived_events(bob, limit=1)] == [datetime(2020, 1, 10, 9)]
+        assert [path[-16:] for path in opened] == ['2020-01.jsonl.gz']
+
+
+def test_archived_counts(app, archived):
+    from app.archive import archived_counts
+
+    _, alice, alice_category, bob = archived
+    with app.app_context():
+        assert archived_counts(alice) == {'fact': 4, 'plan': 1}
+        assert archived_counts(alice, alice_category) == {'fact': 4, 'plan': 1}
+        assert archived_counts(alice, alice_category + 100) == {}
+        assert archived_counts(bob) == {'fact': 2}
+
+
+def test_endpoints_merge_archive(app, archived):
+    client = app.test_client()
+    client.post('/auth/login', data={'identifier': 'alice', 'password': 'secret1'})
+
+    lines = client.get('/api/v1/export?format=ndjson').get_data(as_text=True).splitlines()
+    starts = [line.split('"start_time": "')[1][:19] for line in lines]
+    assert starts == ['2020-01-05T09:00:00', '2020-01-31T23:00:00', '2020-02-01T09:00:00',
+                      '2023-06-10T09:00:00', '2023-06-30T23:00:00', '2025-03-01T09:00:00']
+
+    events = client.get('/api/my/events?type=fact').json
+    assert [e['start_time'] for e in events] == ['2025-03-01T09:00:00', '2023-06-30T23:00:00', '2023-06-10T09:00:00',
+                                                 '2020-01-31T23:00:00', '2020-01-05T09:00:00']
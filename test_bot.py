@@ -24,7 +24,7 @@ def test_state_system():
     print(f"✅ Просрочено?: {state.is_expired(timeout_minutes=0.1)}")
     
     print("-" * 40)
-    print("Тест завершён! Проверь файл bot_data/states.pkl")
+    print("Тест завершён! Проверь файл bot_data/states.db")
 
 if __name__ == "__main__":
     test_state_system()
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Компактизация событий (app/compaction.py): поиск серий соседних и
+пересекающихся событий одного ключа (категория, тип, описание).
+
+    python -m pytest -q test_compaction.py
+"""
+from datetime import datetime, timedelta
+
+from app.compaction import CompactionReport, find_runs
+
+DAY = datetime(2025, 3, 3)
+
+
+def row(event_id, start_hour, hours=1, category_id=1, event_type='fact', description=None):
+    start = DAY + timedelta(hours=start_hour)
+    return event_id, category_id, event_type, description, start, start + timedelta(hours=hours)
+
+
+def test_adjacent_and_overlapping_events_form_one_run():
+    runs = find_runs([row(1, 9), row(2, 10), row(3, 10.5, 2), row(4, 11, 0.5)])
+    assert len(runs) == 1
+    run = runs[0]
+    assert (run.event_id, run.merged_ids) == (1, [2, 3, 4])
+    assert (run.start_time, run.end_time) == (DAY + timedelta(hours=9), DAY + timedelta(hours=12, minutes=30))
+    assert run.original_end == DAY + timedelta(hours=10)
+
+
+def test_gap_splits_runs_and_single_events_are_skipped():
+    runs = find_runs([row(1, 9), row(2, 10), row(3, 12), row(4, 14), row(5, 15)])
+    assert [(run.event_id, run.merged_ids) for run in runs] == [(1, [2]), (4, [5])]
+
+
+def test_different_keys_are_not_merged():
+    rows = [
+        row(1, 9, category_id=1), row(2, 10, category_id=2),
+        row(3, 9, category_id=3, event_type='plan'), row(4, 10, category_id=3, event_type='fact'),
+        row(5, 9, category_id=4, description='a'), row(6, 10, category_id=4, description='b'),
+    ]
+    rows.sort(key=lambda r: (r[1], r[2], r[3] or '', r[4]))
+    assert find_runs(rows) == []
+
+
+def test_empty_description_matches_missing_one():
+    runs = find_runs([row(1, 9, description=None), row(2, 10, description='')])
+    assert [(run.event_id, run.merged_ids) for run in runs] == [(1, [2])]
+
+
+def test_report_totals():
+    report = CompactionReport(dry_run=True)
+    report.add_user(1, 10, find_runs([row(1, 9), row(2, 10), row(3, 11)]))
+    report.add_user(2, 5, [])
+    result = report.to_dict()
+    assert (result['users'], result['rows_scanned'], result['rows_removed'], result['rows_after']) == (2, 15, 2, 13)
+    assert result['runs_merged'] == 1
+    assert result['savings_percent'] == 13.3
+    assert result['top_users'] == [{'user_id': 1, 'rows': 10, 'rows_removed': 2}]
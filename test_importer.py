@@ -0,0 +1,153 @@
+"""
+Импорт событий (app/importer.py): разбор CSV/ICS, часовые пояса (Z, TZID,
+смещения ISO) и частичный импорт, когда файл не дочитывается до конца.
+
+    python -m pytest -q test_importer.py
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.importer import (ImportStats, _parse_datetime, import_events, iter_csv_records, iter_ics_records,
+                          parse_ics_datetime, parse_ics_duration)
+
+
+# ======== ПАРСЕРЫ ========
+
+def test_ics_datetime_time_zones():
+    assert parse_ics_datetime('20250301T090000') == datetime(2025, 3, 1, 9)
+    assert parse_ics_datetime('20250301T090000Z') == datetime(2025, 3, 1, 9)
+    assert parse_ics_datetime('20250301') == datetime(2025, 3, 1)
+    # Москва - UTC+3, Нью-Йорк в июле - UTC-4
+    assert parse_ics_datetime('20250301T090000', 'Europe/Moscow') == datetime(2025, 3, 1, 6)
+    assert parse_ics_datetime('20250701T090000', '"America/New_York"') == datetime(2025, 7, 1, 13)
+    with pytest.raises(ValueError, match='unknown TZID'):
+        parse_ics_datetime('20250301T090000', 'Mars/Olympus')
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('PT1H30M', timedelta(hours=1, minutes=30)),
+    ('PT45M', timedelta(minutes=45)),
+    ('P1D', timedelta(days=1)),
+    ('P1W', timedelta(days=7)),
+    ('P1DT2H', timedelta(days=1, hours=2)),
+    ('PT90S', timedelta(seconds=90)),
+    ('-PT15M', -timedelta(minutes=15)),
+])
+def test_ics_duration(value, expected):
+    assert parse_ics_duration(value) == expected
+
+
+def test_iso_datetime_offsets():
+    assert _parse_datetime('2025-03-01T09:00:00') == datetime(2025, 3, 1, 9)
+    assert _parse_datetime('2025-03-01T09:00:00+03:00') == datetime(2025, 3, 1, 6)
+    assert _parse_datetime(' 20250301T090000Z ') == datetime(2025, 3, 1, 9)
+    assert _parse_datetime(datetime(2025, 3, 1, 9)) == datetime(2025, 3, 1, 9)
+    with pytest.raises(ValueError):
+        _parse_datetime(None)
+
+
+def test_csv_records():
+    stream = io.StringIO('category,start_time,end_time,type,description\n'
+                         ' Work ,2025-03-01T09:00:00,2025-03-01T10:00:00,,\n'
+                         'Sport,2025-03-01T18:00:00,2025-03-01T19:00:00,plan,"run, 5 km"\n')
+    records = list(iter_csv_records(stream))
+    assert records == [
+        (2, {'category': 'Work', 'start_time': '2025-03-01T09:00:00', 'end_time': '2025-03-01T10:00:00',
+             'type': 'fact', 'description': None}),
+        (3, {'category': 'Sport', 'start_time': '2025-03-01T18:00:00', 'end_time': '2025-03-01T19:00:00',
+             'type': 'plan', 'description': 'run, 5 km'}),
+    ]
+
+
+def test_ics_records():
+    stream = io.StringIO(
+        'BEGIN:VCALENDAR\r\n'
+        'BEGIN:VEVENT\r\n'
+        'SUMMARY:Meeting\r\n'
+        'CATEGORIES:Work,Calls\r\n'
+        'DTSTART;TZID=Europe/Moscow:20250301T090000\r\n'
+        'DURATION:PT1H30M\r\n'
+        'DESCRIPTION:first line\\nsecond\r\n'
+        '  line\r\n'
+        'END:VEVENT\r\n'
+        'BEGIN:VEVENT\r\n'
+        'SUMMARY:Reading\\, books\r\n'
+        'DTSTART:20250302T100000Z\r\n'
+        'DTEND:20250302T110000Z\r\n'
+        'END:VEVENT\r\n'
+        'BEGIN:VEVENT\r\n'
+        'SUMMARY:Broken\r\n'
+        'DTSTART;TZID=Mars/Olympus:20250303T100000\r\n'
+        'END:VEVENT\r\n'
+        'END:VCALENDAR\r\n'
+    )
+    (line1, first), (line2, second), (_, broken) = iter_ics_records(stream)
+    assert (line1, line2) == (2, 10)
+    assert first['category'] == 'Work'
+    assert (first['start_time'], first['end_time']) == (datetime(2025, 3, 1, 6), datetime(2025, 3, 1, 7, 30))
+    assert first['description'] == 'first line\nsecond line'
+    assert second['category'] == 'Reading, books'
+    assert (second['start_time'], second['end_time']) == (datetime(2025, 3, 2, 10), datetime(2025, 3, 2, 11))
+    assert 'unknown TZID' in broken['error']
+
+
+def test_stats_complete_and_aborted():
+    stats = ImportStats()
+    assert stats.complete and stats.to_dict()['aborted'] is None
+    stats.abort(42, 'Error: bad line')
+    assert not stats.complete
+    assert stats.to_dict()['complete'] is False
+    assert stats.to_dict()['aborted'] == {'line': 42, 'error': 'Error: bad line'}
+
+
+# ======== ЗАПИСЬ В БАЗУ ========
+
+@pytest.fixture
+def user_id(app):
+    from app import db
+    from app.models import User
+
+    with app.app_context():
+        user = User(username=f'importer{User.query.count()}')
+        user.set_password('secret1')
+        db.session.add(user)
+        db.session.commit()
+        yield user.id
+
+
+def _record(category, hour, event_type='fact'):
+    start = datetime(2025, 3, 1, hour)
+    return {'category': category, 'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=1)).isoformat(), 'type': event_type, 'description': None}
+
+
+def test_import_batches_and_skips(user_id):
+    from app.models import Category, Event
+
+    records = [(2, _record('Work', 9)), (3, _record('Sport', 10)), (4, _record('', 11)),
+               (5, _record('Work', 12, 'other')), (6, _record('Work', 13))]
+    stats = import_events(user_id, iter(records), batch_size=2)
+
+    assert (stats.imported, stats.skipped, stats.batches, stats.categories_created) == (3, 2, 2, 2)
+    assert [error['line'] for error in stats.errors] == [4, 5]
+    assert stats.complete
+    assert Event.query.filter_by(user_id=user_id, source='import').count() == 3
+    assert Category.query.filter_by(user_id=user_id).count() == 2
+
+
+def test_import_keeps_rows_read_before_broken_file(user_id):
+    from app.models import Event
+
+    def broken_file():
+        for line in range(2, 7):
+            yield line, _record('Work', line)
+        raise csv.Error('line contains NUL')
+
+    stats = import_events(user_id, broken_file(), batch_size=2)
+
+    assert stats.imported == 5
+    assert stats.aborted == {'line': 7, 'error': 'Error: line contains NUL'}
+    assert Event.query.filter_by(user_id=user_id).count() == 5
@@ -0,0 +1,96 @@
+"""
+Поиск свободных интервалов (app/utils.py): склейка занятых интервалов,
+окна рабочих часов, округление до 15-минутных слотов, ISO-недели и часовой
+пояс пользователя в /telegram/free-slots.
+
+    python -m pytest -q test_intervals.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils import (ceil_to_slot, current_week, find_free_intervals, floor_to_slot, get_week_start,
+                       merge_intervals)
+
+MONDAY = datetime(2025, 3, 3)
+
+
+def at(day, hour, minute=0):
+    return MONDAY + timedelta(days=day, hours=hour, minutes=minute)
+
+
+def test_slot_rounding():
+    assert floor_to_slot(at(0, 9, 7)) == at(0, 9)
+    assert ceil_to_slot(at(0, 9, 7)) == at(0, 9, 15)
+    assert ceil_to_slot(at(0, 9, 15)) == at(0, 9, 15)
+    assert ceil_to_slot(at(0, 9, 15).replace(second=1)) == at(0, 9, 30)
+
+
+def test_merge_overlapping_and_adjacent():
+    busy = [(at(0, 9), at(0, 10)), (at(0, 10), at(0, 11)), (at(0, 10, 30), at(0, 10, 45)),
+            (at(0, 12), at(0, 13))]
+    assert merge_intervals(busy) == [[at(0, 9), at(0, 11)], [at(0, 12), at(0, 13)]]
+    assert merge_intervals([]) == []
+
+
+def test_free_day_is_whole_window():
+    assert find_free_intervals([], MONDAY, 1, 9, 18) == [(at(0, 9), at(0, 18))]
+
+
+def test_gaps_between_busy_intervals():
+    busy = [(at(0, 10), at(0, 11)), (at(0, 10, 30), at(0, 12)), (at(0, 17), at(0, 19))]
+    assert find_free_intervals(busy, MONDAY, 1, 9, 18) == [
+        (at(0, 9), at(0, 10)),
+        (at(0, 12), at(0, 17))
+    ]
+
+
+def test_busy_interval_spanning_midnight():
+    busy = [(at(0, 20), at(1, 10))]
+    assert find_free_intervals(busy, MONDAY, 2, 9, 18) == [
+        (at(0, 9), at(0, 18)),
+        (at(1, 10), at(1, 18))
+    ]
+
+
+def test_gaps_are_rounded_to_slots_and_filtered_by_length():
+    busy = [(at(0, 9, 10), at(0, 9, 20)), (at(0, 10, 5), at(0, 11))]
+    # 9:00-9:10 короче слота; 9:20-10:05 -> 9:30-10:00
+    assert find_free_intervals(busy, MONDAY, 1, 9, 12) == [
+        (at(0, 9, 30), at(0, 10)),
+        (at(0, 11), at(0, 12))
+    ]
+    assert find_free_intervals(busy, MONDAY, 1, 9, 12, min_minutes=45) == [(at(0, 11), at(0, 12))]
+
+
+def test_not_before_skips_past_time():
+    free = find_free_intervals([], MONDAY, 2, 9, 18, not_before=at(0, 13, 5))
+    assert free == [(at(0, 13, 15), at(0, 18)), (at(1, 9), at(1, 18))]
+    # День, целиком оставшийся в прошлом, пропускается
+    assert find_free_intervals([], MONDAY, 1, 9, 18, not_before=at(0, 19)) == []
+
+
+def test_week_start_is_iso():
+    assert get_week_start(2026, 43) == datetime(2026, 10, 19)
+    # 1 января 2021 - пятница 53-й ISO-недели 2020 года
+    assert get_week_start(2020, 53) == datetime(2020, 12, 28)
+    assert get_week_start(2021, 1) == datetime(2021, 1, 4)
+    year, week = current_week()
+    start = get_week_start(year, week)
+    assert start <= datetime.now() < start + timedelta(days=7)
+    with pytest.raises(ValueError):
+        get_week_start(2021, 53)
+
+
+def test_telegram_free_slots_in_user_time_zone(app, web_client):
+    headers = {'X-Telegram-ID': web_client.telegram_id}
+    response = web_client.get('/api/v1/telegram/free-slots?tz=Asia/Tokyo', headers=headers)
+    assert response.status_code == 200
+    assert response.json['timezone'] == 'Asia/Tokyo'
+    # Слоты - в часовом поясе пользователя: не раньше его текущего времени
+    tokyo_now = datetime.utcnow() + timedelta(hours=9)
+    for slot in response.json['free_slots']:
+        assert datetime.fromisoformat(slot['end_time']) > tokyo_now
+        assert datetime.fromisoformat(slot['start_time']).date() == tokyo_now.date()
+
+    assert web_client.get('/api/v1/telegram/free-slots?tz=Mars/Olympus', headers=headers).status_code == 400
@@ -0,0 +1,109 @@
+"""
+Клавиатуры категорий: ETag и 304 у /api/v1/telegram/categories и кэш готовых
+клавиатур бота (bot/keyboards.py), который продлевает запись по 304.
+Тесты бота требуют python-telegram-bot и requests (bot_requirements.txt).
+
+    python -m pytest -q test_keyboards.py
+"""
+import asyncio
+
+import pytest
+
+
+# ======== БЭКЕНД ========
+
+def test_categories_etag_and_not_modified(web_client):
+    headers = {'X-Telegram-ID': web_client.telegram_id}
+    response = web_client.get('/api/v1/telegram/categories', headers=headers)
+    assert response.status_code == 200 and response.headers['ETag']
+    etag = response.headers['ETag']
+
+    response = web_client.get('/api/v1/telegram/categories', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    web_client.post('/api/v1/categories', json={'name': 'Work', 'color': '#4361ee'})
+    response = web_client.get('/api/v1/telegram/categories', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [c['name'] for c in response.json['categories']] == ['Work']
+
+    # Бот без регистрации на сайте
+    assert web_client.get('/api/v1/telegram/categories', headers={'X-Telegram-ID': '1'}).status_code == 404
+
+
+# ======== КЭШ БОТА ========
+
+@pytest.fixture
+def keyboards(monkeypatch):
+    pytest.importorskip('telegram')
+    pytest.importorskip('requests')
+    # bot.config требует токен при импорте; к Telegram тесты не обращаются
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'test-token')
+    from bot import api, keyboards
+
+    calls = []
+    responses = {}
+
+    def fake_get_categories(telegram_id, etag=None):
+        calls.append(('categories', telegram_id, etag))
+        response = responses['categories']
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def fake_bootstrap(telegram_id):
+        calls.append(('bootstrap', telegram_id))
+        return responses['bootstrap']
+
+    monkeypatch.setattr(api, 'get_categories', fake_get_categories)
+    monkeypatch.setattr(api, 'bootstrap', fake_bootstrap)
+    keyboards.calls = calls
+    keyboards.responses = responses
+    return keyboards
+
+
+def _names(markup):
+    return [button.text if hasattr(button, 'text') else button for row in markup.keyboard for button in row]
+
+
+def test_fresh_entry_is_served_without_backend(keyboards):
+    cache = keyboards.KeyboardCache(ttl=600)
+    keyboards.responses['categories'] = {'categories': [{'name': 'Work'}], 'etag': 'v1'}
+
+    first = asyncio.run(cache.get(42))
+    assert asyncio.run(cache.get(42)) is first
+    assert keyboards.calls == [('categories', 42, None)]
+    assert _names(first) == ['Work', keyboards.STOP_BUTTON]
+
+
+def test_not_modified_extends_entry(keyboards):
+    cache = keyboards.KeyboardCache(ttl=0)
+    keyboards.responses['categories'] = {'categories': [{'name': 'Work'}], 'etag': 'v1'}
+    first = asyncio.run(cache.get(42))
+
+    # TTL истёк: условный запрос с etag, 304 -> та же клавиатура
+    keyboards.responses['categories'] = None
+    assert asyncio.run(cache.get(42)) is first
+    assert keyboards.calls[-1] == ('categories', 42, 'v1')
+
+
+def test_backend_errors_fall_back(keyboards):
+    import requests
+
+    cache = keyboards.KeyboardCache(ttl=0)
+    keyboards.responses['categories'] = requests.ConnectionError('backend is down')
+    assert asyncio.run(cache.get(42)) is keyboards.DEFAULT_KEYBOARD
+    # После ошибки запись живёт ERROR_TTL - бэкенд не опрашивается на каждое сообщение
+    asyncio.run(cache.get(42))
+    assert len(keyboards.calls) == 1
+
+
+def test_bootstrap_stores_categories_etag(keyboards):
+    cache = keyboards.KeyboardCache(ttl=0)
+    keyboards.responses['bootstrap'] = {'categories': [{'name': 'Sport'}], 'categories_etag': 'v7'}
+    markup = asyncio.run(cache.bootstrap(42))
+    assert _names(markup) == ['Sport', keyboards.STOP_BUTTON]
+
+    keyboards.responses['categories'] = None
+    assert asyncio.run(cache.get(42)) is markup
+    assert keyboards.calls[-1] == ('categories', 42, 'v7')
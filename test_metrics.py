@@ -0,0 +1,24 @@
+"""
+/metrics (app/metrics.py): доступ только по METRICS_TOKEN, метки по шаблону маршрута.
+
+    python -m pytest -q test_metrics.py
+"""
+
+
+def test_metrics_disabled_without_token(app):
+    app.config['METRICS_TOKEN'] = None
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_require_bearer_token(app, web_client):
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    web_client.get('/api/v1/categories')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{endpoint="schedule_api.get_categories",method="GET",status="200"}' in text
+    assert 'endpoint="metrics.metrics"' not in text
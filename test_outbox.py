@@ -0,0 +1,119 @@
+"""
+Очередь исходящих сообщений бота (bot/outbox.py): token bucket, приоритеты,
+порядок сообщений одного чата и пауза по RetryAfter.
+
+    python -m pytest -q test_outbox.py
+"""
+import asyncio
+
+import pytest
+
+from bot.outbox import PRIORITY_INTERACTIVE, PRIORITY_REMINDER, Outbox, TokenBucket
+
+
+class RetryAfter(Exception):
+    """Как telegram.error.RetryAfter: сколько секунд подождать"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Flood control exceeded. Retry in {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=3, now=0.0)
+    for _ in range(3):
+        assert bucket.wait_time(0.0) == 0.0
+        bucket.take(0.0)
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.25) == pytest.approx(0.25)
+    assert not bucket.is_idle(1.0)
+    # Не копит больше capacity
+    assert bucket.is_idle(100.0) and bucket.tokens == 3
+
+
+def run_outbox(scenario, **kwargs):
+    """scenario(outbox, sent) - корутина; sent - порядок фактических отправок"""
+    async def main():
+        outbox = Outbox(**kwargs)
+        sent = []
+        result = await scenario(outbox, sent)
+        await outbox.stop()
+        return outbox, sent, result
+
+    return asyncio.run(main())
+
+
+def sender(sent, label, result=None):
+    async def send():
+        sent.append(label)
+        return result if result is not None else label
+    return send
+
+
+def test_interactive_messages_go_before_reminders():
+    async def scenario(outbox, sent):
+        futures = [outbox.submit(chat_id, sender(sent, f'reminder{chat_id}'), PRIORITY_REMINDER)
+                   for chat_id in (1, 2, 3)]
+        futures.append(outbox.submit(4, sender(sent, 'reply'), PRIORITY_INTERACTIVE))
+        outbox.start()
+        return await asyncio.gather(*futures)
+
+    outbox, sent, results = run_outbox(scenario, rate=100)
+    assert sent == ['reply', 'reminder1', 'reminder2', 'reminder3']
+    assert results == ['reminder1', 'reminder2', 'reminder3', 'reply']
+    assert outbox.sent == 4 and outbox.depth() == 0
+
+
+def test_chat_messages_keep_order_under_chat_limit():
+    async def scenario(outbox, sent):
+        outbox.start()
+        futures = [outbox.submit(1, sender(sent, index)) for index in range(4)]
+        futures.append(outbox.submit(2, sender(sent, 'other chat')))
+        await asyncio.gather(*futures)
+
+    outbox, sent, _ = run_outbox(scenario, rate=100, chat_rate=50, chat_burst=1)
+    assert [label for label in sent if label != 'other chat'] == [0, 1, 2, 3]
+    # Другой чат не ждёт, пока разойдётся очередь первого
+    assert sent.index('other chat') < sent.index(3)
+    assert outbox.throttled > 0
+
+
+def test_retry_after_pauses_and_resends():
+    attempts = []
+
+    async def flaky():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) == 1:
+            raise RetryAfter(0.1)
+        return 'ok'
+
+    async def scenario(outbox, sent):
+        outbox.start()
+        return await outbox.send(1, flaky)
+
+    outbox, _, result = run_outbox(scenario, rate=100)
+    assert result == 'ok'
+    assert attempts[1] - attempts[0] >= 0.1
+    assert (outbox.retried, outbox.sent, outbox.failed) == (1, 1, 0)
+
+
+def test_errors_are_delivered_to_the_caller():
+    async def broken():
+        raise ValueError('chat not found')
+
+    async def always_flooded():
+        raise RetryAfter(0.01)
+
+    async def scenario(outbox, sent):
+        outbox.start()
+        errors = []
+        for send in (broken, always_flooded):
+            with pytest.raises(Exception) as error:
+                await outbox.send(1, send)
+            errors.append(type(error.value))
+        return errors
+
+    outbox, _, errors = run_outbox(scenario, rate=100)
+    # RetryAfter повторяется MAX_ATTEMPTS раз, затем ошибка уходит вызывающему
+    assert errors == [ValueError, RetryAfter]
+    assert (outbox.failed, outbox.retried) == (2, 2)
@@ -0,0 +1,263 @@
+"""
+Планы горячих запросов: каждый эндпоинт вызывается на засеянной базе, его SQL
+перехватывается (before_cursor_execute) и прогоняется через EXPLAIN QUERY PLAN
+(SQLite) или EXPLAIN (PostgreSQL, если задан QUERY_PLAN_DATABASE_URL - пустая
+база, тест заполнит её сам).
+
+Тест падает, если запрос читает таблицу целиком, сортирует без индекса
+(временное B-дерево / узел Sort) или фильтр не попадает в индекс - и
+предлагает составной индекс, которого не хватает.
+
+    python -m pytest -q test_query_plans.py
+"""
+import json
+import os
+import random
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# Таблицы, которые не должны читаться целиком
+HOT_TABLES = ('users', 'categories', 'events', 'events_archive')
+# Псевдонимы таблиц в запросах (bootstrap_query)
+TABLE_ALIASES = {'fact': 'events', 'plan': 'events', 'current_fact': 'events', 'current_plan': 'events'}
+# Префиксы имён индексов, как в моделях (idx_event_user_time)
+INDEX_PREFIXES = {'users': 'user', 'categories': 'category', 'events': 'event', 'events_archive': 'event_archive'}
+
+SEED_USERS = 200
+SEED_CATEGORIES = 5
+SEED_EVENTS = 300
+TELEGRAM_ID = '1000'
+NOW = datetime.utcnow().replace(microsecond=0)
+# Месяц в events_archive (неделя 2020-W02 читает его)
+ARCHIVE_MONTH = date(2020, 1, 1)
+
+
+# ======== ОКРУЖЕНИЕ ========
+
+def _seed(db, user_id):
+    from app.archive import _ensure_partition
+    from app.models import Category, Event, EventArchive, EventArchiveMonth, User
+
+    rnd = random.Random(50)
+    users = [{'username': f'user{i}', 'telegram_id': str(int(TELEGRAM_ID) + i), 'calendar_token': f'token{i}'}
+             for i in range(1, SEED_USERS)]
+    db.session.execute(User.__table__.insert(), users)
+    db.session.execute(User.__table__.update().values(data_version=SEED_EVENTS))
+    db.session.execute(User.__table__.update().where(User.__table__.c.id == user_id)
+                       .values(calendar_token='token0'))
+    user_ids = [user_id] + [row[0] for row in db.session.query(User.id).filter(User.id != user_id)]
+
+    db.session.execute(Category.__table__.insert(), [
+        {'user_id': uid, 'name': f'Category {i}', 'color': '#4361ee'}
+        for uid in user_ids for i in range(SEED_CATEGORIES)
+    ])
+    categories = {}
+    for category_id, uid in db.session.query(Category.id, Category.user_id):
+        categories.setdefault(uid, []).append(category_id)
+
+    events, archived = [], []
+    for uid in user_ids:
+        for version in range(1, SEED_EVENTS + 1):
+            start = NOW - timedelta(minutes=rnd.randrange(0, 400 * 24 * 60, 15))
+            events.append({
+                'user_id': uid, 'category_id': rnd.choice(categories[uid]),
+                'start_time': start, 'end_time': start + timedelta(minutes=rnd.choice((15, 30, 60, 90))),
+                'type': rnd.choice(('plan', 'fact')), 'source': 'web', 'version': version,
+                'deleted_at': NOW if rnd.random() < 0.02 else None
+            })
+        for day in range(1, 29):
+            start = datetime(2020, 1, day, 9)
+            archived.append({'id': len(archived) + 1, 'user_id': uid, 'category_id': categories[uid][0],
+                             'start_time': start, 'end_time': start + timedelta(hours=1),
+                             'type': 'fact', 'source': 'web', 'version': 0, 'created_at': start})
+    db.session.execute(Event.__table__.insert(), events)
+    _ensure_partition(ARCHIVE_MONTH)
+    db.session.execute(EventArchive.__table__.insert(), archived)
+    db.session.add(EventArchiveMonth(month=ARCHIVE_MONTH, warm_rows=len(archived), cold_rows=0))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def client():
+    import config
+
+    url = os.environ.get('QUERY_PLAN_DATABASE_URL')
+    path = None
+    if not url:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{path}'
+    previous = config.Config.SQLALCHEMY_DATABASE_URI
+    config.Config.SQLALCHEMY_DATABASE_URI = url
+
+    from app import create_app, db
+    app = create_app()
+    app.config['TESTING'] = True
+    client = app.test_client()
+    client.post('/auth/register', data={'username': 'plans', 'password': 'secret1',
+                                        'password_confirm': 'secret1', 'telegram_id': TELEGRAM_ID})
+    client.post('/auth/login', data={'identifier': 'plans', 'password': 'secret1'})
+
+    with app.app_context():
+        from app.models import Category, User
+        user_id = db.session.query(User.id).filter_by(telegram_id=TELEGRAM_ID).scalar()
+        _seed(db, user_id)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('ANALYZE')
+        client.category_id = db.session.query(Category.id).filter_by(user_id=user_id).order_by(Category.id).first()[0]
+    client.app = app
+    yield client
+
+    config.Config.SQLALCHEMY_DATABASE_URI = previous
+    with app.app_context():
+        if path is None:
+            db.drop_all()
+        db.engine.dispose()
+    if path:
+        os.remove(path)
+
+
+def capture_queries(client, url, headers=None):
+    """SELECT-ы, выполненные эндпоинтом: [(sql, параметры)]"""
+    from app import db
+    from app.archive import _months_cache
+    from app.cache import category_cache
+
+    # Без кэшей - иначе часть запросов до БД не дойдёт
+    category_cache.clear()
+    _months_cache.clear()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    with client.app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+        response.get_data()  # потоковые ответы (export) выполняют запросы при чтении
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code in (200, 304), f'{url}: {response.status_code} {response.data[:200]}'
+    return statements
+
+
+# ======== РАЗБОР ПЛАНОВ ========
+
+class Plan:
+    """Итог EXPLAIN: проблемы плана и колонки, попавшие в условие индекса, по таблицам"""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.problems = []
+        self.index_columns = {}
+
+    def add_index_columns(self, table, columns):
+        self.index_columns.setdefault(table, set()).update(columns)
+
+
+def explain_sqlite(connection, sql, parameters):
+    plan = Plan(sql)
+    for _, _, _, detail in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}', parameters):
+        scan = re.match(r'SCAN (\w+)', detail)
+        if scan and TABLE_ALIASES.get(scan.group(1), scan.group(1)) in HOT_TABLES:
+            plan.problems.append(f'full scan: {detail}')
+        if 'TEMP B-TREE' in detail:
+            plan.problems.append(f'sort without index: {detail}')
+        if 'AUTOMATIC' in detail:
+            plan.problems.append(f'temporary index: {detail}')
+        search = re.match(r'SEARCH (\w+) USING .*?\((.*)\)', detail)
+        if search:
+            plan.add_index_columns(search.group(1), re.findall(r'(\w+)\s*[=<>]', search.group(2)))
+    return plan
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _walk(child)
+
+
+def explain_postgres(connection, sql, parameters):
+    plan = Plan(sql)
+    with connection.begin():
+        # Seq Scan остаётся в плане, только если подходящего индекса нет
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        connection.exec_driver_sql('SET LOCAL enable_sort = off')
+        result = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {sql}', parameters).scalar()
+    result = json.loads(result) if isinstance(result, str) else result
+    for node in _walk(result[0]['Plan']):
+        table = node.get('Alias') or node.get('Relation Name')
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in HOT_TABLES:
+            plan.problems.append(f'full scan: Seq Scan on {table}')
+        if node['Node Type'] in ('Sort', 'Incremental Sort'):
+            plan.problems.append(f"sort without index: {node['Node Type']} by {node.get('Sort Key')}")
+        if 'Index Cond' in node:
+            plan.add_index_columns(table, re.findall(r'(\w+)\s*[=<>]', node['Index Cond']))
+    return plan
+
+
+def explain_endpoint(client, url, headers=None):
+    from app import db
+
+    statements = capture_queries(client, url, headers)
+    with client.app.app_context():
+        explain = explain_postgres if db.engine.dialect.name == 'postgresql' else explain_sqlite
+        with db.engine.connect() as connection:
+            return [explain(connection, sql, parameters) for sql, parameters in statements]
+
+
+# ======== ЭНДПОИНТЫ ========
+
+WEEK = f'{NOW.isocalendar()[0]}-W{NOW.isocalendar()[1]:02d}'
+HOT_ENDPOINTS = [
+    # (url, [(таблица, колонки, которые должны быть в условии индекса)])
+    (f'/api/v1/events/week/{WEEK}', [('events', 'user_id', 'start_time')]),
+    (f'/api/v1/events/week/{WEEK}?format=columnar', [('events', 'user_id', 'start_time')]),
+    ('/api/v1/events/week/2020-W02', [('events_archive', 'user_id', 'start_time')]),
+    ('/api/v1/events/changes?since=250', [('events', 'user_id', 'version')]),
+    ('/api/v1/categories', [('categories', 'user_id')]),
+    ('/api/my/events', [('events', 'user_id')]),
+    ('/api/my/events?category_id={category_id}', [('events', 'user_id', 'category_id')]),
+    ('/api/my/events?type=fact', [('events', 'user_id', 'type')]),
+    (f'/api/my/events?start_date={(NOW - timedelta(days=30)).date()}&end_date={NOW.date()}',
+     [('events', 'user_id', 'start_time')]),
+    ('/api/my/stats', [('events', 'user_id', 'start_time'), ('events', 'user_id', 'type')]),
+    (f'/api/v1/export?format=ndjson&from={(NOW - timedelta(days=30)).date()}',
+     [('events', 'user_id', 'start_time')]),
+    ('/api/v1/telegram/categories', [('categories', 'user_id')]),
+    ('/api/v1/telegram/bootstrap', [('users', 'telegram_id'), ('current_fact', 'user_id', 'type'),
+                                    ('current_plan', 'user_id', 'type')]),
+    ('/calendar/token0.ics', [('users', 'calendar_token'), ('events', 'user_id', 'type')]),
+]
+
+
+def suggest_index(table, columns):
+    """Составной индекс: колонки фильтра, затем start_time для диапазона и сортировки"""
+    table = TABLE_ALIASES.get(table, table)
+    columns = list(columns)
+    if table in ('events', 'events_archive') and 'start_time' not in columns:
+        columns.append('start_time')
+    prefix = INDEX_PREFIXES.get(table, table)
+    name = '_'.join(column.replace('start_time', 'time').replace('_id', '') for column in columns)
+    return f"{table}: db.Index('idx_{prefix}_{name}', {', '.join(repr(c) for c in columns)})"
+
+
+@pytest.mark.parametrize('url, expected', HOT_ENDPOINTS, ids=[url for url, _ in HOT_ENDPOINTS])
+def test_hot_query_plans(client, url, expected):
+    headers = {'X-Telegram-ID': TELEGRAM_ID} if '/telegram/' in url else None
+    plans = explain_endpoint(client, url.format(category_id=client.category_id), headers)
+    assert plans, f'{url}: no queries captured'
+
+    failures = [f'{problem}\n    {plan.sql}' for plan in plans for problem in plan.problems]
+    for table, *columns in expected:
+        if not any(set(columns) <= plan.index_columns.get(table, set()) for plan in plans):
+            failures.append(f'{table}: filter on {", ".join(columns)} is not served by an index - '
+                            f'add {suggest_index(table, columns)}')
+    assert not failures, f'{url}:\n' + '\n'.join(failures)
@@ -0,0 +1,140 @@
+"""
+Планировщик напоминаний бота (bot/reminders.py): замена дедлайна того же вида,
+отмена, извлечение наступивших, цикл с одним таймером и восстановление
+напоминаний из сохранённых состояний после рестарта.
+
+    python -m pytest -q test_reminders.py
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from bot.reminders import (LONG_ACTIVITY_AFTER, REMINDER_LONG_ACTIVITY, REMINDER_START, START_REMINDER_LEAD,
+                           ReminderScheduler, pending_reminders)
+from bot.states import UserState
+
+NOW = datetime(2025, 3, 3, 9)
+
+
+def test_new_deadline_replaces_previous_one():
+    scheduler = ReminderScheduler()
+    first = scheduler.schedule(1, REMINDER_START, NOW + timedelta(minutes=5))
+    second = scheduler.schedule(1, REMINDER_START, NOW + timedelta(minutes=10), {'category': 'Work'})
+
+    assert first.cancelled and not second.cancelled
+    assert len(scheduler) == 1
+    assert scheduler.pending(1, REMINDER_START) is second
+    # Отменённая запись не всплывает как ближайший дедлайн
+    assert scheduler.next_deadline() == NOW + timedelta(minutes=10)
+    assert scheduler.pop_due(NOW + timedelta(minutes=7)) == []
+    assert scheduler.pop_due(NOW + timedelta(minutes=10)) == [second]
+    assert len(scheduler) == 0 and scheduler.next_deadline() is None
+
+
+def test_kinds_and_users_are_independent():
+    scheduler = ReminderScheduler()
+    scheduler.schedule(1, REMINDER_START, NOW + timedelta(minutes=3))
+    scheduler.schedule(1, REMINDER_LONG_ACTIVITY, NOW + timedelta(minutes=1))
+    scheduler.schedule(2, REMINDER_START, NOW + timedelta(minutes=2))
+
+    due = scheduler.pop_due(NOW + timedelta(minutes=5))
+    assert [(r.user_id, r.kind) for r in due] == [(1, REMINDER_LONG_ACTIVITY), (2, REMINDER_START), (1, REMINDER_START)]
+
+
+def test_cancel_one_kind_or_all():
+    scheduler = ReminderScheduler()
+    scheduler.schedule(1, REMINDER_START, NOW)
+    scheduler.schedule(1, REMINDER_LONG_ACTIVITY, NOW)
+    scheduler.schedule(2, REMINDER_START, NOW)
+
+    scheduler.cancel(1, REMINDER_START)
+    assert scheduler.pending(1, REMINDER_START) is None
+    assert scheduler.pending(1, REMINDER_LONG_ACTIVITY) is not None
+    scheduler.cancel(1)
+    assert [r.user_id for r in scheduler.pop_due(NOW)] == [2]
+    scheduler.cancel(3)
+
+
+def test_cancelled_entries_do_not_pile_up():
+    scheduler = ReminderScheduler()
+    for minute in range(1000):
+        scheduler.schedule(1, REMINDER_START, NOW + timedelta(minutes=minute))
+    assert len(scheduler) == 1
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 65
+
+
+def test_schedule_many_replaces_pending():
+    scheduler = ReminderScheduler()
+    old = scheduler.schedule(1, REMINDER_START, NOW)
+    count = scheduler.schedule_many([
+        (1, REMINDER_START, NOW + timedelta(minutes=1), None),
+        (2, REMINDER_LONG_ACTIVITY, NOW + timedelta(minutes=2), {'category': 'Work'}),
+    ])
+    assert count == 2 and old.cancelled
+    assert len(scheduler._heap) == 2
+    assert scheduler.pending(2, REMINDER_LONG_ACTIVITY).data == {'category': 'Work'}
+
+
+def test_run_loop_wakes_up_for_earlier_deadline():
+    async def scenario():
+        scheduler = ReminderScheduler()
+        fired = []
+
+        async def handler(reminder):
+            fired.append(reminder.user_id)
+            if reminder.user_id == 2:
+                raise RuntimeError('handler errors are logged, the loop keeps running')
+
+        scheduler.start(handler)
+        scheduler.schedule(1, REMINDER_START, datetime.now() + timedelta(hours=1))
+        await asyncio.sleep(0.01)
+        # Цикл ждёт час - новый ранний дедлайн должен его разбудить
+        scheduler.schedule(2, REMINDER_START, datetime.now() + timedelta(milliseconds=50))
+        scheduler.schedule(3, REMINDER_START, datetime.now() + timedelta(milliseconds=100))
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+        return fired, len(scheduler)
+
+    fired, pending = asyncio.run(scenario())
+    assert fired == [2, 3]
+    assert pending == 1
+
+
+# ======== ВОССТАНОВЛЕНИЕ ПОСЛЕ РЕСТАРТА ========
+
+def saved_state(user_id, start_time, tracking=True, chat_id=None, category='Work'):
+    """Состояние в том виде, в каком его прочитает бот после рестарта"""
+    state = UserState(user_id)
+    state.start_activity(category, start_time)
+    state.is_tracking = tracking
+    state.chat_id = chat_id
+    return UserState.from_dict(state.to_dict())
+
+
+def test_pending_reminders_for_upcoming_start():
+    start = NOW + timedelta(minutes=15)
+    reminders = list(pending_reminders([saved_state(1, start, chat_id=-100)], NOW))
+    data = {'category': 'Work', 'chat_id': -100}
+    assert reminders == [
+        (1, REMINDER_START, start - START_REMINDER_LEAD, data),
+        (1, REMINDER_LONG_ACTIVITY, start + LONG_ACTIVITY_AFTER, data),
+    ]
+
+
+def test_overdue_reminders_are_coalesced():
+    states = [
+        saved_state(1, NOW - timedelta(hours=1)),
+        # Предупреждение проспали во время рестарта - уходит один раз, сейчас
+        saved_state(2, NOW - timedelta(hours=10)),
+        saved_state(3, NOW - timedelta(hours=10), tracking=False),
+    ]
+    reminders = list(pending_reminders(states, NOW))
+    assert [(user_id, kind, when) for user_id, kind, when, _ in reminders] == [
+        (1, REMINDER_LONG_ACTIVITY, NOW + timedelta(hours=3)),
+        (2, REMINDER_LONG_ACTIVITY, NOW),
+    ]
+    # Без chat_id в личном чате пишем по user_id
+    assert reminders[1][3]['chat_id'] == 2
+
+    scheduler = ReminderScheduler()
+    assert scheduler.schedule_many(reminders) == 2
+    assert [r.user_id for r in scheduler.pop_due(NOW)] == [2]
@@ -0,0 +1,148 @@
+"""
+Чтение с реплики (app/replica.py): маршрутизация RoutingSession, read-your-writes
+после записи, принудительное чтение из основной БД в /batch и кэш категорий.
+Реплика - вторая SQLite, «репликация» - копирование файла основной базы.
+
+    python -m pytest -q test_replica.py
+"""
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def replica_path():
+    import config
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    previous = config.Config.SQLALCHEMY_BINDS
+    config.Config.SQLALCHEMY_BINDS = {'replica': f'sqlite:///{path}'}
+    yield path
+    config.Config.SQLALCHEMY_BINDS = previous
+    # Метаданные бинда остаются в общем db - create_all следующих приложений искал бы реплику
+    from app import db
+    db.metadatas.pop('replica', None)
+    os.remove(path)
+
+
+@pytest.fixture(scope='module')
+def app(replica_path, app):
+    """Приложение из conftest, созданное уже с SQLALCHEMY_BINDS['replica']"""
+    return app
+
+
+@pytest.fixture
+def replicate(app, replica_path):
+    def copy():
+        primary = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):])
+        replica = sqlite3.connect(replica_path)
+        primary.backup(replica)
+        primary.close()
+        replica.close()
+    return copy
+
+
+@pytest.fixture
+def stale(web_client, replicate):
+    """Пользователь с категорией, которой ещё нет на реплике; окно read-your-writes истекло"""
+    from app.cache import category_cache
+    from app.replica import recent_writes
+
+    replicate()
+    response = web_client.post('/api/v1/categories', json={'name': 'Fresh', 'color': '#4361ee'})
+    assert response.status_code == 201
+    assert 'rw_until' in response.headers.get('Set-Cookie', '')
+
+    def expire():
+        recent_writes.clear()
+        category_cache.clear()
+
+    web_client.expire = expire
+    return web_client
+
+
+def _bot_categories(app, client):
+    # Бот ходит без cookie - только по X-Telegram-ID
+    response = app.test_client().get('/api/v1/telegram/categories', headers={'X-Telegram-ID': client.telegram_id})
+    assert response.status_code == 200
+    return [category['name'] for category in response.json['categories']]
+
+
+def test_session_routing(app):
+    from flask import g
+    from app import db
+    from app.models import User
+
+    with app.test_request_context('/'):
+        session = db.session()
+        primary, replica = db.engines[None], db.engines['replica']
+        select = db.select(User.id)
+        assert session.get_bind(clause=select) is primary
+        g.read_replica = True
+        assert session.get_bind(clause=select) is replica
+        assert session.get_bind(clause=User.__table__.insert()) is primary
+        assert session.get_bind(clause=User.__table__.update()) is primary
+    # Вне запроса (CLI, фоновые задачи) - всегда основная БД
+    with app.app_context():
+        assert db.session().get_bind(clause=select) is primary
+
+
+def test_read_replica_flag_is_restored(app):
+    from flask import g
+    from app.replica import primary_reads, read_replica, reads_from_replica
+
+    seen = []
+
+    @read_replica
+    def view():
+        seen.append(reads_from_replica())
+        return 'ok'
+
+    @primary_reads
+    def batch():
+        return view()
+
+    with app.test_request_context('/'):
+        view()
+        assert g.read_replica is False
+        batch()
+        assert not g.get('primary_reads')
+    assert seen == [True, False]
+
+
+def test_recent_writer_reads_primary(app, stale):
+    assert 'Fresh' in [c['name'] for c in stale.get('/api/v1/categories').json['categories']]
+    assert 'Fresh' in _bot_categories(app, stale)
+
+
+def test_reads_go_to_replica_after_window(app, stale, replicate):
+    from app.cache import category_cache
+    from app.models import User
+
+    stale.expire()
+    assert 'Fresh' not in _bot_categories(app, stale)
+    # Устаревшее чтение с реплики не попадает в общий кэш категорий
+    with app.app_context():
+        user_id = User.query.filter_by(telegram_id=stale.telegram_id).first().id
+    assert category_cache.get(user_id) is None
+
+    replicate()
+    assert 'Fresh' in _bot_categories(app, stale)
+
+
+def test_batch_reads_its_own_writes(app, stale):
+    stale.expire()
+    # Новая сессия того же пользователя - без cookie rw_until
+    client = app.test_client()
+    client.post('/auth/login', data={'identifier': stale.username, 'password': 'secret1'})
+    response = client.post('/api/v1/batch', json={'operations': [
+        {'path': '/categories'},
+        {'method': 'POST', 'path': '/categories', 'body': {'name': 'Batch', 'color': '#000000'}},
+        {'path': '/categories'},
+    ]})
+    first, _, last = response.json['results']
+    assert 'Fresh' in [c['name'] for c in first['body']['categories']]
+    assert 'Batch' in [c['name'] for c in last['body']['categories']]
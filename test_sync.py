@@ -0,0 +1,124 @@
+"""
+Дельта-синхронизация расписания (/api/v1/events/changes): версии событий,
+tombstone удалённых и фильтр по неделе; SSE (/events/stream) только с брокером
+между процессами.
+
+    python -m pytest -q test_sync.py
+"""
+import pytest
+
+
+def _create_category(client):
+    response = client.post('/api/v1/categories', json={'name': 'Work', 'color': '#4361ee'})
+    assert response.status_code == 201
+    return response.json['category']['id']
+
+
+def _create_event(client, category_id, day):
+    response = client.post('/api/v1/events', json={'category_id': category_id,
+                                                   'start_time': f'2025-03-{day:02d}T09:00',
+                                                   'end_time': f'2025-03-{day:02d}T10:00'})
+    assert response.status_code == 201
+    return response.json['event_id']
+
+
+def _changes(client, since, week=None):
+    url = f'/api/v1/events/changes?since={since}' + (f'&week={week}' if week else '')
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.json
+
+
+def test_since_is_required(web_client):
+    assert web_client.get('/api/v1/events/changes').status_code == 400
+
+
+def test_changes_and_tombstones(web_client):
+    category_id = _create_category(web_client)
+    start = _changes(web_client, 0)['version']
+    ids = [_create_event(web_client, category_id, day) for day in (10, 11, 12)]
+
+    changes = _changes(web_client, start)
+    assert [event['id'] for event in changes['changed']] == ids
+    assert changes['deleted'] == [] and not changes['reset']
+
+    created = changes['version']
+    assert web_client.delete(f'/api/v1/events/{ids[0]}').status_code == 200
+    # Повторное удаление - событие уже в tombstone
+    assert web_client.delete(f'/api/v1/events/{ids[0]}').status_code == 404
+
+    changes = _changes(web_client, created)
+    assert changes['changed'] == []
+    assert changes['deleted'] == [ids[0]]
+    assert changes['version'] > created
+
+    # Клиент, отставший с самого начала, получает итог: два события и одно удаление
+    changes = _changes(web_client, start)
+    assert [event['id'] for event in changes['changed']] == ids[1:]
+    assert changes['deleted'] == [ids[0]]
+
+    # Актуальный клиент - пустая дельта
+    latest = _changes(web_client, changes['version'])
+    assert (latest['changed'], latest['deleted'], latest['version']) == ([], [], changes['version'])
+
+
+def test_changes_filtered_by_week(web_client):
+    category_id = _create_category(web_client)
+    start = _changes(web_client, 0)['version']
+    # 2025-W11 - ISO-неделя с понедельника 10 марта
+    in_week = _create_event(web_client, category_id, 11)
+    _create_event(web_client, category_id, 20)
+
+    changes = _changes(web_client, start, week='2025-W11')
+    assert [event['id'] for event in changes['changed']] == [in_week]
+    assert web_client.get(f'/api/v1/events/changes?since={start}&week=bad').status_code == 400
+
+
+def test_changes_are_per_user(app, web_client):
+    _create_event(web_client, _create_category(web_client), 10)
+
+    other = app.test_client()
+    other.post('/auth/register', data={'username': 'other', 'password': 'secret1', 'password_confirm': 'secret1'})
+    other.post('/auth/login', data={'identifier': 'other', 'password': 'secret1'})
+    assert _changes(other, 0)['changed'] == []
+
+
+def test_category_delete_purges_tombstones(web_client):
+    category_id = _create_category(web_client)
+    event_id = _create_event(web_client, category_id, 10)
+    assert web_client.delete(f'/api/v1/events/{event_id}').status_code == 200
+    before = _changes(web_client, 0)['version']
+    assert not _changes(web_client, before)['reset']
+
+    # Tombstone удалён вместе с категорией - отставший клиент должен пересинхронизироваться
+    assert web_client.delete(f'/api/v1/categories/{category_id}').status_code == 200
+    assert _changes(web_client, before)['reset']
+    assert not _changes(web_client, _changes(web_client, 0)['version'])['reset']
+
+
+@pytest.fixture
+def cross_process_broker(monkeypatch):
+    """Брокер в памяти, выдающий себя за брокер между процессами (как PostgresBroker)"""
+    from app import pubsub
+
+    broker = pubsub.LocalBroker()
+    broker.cross_process = True
+    monkeypatch.setattr(pubsub, 'broker', broker)
+    return broker
+
+
+def test_stream_disabled_without_broker(web_client):
+    assert web_client.get('/api/v1/events/stream').status_code == 404
+    assert 'data-event-stream="0"' in web_client.get('/schedule').get_data(as_text=True)
+
+
+def test_stream_with_cross_process_broker(app, web_client, cross_process_broker):
+    assert 'data-event-stream="1"' in web_client.get('/schedule').get_data(as_text=True)
+
+    response = web_client.get('/api/v1/events/stream', buffered=False)
+    assert response.status_code == 200
+    assert next(response.response) == b'retry: 5000\n\n'
+    assert cross_process_broker.subscriber_count() == 1
+    response.close()
+    assert cross_process_broker.subscriber_count() == 0
+    assert app.extensions['sse_stream_slots']._value == app.config['SSE_MAX_STREAMS']
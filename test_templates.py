@@ -0,0 +1,95 @@
+"""
+Шаблоны недели (app/utils.py): нормализация данных шаблона, развёртывание
+в интервалы конкретной недели, проверка пересечений и создание/применение
+шаблонов через API.
+
+    python -m pytest -q test_templates.py
+"""
+from datetime import datetime
+
+import pytest
+
+from app.utils import current_week, expand_template, merge_intervals, normalize_template_data, overlaps_any
+
+MONDAY = datetime(2025, 3, 3)
+
+
+def test_normalize_sorts_and_accepts_schedule_format():
+    data = {
+        '0': [{'time': '14:00', 'categoryId': '2'}, {'time': '9:5', 'category_id': 1, 'duration': 30}],
+        '3': [],
+        6: [{'time': '23:45', 'category_id': 3, 'duration': '15'}]
+    }
+    assert normalize_template_data(data) == {
+        '0': [{'time': '09:05', 'category_id': 1, 'duration': 30},
+              {'time': '14:00', 'category_id': 2, 'duration': 60}],
+        '6': [{'time': '23:45', 'category_id': 3, 'duration': 15}]
+    }
+
+
+@pytest.mark.parametrize('data', [
+    [],
+    {'7': [{'time': '09:00', 'category_id': 1}]},
+    {'0': [{'time': '24:00', 'category_id': 1}]},
+    {'0': [{'time': '09:60', 'category_id': 1}]},
+    {'0': [{'time': '09:00', 'category_id': 1, 'duration': -15}]},
+])
+def test_normalize_rejects_invalid_data(data):
+    with pytest.raises(ValueError):
+        normalize_template_data(data)
+
+
+def test_expand_to_week():
+    data = normalize_template_data({
+        '2': [{'time': '10:00', 'category_id': 2, 'duration': 90}],
+        '0': [{'time': '23:30', 'category_id': 1, 'duration': 60}]
+    })
+    assert expand_template(data, MONDAY) == [
+        (1, datetime(2025, 3, 3, 23, 30), datetime(2025, 3, 4, 0, 30)),
+        (2, datetime(2025, 3, 5, 10), datetime(2025, 3, 5, 11, 30))
+    ]
+
+
+def test_overlaps_any():
+    merged = merge_intervals([(datetime(2025, 3, 3, 9), datetime(2025, 3, 3, 10)),
+                              (datetime(2025, 3, 3, 12), datetime(2025, 3, 3, 13))])
+    assert overlaps_any(merged, datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 9, 45))
+    assert overlaps_any(merged, datetime(2025, 3, 3, 11), datetime(2025, 3, 3, 12, 15))
+    assert overlaps_any(merged, datetime(2025, 3, 3, 8), datetime(2025, 3, 3, 14))
+    # Соседние интервалы не пересекаются
+    assert not overlaps_any(merged, datetime(2025, 3, 3, 10), datetime(2025, 3, 3, 12))
+    assert not overlaps_any(merged, datetime(2025, 3, 3, 13), datetime(2025, 3, 3, 14))
+    assert not overlaps_any([], datetime(2025, 3, 3, 9), datetime(2025, 3, 3, 10))
+
+
+@pytest.mark.parametrize('body', [
+    {'data': {}},
+    {'name': None, 'data': {}},
+    {'name': 42, 'data': {}},
+    {'name': '   ', 'data': {}},
+    {'name': 'Week'},
+    ['not', 'an', 'object'],
+])
+def test_create_template_validates_name(web_client, body):
+    response = web_client.post('/api/v1/templates', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_templates_page_applies_to_displayed_week(web_client):
+    year, week = current_week()
+    category_id = web_client.post('/api/v1/categories', json={'name': 'Work', 'color': '#4361ee'}).json['category']['id']
+    response = web_client.post('/api/v1/templates', json={'name': ' Week ', 'data': {
+        '0': [{'time': '09:00', 'category_id': category_id, 'duration': 60}]
+    }})
+    assert response.status_code == 201
+
+    page = web_client.get('/templates').get_data(as_text=True)
+    assert f'id="applyWeek" value="{year}-W{week:02d}"' in page
+    assert "/apply?week=" in page
+
+    template_id = response.json['template']['id']
+    applied = web_client.post(f'/api/v1/templates/{template_id}/apply?week=2025-W11').json
+    assert applied['created'] == 1
+    events = web_client.get('/api/my/events').json
+    assert [e['start_time'] for e in events] == ['2025-03-10T09:00:00']